@@ -1,15 +1,26 @@
+import importlib
+
 import streamlit as st
 
-from pages import book_page
-from pages import member_page
-from pages import borrow_page
-from pages import report_page
+import controller
+import render_stats
+
+# หน้า -> (module ใน pages/, ฟังก์ชัน render)
+# import เมื่อเปิดหน้านั้นครั้งแรกของ process (เปิดแอปไม่ต้องโหลดทุกหน้า เช่น หน้ารายงานที่ใช้ plotly)
+PAGES = {
+    "login": ("pages.login_page", "render_login"),
+    "books": ("pages.book_page", "render_book"),
+    "members": ("pages.member_page", "render_member"),
+    "borrows": ("pages.borrow_page", "render_borrow"),
+    "reports": ("pages.report_page", "render_report"),
+    "admin": ("pages.admin_page", "render_admin"),
+}
+
 
-# ✅ เพิ่มเติม: import หน้า admin
-from pages import admin_page
+def render_page(key: str):
+    module_name, func_name = PAGES[key]
+    getattr(importlib.import_module(module_name), func_name)()
 
-# ✅ เพิ่มเติม: import หน้า login (View)
-from pages import login_page
 
 # =========================
 # UI Config (ต้องอยู่บรรทัดแรกสุดของส่วน UI)
@@ -48,8 +59,19 @@ aside ul:has(a[href*="/borrow_page"]) {display: none !important;}
 
 # ✅ เพิ่มเติม: Login Gate (ถ้ายังไม่ล็อกอินให้ไปหน้า login)
 if not st.session_state["is_logged_in"]:
-    login_page.render_login()
+    with render_stats.page_run("login", st.session_state):
+        render_page("login")
+    st.stop()
+
+# ตรวจว่าบัญชียังใช้งานได้ (ผลตรวจ cache ไว้ช่วงสั้น ๆ ไม่อ่านตาราง users ทุก rerun)
+verified_user = controller.current_user(st.session_state["user"])
+if verified_user is None:
+    st.session_state["is_logged_in"] = False
+    st.session_state["user"] = None
+    render_page("login")
+    st.warning("⚠ บัญชีนี้ถูกปิดใช้งานหรือไม่พบในระบบ กรุณาเข้าสู่ระบบใหม่")
     st.stop()
+st.session_state["user"] = verified_user
 
 # ✅ แก้ไขใหม่: ให้ส่วนหัวเว็บทํางานหลัง Login เท่านั้น
 st.title("📚 ระบบยืม-คืนหนังสือ (Streamlit + SQLite)")
@@ -111,31 +133,33 @@ if role == "admin":
     nav_button("จัดการผู้ใช้", "admin", "🛠️")
 
 # ---------- Routing ----------
-if st.session_state.page == "books":
-    book_page.render_book()
+# จับเวลาการ render ของหน้าที่เลือก (ดูสถิติได้ในหน้าจัดการผู้ใช้)
+with render_stats.page_run(st.session_state.page, st.session_state):
+    if st.session_state.page == "books":
+        render_page("books")
+
+    elif st.session_state.page == "members":
+        render_page("members")
+
+    elif st.session_state.page == "borrows":
+        render_page("borrows")
+
+    elif st.session_state.page == "reports":
+        # ✅ ป้องกัน staff เข้าหน้ารายงาน
+        if role != "admin":
+            st.warning("⚠ หน้านี้อนุญาตเฉพาะผู้ดูแลระบบ (admin) เท่านั้น")
+        else:
+            render_page("reports")
+
+    elif st.session_state.page == "admin":
+        if role != "admin":
+            st.warning("⚠ หน้านี้อนุญาตเฉพาะผู้ดูแลระบบ (admin) เท่านั้น")
+        else:
+            render_page("admin")
 
-elif st.session_state.page == "members":
-    member_page.render_member()
-
-elif st.session_state.page == "borrows":
-    borrow_page.render_borrow()
-
-elif st.session_state.page == "reports":
-    # ✅ ป้องกัน staff เข้าหน้ารายงาน
-    if role != "admin":
-        st.warning("⚠ หน้านี้อนุญาตเฉพาะผู้ดูแลระบบ (admin) เท่านั้น")
-    else:
-        report_page.render_report()
-
-elif st.session_state.page == "admin":
-    if role != "admin":
-        st.warning("⚠ หน้านี้อนุญาตเฉพาะผู้ดูแลระบบ (admin) เท่านั้น")
     else:
-        admin_page.render_admin()
-
-else:
-    # fallback
-    book_page.render_book()
+        # fallback
+        render_page("books")
 
-    nav_button("รายงาน", "reports", "📊")
+        nav_button("รายงาน", "reports", "📊")
     
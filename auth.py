@@ -0,0 +1,210 @@
+# auth.py
+"""
+รหัสผ่านและการยืนยันตัวตนของผู้ใช้ระบบ
+
+- เก็บรหัสผ่านด้วย PBKDF2-HMAC-SHA256 + salt สุ่มต่อผู้ใช้ (hashlib ไม่ต้องติดตั้งอะไรเพิ่ม)
+  รูปแบบ: pbkdf2_sha256$<iterations>$<salt hex>$<hash hex>
+- จำนวนรอบปรับได้ด้วย env LIBRARY_PBKDF2_ITERATIONS (มากขึ้น = ปลอดภัยขึ้นแต่ login ช้าลง)
+- hash แบบเดิม (SHA-256 ไม่มี salt) ยังตรวจได้ และถูกแปลงเป็นแบบใหม่ตอน login สำเร็จ
+- นับการ login ผิดต่อชื่อผู้ใช้ในหน่วยความจำ ผิดเกินกำหนดจะล็อกชั่วคราว
+- cache ผลตรวจ session ที่ login อยู่ช่วงสั้น ๆ ทุก rerun จึงไม่ต้องอ่านตาราง users ซ้ำ
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import model
+
+# ==========================================================
+# Password hashing
+# ==========================================================
+PASSWORD_ALGORITHM = "pbkdf2_sha256"
+
+# จำนวนรอบของ PBKDF2 (ค่าเริ่มต้นตามคำแนะนำของ OWASP ใช้เวลาราว 0.1 วินาทีต่อครั้ง)
+PBKDF2_ITERATIONS = int(os.environ.get("LIBRARY_PBKDF2_ITERATIONS", "600000"))
+
+SALT_BYTES = 16
+
+
+def hash_password(password: str, iterations: int | None = None) -> str:
+    """สร้าง hash ของรหัสผ่าน (salt ใหม่ทุกครั้ง)"""
+    iterations = iterations or PBKDF2_ITERATIONS
+    salt = secrets.token_hex(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("ascii"), iterations)
+    return f"{PASSWORD_ALGORITHM}${iterations}${salt}${digest.hex()}"
+
+
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+
+
+def _hex_bytes(text: str, n_bytes: int | None = None) -> bytes | None:
+    """แปลงข้อความ hex เป็น bytes (None = ไม่ใช่ hex ล้วน หรือความยาวไม่ตรง)"""
+    if not text or len(text) % 2 or not _HEX_DIGITS.issuperset(text):
+        return None
+    if n_bytes is not None and len(text) != 2 * n_bytes:
+        return None
+    return bytes.fromhex(text)
+
+
+def verify_password(password: str, stored_hash: str) -> tuple[bool, bool]:
+    """
+    ตรวจรหัสผ่านกับ hash ที่เก็บไว้
+    return: (ถูกต้องหรือไม่, ควร hash ใหม่หรือไม่)
+    ควร hash ใหม่ = เป็น hash แบบเดิม หรือจำนวนรอบไม่ตรงกับ PBKDF2_ITERATIONS ปัจจุบัน
+    hash ที่รูปแบบผิด (จำนวนรอบไม่ใช่เลขบวก / salt หรือ hash ไม่ใช่ hex) = รหัสผิด ไม่ throw
+    """
+    stored_hash = stored_hash or ""
+    parts = stored_hash.split("$")
+    if parts[0] == PASSWORD_ALGORITHM:
+        if len(parts) != 4:
+            return False, False
+        _, iterations, salt, expected = parts
+        expected = _hex_bytes(expected, hashlib.sha256().digest_size)
+        valid_iterations = iterations.isascii() and iterations.isdigit() and int(iterations) > 0
+        if not valid_iterations or _hex_bytes(salt) is None or expected is None:
+            return False, False
+        iterations = int(iterations)
+        # salt ใช้ตัวข้อความ hex เป็น bytes ตรง ๆ (ตรงกับ hash_password)
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt.encode("ascii"), iterations)
+        ok = hmac.compare_digest(digest, expected)
+        return ok, ok and iterations != PBKDF2_ITERATIONS
+
+    # hash แบบเดิม: SHA-256 hex ไม่มี salt
+    expected = _hex_bytes(stored_hash, hashlib.sha256().digest_size)
+    if expected is None:
+        return False, False
+    ok = hmac.compare_digest(hashlib.sha256(password.encode("utf-8")).digest(), expected)
+    return ok, ok
+
+
+# ==========================================================
+# Failed-login rate limit
+# ==========================================================
+# login ผิดได้กี่ครั้งภายใน FAILED_LOGIN_WINDOW วินาที ก่อนถูกล็อก LOCKOUT_SECONDS วินาที
+MAX_FAILED_LOGINS = 5
+FAILED_LOGIN_WINDOW = 300
+LOCKOUT_SECONDS = 300
+
+# จำนวนชื่อผู้ใช้สูงสุดที่จดการ login ผิด (ยังไม่ถึงขั้นล็อก) ไว้ กันชื่อสุ่มจำนวนมากทำให้หน่วยความจำโตไม่หยุด
+# การล็อกที่ยังไม่หมดเวลาไม่ถูกตัดทิ้งเด็ดขาด (ไม่อย่างนั้นล็อกชื่อทิ้งขว้างจำนวนมากจะปลดล็อกบัญชีเป้าหมายได้)
+# ชื่อหนึ่งถูกล็อกได้ต้อง login ผิด MAX_FAILED_LOGINS ครั้ง และล็อกหมดอายุใน LOCKOUT_SECONDS จึงไม่โตไม่จำกัด
+MAX_TRACKED_LOGINS = 10_000
+
+# เรียงตามเวลาล่าสุดของแต่ละชื่อ (เก่าอยู่หน้า) จึงตัดรายการที่หมดอายุจากด้านหน้าได้เลย
+_failed_logins = OrderedDict()   # username -> [เวลาที่ login ผิด (monotonic)]
+_locked_until = OrderedDict()    # username -> เวลาที่ปลดล็อก (monotonic)
+_login_lock = threading.Lock()
+
+
+def _login_key(username: str) -> str:
+    return (username or "").strip().lower()
+
+
+def lockout_remaining(username: str) -> int:
+    """จำนวนวินาทีที่ชื่อผู้ใช้นี้ยังถูกล็อกอยู่ (0 = login ได้)"""
+    key = _login_key(username)
+    now = time.monotonic()
+    with _login_lock:
+        until = _locked_until.get(key)
+        if until is None:
+            return 0
+        if until <= now:
+            del _locked_until[key]
+            return 0
+        return int(until - now) + 1
+
+
+def _prune_logins(now: float):
+    """
+    ลบชื่อที่ไม่มีการ login ผิดในช่วง FAILED_LOGIN_WINDOW (ตัดส่วนที่เกิน MAX_TRACKED_LOGINS ด้วย)
+    และการล็อกที่หมดเวลาแล้ว (เรียกขณะถือ _login_lock)
+    """
+    while _failed_logins:
+        key, attempts = next(iter(_failed_logins.items()))
+        if now - attempts[-1] < FAILED_LOGIN_WINDOW and len(_failed_logins) <= MAX_TRACKED_LOGINS:
+            break
+        del _failed_logins[key]
+    # ล็อกทุกอันยาว LOCKOUT_SECONDS เท่ากัน ลำดับที่ใส่จึงเป็นลำดับที่หมดเวลา
+    while _locked_until:
+        key, until = next(iter(_locked_until.items()))
+        if until > now:
+            break
+        del _locked_until[key]
+
+
+def record_failed_login(username: str) -> int:
+    """
+    บันทึกการ login ผิด
+    return: จำนวนวินาทีที่ถูกล็อก (0 = ยังไม่ถึงกำหนด)
+    """
+    key = _login_key(username)
+    now = time.monotonic()
+    with _login_lock:
+        attempts = [t for t in _failed_logins.pop(key, []) if now - t < FAILED_LOGIN_WINDOW]
+        attempts.append(now)
+        if len(attempts) >= MAX_FAILED_LOGINS:
+            _locked_until.pop(key, None)
+            _locked_until[key] = now + LOCKOUT_SECONDS
+            _prune_logins(now)
+            return LOCKOUT_SECONDS
+        _failed_logins[key] = attempts
+        _prune_logins(now)
+        return 0
+
+
+def reset_failed_logins(username: str):
+    key = _login_key(username)
+    with _login_lock:
+        _failed_logins.pop(key, None)
+        _locked_until.pop(key, None)
+
+
+# ==========================================================
+# Session verification cache
+# ==========================================================
+# ตรวจกับตาราง users ซ้ำทุกกี่วินาที (admin ปิดบัญชี/เปลี่ยน role มีผลภายในเวลานี้
+# หรือทันทีถ้าเรียก invalidate_session)
+SESSION_CACHE_SECONDS = 60
+
+_session_cache = {}   # user_id -> (หมดอายุเมื่อ (monotonic), user_info | None)
+_session_lock = threading.Lock()
+
+
+def verify_session(user_id: int) -> dict | None:
+    """
+    ข้อมูลผู้ใช้ที่ยัง login ได้อยู่ {"id", "username", "role"}
+    return None ถ้าไม่พบผู้ใช้ หรือบัญชีถูกปิดใช้งาน
+    """
+    user_id = int(user_id)
+    now = time.monotonic()
+    with _session_lock:
+        hit = _session_cache.get(user_id)
+    if hit is not None and hit[0] > now:
+        return dict(hit[1]) if hit[1] else None
+
+    row = model.get_user_by_id(user_id)
+    info = None
+    if row and row["is_active"] == 1:
+        info = {"id": row["id"], "username": row["username"], "role": row["role"]}
+    with _session_lock:
+        _session_cache[user_id] = (now + SESSION_CACHE_SECONDS, info)
+    return dict(info) if info else None
+
+
+def remember_session(user_info: dict):
+    """เก็บผลตรวจของผู้ใช้ที่เพิ่ง login สำเร็จ (rerun ถัดไปไม่ต้องอ่าน users)"""
+    with _session_lock:
+        _session_cache[int(user_info["id"])] = (time.monotonic() + SESSION_CACHE_SECONDS, dict(user_info))
+
+
+def invalidate_session(user_id: int | None = None):
+    """ล้างผลตรวจของผู้ใช้ (None = ทุกคน) เรียกหลังเปลี่ยน role / สถานะ / รหัสผ่าน"""
+    with _session_lock:
+        if user_id is None:
+            _session_cache.clear()
+        else:
+            _session_cache.pop(int(user_id), None)
@@ -0,0 +1,10 @@
+# benchmarks/__init__.py
+"""
+สคริปต์วัดประสิทธิภาพ (ไม่ใช่ส่วนหนึ่งของแอป)
+รันจากโฟลเดอร์หลักของโปรเจกต์ เช่น
+    python -m benchmarks.bench_pdf      # สร้าง PDF รายงาน
+    python -m benchmarks.bench_model    # ฟังก์ชันหลักของ model.py บนข้อมูลสังเคราะห์ (ผล JSON)
+    python -m benchmarks.load_circulation  # หลายเคาน์เตอร์ยืม-คืนพร้อมกัน + ตรวจความผิดปกติของข้อมูล
+    python -m benchmarks.bench_startup  # เวลา import ตอนเริ่มแอป/เปิดแต่ละหน้า (-X importtime)
+    python -m benchmarks.synthetic      # สร้างฐานข้อมูลสังเคราะห์ไว้ใช้เอง
+"""
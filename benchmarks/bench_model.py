@@ -0,0 +1,248 @@
+# benchmarks/bench_model.py
+"""
+วัดเวลาฟังก์ชันหลักของ model.py บนฐานข้อมูลสังเคราะห์ (benchmarks/synthetic.py)
+ผลเป็น JSON (p50 / p95 / p99 และแถวต่อวินาที) เก็บไว้เทียบระหว่างเวอร์ชันได้
+
+    python -m benchmarks.bench_model --out bench.json
+    python -m benchmarks.bench_model --books 100000 --transactions 300000 --repeat 50
+    python -m benchmarks.bench_model --db /tmp/bench.db --reuse --compare bench.json
+
+ฟังก์ชันอ่านวัดแบบไม่ใช้ read cache ของ model (ล้าง cache ก่อนทุกครั้ง) เพื่อให้เห็นเวลา query จริง
+ใช้ --warm ถ้าต้องการวัดกรณี cache hit
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import model
+from benchmarks import synthetic
+
+# ถ้า p50 ช้ากว่าผลที่เทียบเกินสัดส่วนนี้ ถือว่าช้าลง (--compare)
+REGRESSION_THRESHOLD = 1.2
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """percentile แบบ nearest-rank ของค่าที่เรียงแล้ว"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(times: list[float], rows: list[int]) -> dict:
+    """สรุปเวลาที่วัดได้ (วินาที) เป็น ms และแถวต่อวินาที"""
+    ordered = sorted(times)
+    total_time = sum(times)
+    return {
+        "calls": len(times),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(times) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "rows_per_call": round(sum(rows) / len(rows), 1),
+        "rows_per_sec": round(sum(rows) / total_time, 1) if total_time else None,
+    }
+
+
+def _rows(result) -> int:
+    """จำนวนแถวของผลลัพธ์ (DataFrame / list / ค่าอื่นนับเป็น 1)"""
+    try:
+        return len(result)
+    except TypeError:
+        return 1
+
+
+def time_calls(fn, repeat: int, warm: bool) -> dict:
+    """
+    เรียก fn() ซ้ำ repeat ครั้ง
+    fn คืน (ผลลัพธ์, จำนวนแถว) หรือผลลัพธ์อย่างเดียว (นับแถวด้วย len)
+    """
+    times, rows = [], []
+    fn()  # warm-up: เปิด connection / โหลด page ของไฟล์เข้าหน่วยความจำ
+    for _ in range(repeat):
+        if not warm:
+            model.clear_read_cache()
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+        rows.append(result[1] if isinstance(result, tuple) else _rows(result))
+    return summarize(times, rows)
+
+
+def _ids(sql: str) -> list[int]:
+    with model.borrow_connection() as conn:
+        return [r[0] for r in conn.execute(sql)]
+
+
+def read_cases(dataset: dict) -> dict:
+    """ชื่อ -> fn() ของฟังก์ชันอ่าน"""
+    end = dataset["end_date"]
+    last_90 = (datetime.strptime(end, "%Y-%m-%d") - timedelta(days=90)).strftime("%Y-%m-%d")
+    full = (dataset["start_date"], end)
+    return {
+        "get_all_books": model.get_all_books,
+        "get_available_books": model.get_available_books,
+        "get_borrow_history": lambda: model.get_borrow_history(limit=200),
+        "get_borrow_history[keyword]": lambda: model.get_borrow_history(limit=200, keyword="ประวัติศาสตร์"),
+        "get_borrow_history[returned,90d]": lambda: model.get_borrow_history(
+            limit=200, start_date=last_90, end_date=end, status="returned"
+        ),
+        "get_borrow_report[90d]": lambda: model.get_borrow_report(last_90, end, "all"),
+        "get_borrow_report[all]": lambda: model.get_borrow_report(*full, "all"),
+        "get_borrow_summary_by_month": lambda: model.get_borrow_summary_by_month(*full),
+    }
+
+
+def write_cases(dataset: dict, repeat: int, seed: int) -> dict:
+    """
+    วัดการยืม/คืนทีละรายการ (เขียนจริงลงฐานข้อมูลสังเคราะห์)
+    ยืมจากเล่มที่ว่างอยู่ และคืนรายการที่ค้างอยู่ก่อนเริ่มวัด ไม่ให้ผลขึ้นกับลำดับการรัน
+    """
+    rnd = random.Random(seed)
+    available = _ids("SELECT id FROM books WHERE status = 'available'")
+    open_items = _ids("SELECT id FROM borrow_items WHERE status = 'borrowed'")
+    member_ids = _ids("SELECT id FROM members WHERE is_active = 1")
+    staff_ids = _ids("SELECT id FROM users")
+    rnd.shuffle(available)
+    rnd.shuffle(open_items)
+    due = (datetime.now() + timedelta(days=synthetic.LOAN_DAYS)).strftime("%Y-%m-%d")
+
+    def borrow():
+        n = rnd.randint(1, 3)
+        book_ids = [available.pop() for _ in range(n)]
+        model.create_borrow_transaction(rnd.choice(member_ids), rnd.choice(staff_ids), due, book_ids)
+        return None, n
+
+    def return_one():
+        model.return_borrow_item(open_items.pop(), rnd.choice(staff_ids))
+        return None, 1
+
+    cases = {}
+    # ต้องการรายการสำหรับ warm-up 1 ครั้ง + repeat ครั้ง
+    if len(available) >= 3 * (repeat + 1):
+        cases["create_borrow_transaction"] = borrow
+    if len(open_items) >= repeat + 1:
+        cases["return_borrow_item"] = return_one
+    return cases
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(results: dict, baseline_path: str):
+    """พิมพ์ p50 เทียบกับไฟล์ผลเดิม แสดง ⚠ เมื่อช้าลงเกิน REGRESSION_THRESHOLD"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    print(f"\nเทียบกับ {baseline_path}")
+    for name, stats in results.items():
+        old = baseline.get(name)
+        if not old or not old["p50_ms"]:
+            print(f"  {name:<36} (ไม่มีในผลเดิม)")
+            continue
+        ratio = stats["p50_ms"] / old["p50_ms"]
+        flag = "⚠ ช้าลง" if ratio > REGRESSION_THRESHOLD else ""
+        print(f"  {name:<36} {old['p50_ms']:>10.2f} -> {stats['p50_ms']:>10.2f} ms  x{ratio:5.2f} {flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="ไฟล์ฐานข้อมูลสำหรับวัด (ค่าเริ่มต้น = ไฟล์ชั่วคราว)")
+    parser.add_argument("--reuse", action="store_true", help="ใช้ไฟล์ --db ที่มีอยู่แล้ว ไม่สร้างข้อมูลใหม่")
+    for name, default in synthetic.DEFAULT_COUNTS.items():
+        parser.add_argument(f"--{name}", type=int, default=default)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=30, help="จำนวนครั้งที่เรียกต่อฟังก์ชัน")
+    parser.add_argument("--warm", action="store_true", help="ไม่ล้าง read cache ระหว่างรอบ")
+    parser.add_argument("--only", nargs="+", help="วัดเฉพาะชื่อที่ขึ้นต้นด้วยคำเหล่านี้")
+    parser.add_argument("--out", help="เขียนผล JSON ลงไฟล์ (ค่าเริ่มต้น = พิมพ์ออกจอ)")
+    parser.add_argument("--compare", help="ไฟล์ JSON ผลเดิมสำหรับเทียบ p50")
+    args = parser.parse_args(argv)
+
+    tmp_dir = None
+    db_path = args.db
+    if db_path is None:
+        tmp_dir = tempfile.TemporaryDirectory(prefix="library_bench_")
+        db_path = os.path.join(tmp_dir.name, "bench.db")
+
+    if args.reuse and os.path.exists(db_path):
+        with sqlite3.connect(db_path) as conn:
+            dates = conn.execute("SELECT MIN(date(borrow_date)), MAX(date(borrow_date)) FROM borrow_tx").fetchone()
+            dataset = {
+                t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                for t in ("books", "members", "users", "borrow_tx", "borrow_items")
+            }
+        dataset.update(start_date=dates[0], end_date=dates[1], reused=True)
+    else:
+        t0 = time.perf_counter()
+        dataset = synthetic.generate_library(
+            db_path, books=args.books, members=args.members, users=args.users,
+            transactions=args.transactions, seed=args.seed,
+        )
+        dataset["generate_seconds"] = round(time.perf_counter() - t0, 2)
+
+    model.DB_PATH = db_path
+    model.ensure_schema()
+
+    # อ่านก่อนเขียน: ฟังก์ชันอ่านเห็นข้อมูลชุดเดียวกันทุกครั้งที่รัน
+    cases = {**read_cases(dataset), **write_cases(dataset, args.repeat, args.seed)}
+    if args.only:
+        cases = {k: v for k, v in cases.items() if k.startswith(tuple(args.only))}
+
+    results = {}
+    for name, fn in cases.items():
+        results[name] = time_calls(fn, args.repeat, args.warm)
+        s = results[name]
+        print(
+            f"{name:<36} p50 {s['p50_ms']:>9.2f}  p95 {s['p95_ms']:>9.2f}  p99 {s['p99_ms']:>9.2f} ms"
+            f"  {s['rows_per_call']:>10,.0f} แถว  {s['rows_per_sec'] or 0:>12,.0f} แถว/s",
+            flush=True,
+        )
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "db_profile": model.DB_PROFILE,
+            "repeat": args.repeat,
+            "read_cache": "warm" if args.warm else "cold",
+            "dataset": dataset,
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"บันทึกผลที่ {args.out}")
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.compare:
+        compare(results, args.compare)
+
+    model.close_all_connections()
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/bench_pdf.py
+"""
+วัดเวลาสร้าง PDF รายงานการยืม-คืนด้วยข้อมูลสังเคราะห์ (ไม่แตะฐานข้อมูล)
+
+    python -m benchmarks.bench_pdf                      # 10,000 และ 50,000 แถว
+    python -m benchmarks.bench_pdf --rows 2000 --legacy # เทียบกับวิธีเดิม (Paragraph ทุกช่อง + Table ก้อนเดียว)
+    python -m benchmarks.bench_pdf --rows 50000 --memory # + หน่วยความจำสูงสุดระหว่างสร้าง (tracemalloc ช้าลงราว 2 เท่า)
+"""
+import argparse
+import io
+import random
+import time
+import tracemalloc
+
+import pdf_report
+
+COLUMNS = [
+    "รหัสสมาชิก", "ชื่อสมาชิก", "ชื่อหนังสือ", "วันที่ยืม", "กำหนดส่ง",
+    "วันที่คืน", "สถานะ", "ผู้ทำรายการยืม", "ผู้ทำรายการคืน",
+]
+WORDS = ["การเรียนรู้", "ภาษาไทย", "ประวัติศาสตร์", "Python", "ฐานข้อมูล", "วิทยาศาสตร์", "นิทาน", "คู่มือ", "เบื้องต้น"]
+
+
+def synthetic_rows(n: int, seed: int = 42):
+    """แถวหน้าตาเหมือนผลของ model.iter_borrow_report (ชื่อหนังสือบางแถวยาวจนต้องตัดบรรทัด)"""
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        returned = rnd.random() < 0.6
+        day = 1 + i % 28
+        rows.append((
+            1000 + rnd.randrange(500),
+            f"สมาชิก {rnd.choice(WORDS)} {i % 977}",
+            " ".join(rnd.choice(WORDS) for _ in range(rnd.choice((2, 3, 3, 4, 9)))),
+            f"2026-02-{day:02d} 10:15:00",
+            f"2026-03-{day:02d}",
+            f"2026-03-{day:02d} 09:00:00" if returned else None,
+            "returned" if returned else "borrowed",
+            "admin",
+            "staff01" if returned else None,
+        ))
+    return rows
+
+
+def as_chunks(n: int, size: int = 2000):
+    """สร้างแถวทีละช่วงแบบเดียวกับ cursor (ไม่มีรายงานทั้งก้อนอยู่ในหน่วยความจำก่อนเริ่ม)"""
+    for start in range(0, n, size):
+        yield COLUMNS, synthetic_rows(min(size, n - start), seed=start)
+
+
+def legacy_pdf(out, rows):
+    """วิธีเดิมในหน้า report_page: Paragraph ทุกช่อง + Table เดียวทั้งรายงาน"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Table
+
+    pdf_report.register_fonts()
+    body = ParagraphStyle(name="ThaiBody", fontName=pdf_report.FONT_NAME, fontSize=10, leading=14)
+    data = [[Paragraph(f"<b>{c}</b>", body) for c in COLUMNS]]
+    data += [[Paragraph(str(v), body) for v in row] for row in rows]
+    SimpleDocTemplate(out, pagesize=A4).build([Table(data, repeatRows=1)])
+
+
+def run(label: str, fn, n: int, memory: bool = False):
+    out = io.BytesIO()
+    if memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    fn(out, n)
+    elapsed = time.perf_counter() - t0
+    peak = ""
+    if memory:
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak = f"  peak {peak_bytes / 2**20:8,.1f} MB"
+    size_kb = len(out.getvalue()) / 1024
+    print(f"{label:<8} {n:>8,} แถว  {elapsed:8.2f} s  {n / elapsed:10,.0f} แถว/s  {size_kb:10,.0f} KB{peak}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--legacy", action="store_true", help="รันวิธีเดิมด้วย (ช้ามากเมื่อแถวเยอะ)")
+    parser.add_argument("--memory", action="store_true", help="วัดหน่วยความจำสูงสุด (Python heap) ระหว่างสร้างด้วย tracemalloc")
+    args = parser.parse_args(argv)
+
+    # ลงทะเบียนฟอนต์ก่อนจับเวลา (เกิดครั้งเดียวต่อ process ในแอปจริง)
+    t0 = time.perf_counter()
+    pdf_report.register_fonts()
+    print(f"register_fonts: {time.perf_counter() - t0:.3f} s")
+
+    for n in args.rows:
+        run("chunked", lambda out, k: pdf_report.build_pdf(out, "benchmark", f"{k} rows", as_chunks(k)), n, args.memory)
+        if args.legacy:
+            run("legacy", lambda out, k: legacy_pdf(out, synthetic_rows(k)), n, args.memory)
+
+
+if __name__ == "__main__":
+    main()
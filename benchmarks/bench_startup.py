@@ -0,0 +1,131 @@
+# benchmarks/bench_startup.py
+"""
+วัดเวลา import ตอนเริ่มแอป ด้วย `python -X importtime` (process ใหม่ทุกรอบ = cold start จริง)
+
+    python -m benchmarks.bench_startup                     # ทุก target ค่าเริ่มต้น
+    python -m benchmarks.bench_startup --top 15            # + module ที่ใช้เวลามากที่สุดของแต่ละ target
+    python -m benchmarks.bench_startup --targets "streamlit,controller,pages.login_page" --out startup.json
+
+target คือรายชื่อ module คั่นด้วย , (import พร้อมกันใน process เดียว)
+รายงานเวลา import รวม (median) และบอกว่า target นั้นลาก library หนัก (plotly.express / ReportLab / openpyxl) มาด้วยหรือไม่
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+from benchmarks.bench_model import git_commit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# สิ่งที่ app.py ต้อง import ก่อนแสดงหน้าแรก (ยังไม่ login / staff เปิดหน้าหนังสือ)
+DEFAULT_TARGETS = [
+    "streamlit",
+    "model",
+    "controller",
+    "streamlit,controller,render_stats,pages.login_page",
+    "streamlit,controller,render_stats,pages.book_page",
+    "pages.borrow_page",
+    "pages.report_page",
+    "pages.admin_page",
+]
+
+HEAVY_MODULES = ("plotly.express", "reportlab", "openpyxl")
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """
+    แปลงผลของ -X importtime เป็น [(module, self_us, cumulative_us, ระดับความลึก)]
+    บรรทัดรูปแบบ "import time:  self [us] | cumulative | imported package"
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # บรรทัดหัวตาราง
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(parts[0]), int(parts[1]), depth))
+    return rows
+
+
+def measure(target: str) -> dict:
+    """import target ใน process ใหม่ 1 ครั้ง"""
+    modules = [m.strip() for m in target.split(",") if m.strip()]
+    code = "import " + ", ".join(modules)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {target} ไม่สำเร็จ:\n{proc.stderr[-2000:]}")
+    rows = parse_importtime(proc.stderr)
+    imported = {name for name, _, _, _ in rows}
+    return {
+        # เวลารวม = ผลรวม cumulative ของ module ระดับบนสุด (ความลึก 0) ที่ถูก import ใน process นี้
+        "total_ms": sum(cum for _, _, cum, depth in rows if depth == 0) / 1000,
+        "modules": len(rows),
+        "heavy": [m for m in HEAVY_MODULES if m in imported],
+        "rows": rows,
+    }
+
+
+def run_target(target: str, repeat: int, top: int) -> dict:
+    runs = [measure(target) for _ in range(repeat)]
+    totals = [r["total_ms"] for r in runs]
+    last = runs[-1]
+    result = {
+        "median_ms": round(statistics.median(totals), 1),
+        "min_ms": round(min(totals), 1),
+        "max_ms": round(max(totals), 1),
+        "modules": last["modules"],
+        "heavy_imported": last["heavy"],
+    }
+    if top:
+        slowest = sorted(last["rows"], key=lambda r: r[1], reverse=True)[:top]
+        result["slowest_self_ms"] = [{"module": name, "self_ms": round(s / 1000, 1)} for name, s, _, _ in slowest]
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", nargs="+", default=DEFAULT_TARGETS)
+    parser.add_argument("--repeat", type=int, default=5, help="จำนวนรอบต่อ target (ใช้ค่ามัธยฐาน)")
+    parser.add_argument("--top", type=int, default=0, help="แสดง module ที่ใช้เวลา (self) มากที่สุด N อันดับ")
+    parser.add_argument("--out", help="เขียนผล JSON ลงไฟล์")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for target in args.targets:
+        r = results[target] = run_target(target, args.repeat, args.top)
+        heavy = ", ".join(r["heavy_imported"]) or "-"
+        print(
+            f"{target:<52} {r['median_ms']:>8.1f} ms (min {r['min_ms']:.1f} / max {r['max_ms']:.1f})"
+            f"  {r['modules']:>5} modules  หนัก: {heavy}",
+            flush=True,
+        )
+        for item in r.get("slowest_self_ms", []):
+            print(f"    {item['self_ms']:>8.1f} ms  {item['module']}")
+
+    if args.out:
+        report = {
+            "meta": {
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "git_commit": git_commit(),
+                "python": sys.version.split()[0],
+                "repeat": args.repeat,
+            },
+            "results": results,
+        }
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"บันทึกผลที่ {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+# benchmarks/load_circulation.py
+"""
+จำลองหลายเคาน์เตอร์ยืม-คืนพร้อมกันบนฐานข้อมูลไฟล์เดียว (ไม่ใช้ Streamlit)
+
+แต่ละ worker คือพนักงาน 1 คน วนทำรายการผ่าน controller.borrow_books / controller.return_book_items
+ตามสัดส่วนที่กำหนด พักระหว่างรายการ (think time) แล้วสรุป:
+- throughput และ latency (p50/p95/p99 + histogram) แยกยืม/คืน
+- ผลลัพธ์แต่ละแบบ: สำเร็จ / ชนกันตามปกติ (เล่มถูกยืม-คืนไปก่อน) / database locked / error อื่น
+- ความผิดปกติของข้อมูลหลังรันจบ (เล่มถูกยืมซ้อน, borrow_tx เปิดค้างทั้งที่ไม่มีเล่มค้าง, ตารางสรุปไม่ตรง ...)
+
+    python -m benchmarks.load_circulation --workers 8 --duration 30
+    python -m benchmarks.load_circulation --mode process --workers 4 --borrow-ratio 0.7 --think-ms 50
+    python -m benchmarks.load_circulation --profile default --out load.json   # เทียบกับโปรไฟล์ไม่มี WAL
+
+exit code 1 เมื่อพบความผิดปกติของข้อมูล (ใช้ตรวจทุกครั้งที่แก้โค้ดส่วน concurrency ได้)
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import controller
+import model
+from benchmarks import synthetic
+from benchmarks.bench_model import git_commit, percentile
+
+# ขอบบนของช่อง histogram (ms) ช่องสุดท้ายคือมากกว่าค่าสุดท้าย
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+OUTCOMES = ("ok", "conflict", "locked", "error")
+
+# ข้อความ error ของ SQLite เมื่อรอ lock ไม่ไหว (controller ส่งกลับมาในข้อความ)
+LOCK_ERROR_PATTERN = re.compile(r"database is locked|database table is locked|database is busy", re.IGNORECASE)
+RETURNED_COUNT_PATTERN = re.compile(r"สำเร็จ (\d+) รายการ")
+
+# ตรวจความถูกต้องของข้อมูลหลังรัน: ชื่อ -> SQL ที่ต้องได้ 0
+ANOMALY_CHECKS = {
+    "book_borrowed_twice": """
+        SELECT COUNT(*) FROM (
+            SELECT book_id FROM borrow_items WHERE status = 'borrowed' GROUP BY book_id HAVING COUNT(*) > 1
+        )
+    """,
+    "open_tx_without_borrowed_items": """
+        SELECT COUNT(*) FROM borrow_tx tx
+        WHERE tx.status = 'open'
+          AND NOT EXISTS (SELECT 1 FROM borrow_items bi WHERE bi.tx_id = tx.id AND bi.status = 'borrowed')
+    """,
+    "closed_tx_with_borrowed_items": """
+        SELECT COUNT(*) FROM borrow_tx tx
+        WHERE tx.status = 'closed'
+          AND EXISTS (SELECT 1 FROM borrow_items bi WHERE bi.tx_id = tx.id AND bi.status = 'borrowed')
+    """,
+    "book_borrowed_without_open_item": """
+        SELECT COUNT(*) FROM books b
+        WHERE b.status = 'borrowed'
+          AND NOT EXISTS (SELECT 1 FROM borrow_items bi WHERE bi.book_id = b.id AND bi.status = 'borrowed')
+    """,
+    "book_available_with_open_item": """
+        SELECT COUNT(*) FROM books b
+        WHERE b.status = 'available'
+          AND EXISTS (SELECT 1 FROM borrow_items bi WHERE bi.book_id = b.id AND bi.status = 'borrowed')
+    """,
+    "agg_book_status_drift": """
+        SELECT COUNT(*) FROM (
+            SELECT COALESCE(status, '') AS status, COUNT(*) AS total FROM books GROUP BY 1
+        ) real
+        LEFT JOIN agg_book_status a ON a.status = real.status
+        WHERE a.total IS NOT real.total
+    """,
+    "agg_member_active_loans_drift": """
+        SELECT COUNT(*) FROM (
+            SELECT tx.member_id, COUNT(*) AS total
+            FROM borrow_items bi JOIN borrow_tx tx ON tx.id = bi.tx_id
+            WHERE bi.status = 'borrowed'
+            GROUP BY tx.member_id
+        ) real
+        LEFT JOIN agg_member_active_loans a ON a.member_id = real.member_id
+        WHERE a.total IS NOT real.total
+    """,
+}
+
+
+def _classify(ok: bool, msgs: list[str]) -> str:
+    if ok:
+        return "ok"
+    text = " ".join(msgs)
+    if LOCK_ERROR_PATTERN.search(text):
+        return "locked"
+    if "ไม่พร้อมให้ยืม" in text:
+        return "conflict"
+    return "error"
+
+
+class WorkerStats:
+    """ผลของ worker 1 ตัว (รวมกันได้ด้วย merge)"""
+
+    def __init__(self):
+        self.latencies = {"borrow": [], "return": []}
+        self.outcomes = {op: dict.fromkeys(OUTCOMES, 0) for op in self.latencies}
+        self.items = {"borrowed": 0, "returned": 0, "return_stale": 0}
+        self.errors = []
+
+    def record(self, op: str, seconds: float, outcome: str, msgs: list[str]):
+        self.latencies[op].append(seconds)
+        self.outcomes[op][outcome] += 1
+        if outcome in ("locked", "error") and len(self.errors) < 20:
+            self.errors.append(f"{op}: {' '.join(msgs)}")
+
+    def to_dict(self) -> dict:
+        return {"latencies": self.latencies, "outcomes": self.outcomes, "items": self.items, "errors": self.errors}
+
+    def merge(self, other: dict):
+        for op in self.latencies:
+            self.latencies[op].extend(other["latencies"][op])
+            for outcome, n in other["outcomes"][op].items():
+                self.outcomes[op][outcome] += n
+        for key, n in other["items"].items():
+            self.items[key] += n
+        self.errors.extend(other["errors"][: max(0, 20 - len(self.errors))])
+
+
+def _snapshot_ids(conn, sql: str, params=()) -> list[int]:
+    return [r[0] for r in conn.execute(sql, params)]
+
+
+def run_worker(config: dict) -> dict:
+    """
+    พนักงาน 1 คน: วนยืม/คืนจนหมดเวลา
+    การเลือกเล่ม/รายการอ่านจากข้อมูลที่อาจล้าสมัยแล้ว (เหมือนหน้าจอที่เปิดค้างไว้) จึงชนกับ worker อื่นได้จริง
+    """
+    model.DB_PATH = config["db_path"]
+    if model.DB_PROFILE != config["profile"]:
+        model.set_db_profile(config["profile"])
+
+    rnd = random.Random(config["seed"])
+    stats = WorkerStats()
+    staff_id = config["staff_id"]
+    due = (datetime.now() + timedelta(days=synthetic.LOAN_DAYS)).strftime("%Y-%m-%d")
+    book_weights = synthetic.zipf_cumulative(len(config["book_ids"]), synthetic.ZIPF_EXPONENT, random.Random(config["popularity_seed"]))
+    max_item_id = config["max_item_id"]
+    deadline = time.monotonic() + config["duration"]
+
+    while time.monotonic() < deadline:
+        if rnd.random() < config["borrow_ratio"]:
+            # เลือกเล่มยอดนิยม (ตาม Zipf) ที่ตอนอ่านยังว่างอยู่
+            wanted = {config["book_ids"][synthetic.pick_weighted(book_weights, rnd)] for _ in range(rnd.randint(1, 3) * 3)}
+            with model.borrow_connection() as conn:
+                marks = ",".join("?" * len(wanted))
+                candidates = _snapshot_ids(conn, f"SELECT id FROM books WHERE id IN ({marks}) AND status = 'available'", tuple(wanted))
+            if not candidates:
+                continue
+            book_ids = rnd.sample(candidates, min(len(candidates), rnd.randint(1, 3)))
+            member_id = rnd.choice(config["member_ids"])
+
+            t0 = time.perf_counter()
+            ok, msgs, _ = controller.borrow_books(member_id, staff_id, due, book_ids)
+            stats.record("borrow", time.perf_counter() - t0, _classify(ok, msgs), msgs)
+            if ok:
+                stats.items["borrowed"] += len(book_ids)
+        else:
+            # รายการค้างช่วงสุ่ม (worker อื่นอาจคืนไปก่อนแล้ว)
+            with model.borrow_connection() as conn:
+                item_ids = _snapshot_ids(
+                    conn,
+                    "SELECT id FROM borrow_items WHERE id >= ? AND status = 'borrowed' ORDER BY id LIMIT ?",
+                    (rnd.randint(1, max_item_id), rnd.randint(1, 3)),
+                )
+            if not item_ids:
+                continue
+
+            t0 = time.perf_counter()
+            ok, msgs = controller.return_book_items(item_ids, staff_id)
+            elapsed = time.perf_counter() - t0
+            match = RETURNED_COUNT_PATTERN.search(msgs[0]) if ok else None
+            returned = int(match.group(1)) if match else 0
+            stats.record("return", elapsed, _classify(ok, msgs) if not ok or returned else "conflict", msgs)
+            stats.items["returned"] += returned
+            stats.items["return_stale"] += len(item_ids) - returned if ok else 0
+
+        if config["think_ms"]:
+            time.sleep(rnd.expovariate(1000 / config["think_ms"]))
+
+    model.close_all_connections()
+    return stats.to_dict()
+
+
+def histogram(seconds: list[float]) -> dict:
+    """จำนวนรายการในแต่ละช่วง latency ('<=N ms' และ '>N ms' ช่องสุดท้าย)"""
+    counts = dict.fromkeys([f"<={b}ms" for b in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}ms"], 0)
+    keys = list(counts)
+    for s in seconds:
+        ms = s * 1000
+        for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if ms <= bound:
+                counts[keys[i]] += 1
+                break
+        else:
+            counts[keys[-1]] += 1
+    return counts
+
+
+def latency_summary(seconds: list[float], wall: float) -> dict:
+    ordered = sorted(seconds)
+    return {
+        "ops": len(ordered),
+        "ops_per_sec": round(len(ordered) / wall, 1) if wall else None,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        "histogram": histogram(ordered),
+    }
+
+
+def check_anomalies(db_path: str, open_before: int, stats: WorkerStats) -> dict:
+    """นับความผิดปกติของข้อมูล (ทุกค่าควรเป็น 0)"""
+    with sqlite3.connect(db_path) as conn:
+        found = {name: conn.execute(sql).fetchone()[0] for name, sql in ANOMALY_CHECKS.items()}
+        (open_after,) = conn.execute("SELECT COUNT(*) FROM borrow_items WHERE status = 'borrowed'").fetchone()
+    # lost update: จำนวนเล่มค้างต้องเท่ากับ ก่อนรัน + ยืมสำเร็จ - คืนสำเร็จ ตามที่ controller ตอบ
+    expected = open_before + stats.items["borrowed"] - stats.items["returned"]
+    found["open_items_mismatch"] = abs(open_after - expected)
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="ไฟล์ฐานข้อมูล (ค่าเริ่มต้น = ไฟล์ชั่วคราว)")
+    parser.add_argument("--reuse", action="store_true", help="ใช้ไฟล์ --db ที่มีอยู่แล้ว ไม่สร้างข้อมูลใหม่")
+    for name, default in synthetic.DEFAULT_COUNTS.items():
+        parser.add_argument(f"--{name}", type=int, default=default)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mode", choices=("thread", "process"), default="thread")
+    parser.add_argument("--workers", type=int, default=8, help="จำนวนพนักงาน (thread/process) พร้อมกัน")
+    parser.add_argument("--duration", type=float, default=20, help="วินาทีที่รันต่อ worker")
+    parser.add_argument("--borrow-ratio", type=float, default=0.5, help="สัดส่วนรายการยืม (ที่เหลือเป็นคืน)")
+    parser.add_argument("--think-ms", type=float, default=20, help="เวลาพักเฉลี่ยระหว่างรายการ (0 = ไม่พัก)")
+    parser.add_argument("--profile", choices=tuple(model.PRAGMA_PROFILES), default=model.DB_PROFILE)
+    parser.add_argument("--out", help="เขียนผล JSON ลงไฟล์")
+    args = parser.parse_args(argv)
+
+    tmp_dir = None
+    db_path = args.db
+    if db_path is None:
+        tmp_dir = tempfile.TemporaryDirectory(prefix="library_load_")
+        db_path = os.path.join(tmp_dir.name, "load.db")
+    if not (args.reuse and os.path.exists(db_path)):
+        synthetic.generate_library(
+            db_path, books=args.books, members=args.members, users=args.users,
+            transactions=args.transactions, seed=args.seed,
+        )
+
+    with sqlite3.connect(db_path) as conn:
+        book_ids = _snapshot_ids(conn, "SELECT id FROM books ORDER BY id")
+        member_ids = _snapshot_ids(conn, "SELECT id FROM members WHERE is_active = 1")
+        staff_ids = _snapshot_ids(conn, "SELECT id FROM users WHERE is_active = 1 ORDER BY id")
+        (max_item_id,) = conn.execute("SELECT COALESCE(MAX(id), 1) FROM borrow_items").fetchone()
+        (open_before,) = conn.execute("SELECT COUNT(*) FROM borrow_items WHERE status = 'borrowed'").fetchone()
+
+    configs = [
+        {
+            "db_path": db_path, "profile": args.profile, "duration": args.duration,
+            "borrow_ratio": args.borrow_ratio, "think_ms": args.think_ms,
+            "seed": args.seed * 1000 + i, "popularity_seed": args.seed,
+            "staff_id": staff_ids[i % len(staff_ids)],
+            "book_ids": book_ids, "member_ids": member_ids, "max_item_id": max_item_id,
+        }
+        for i in range(args.workers)
+    ]
+
+    print(f"{args.workers} {args.mode} x {args.duration:.0f} s  profile={args.profile}  db={db_path}", flush=True)
+    t0 = time.perf_counter()
+    if args.mode == "thread":
+        results = [None] * len(configs)
+
+        def target(i):
+            results[i] = run_worker(configs[i])
+
+        threads = [threading.Thread(target=target, args=(i,)) for i in range(len(configs))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    else:
+        with multiprocessing.get_context("spawn").Pool(args.workers) as pool:
+            results = pool.map(run_worker, configs)
+    wall = time.perf_counter() - t0
+
+    stats = WorkerStats()
+    for r in results:
+        stats.merge(r)
+    anomalies = check_anomalies(db_path, open_before, stats)
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "sqlite": sqlite3.sqlite_version,
+            "mode": args.mode,
+            "workers": args.workers,
+            "duration": args.duration,
+            "borrow_ratio": args.borrow_ratio,
+            "think_ms": args.think_ms,
+            "db_profile": args.profile,
+            "wall_seconds": round(wall, 2),
+        },
+        "throughput_ops_per_sec": round(sum(len(v) for v in stats.latencies.values()) / wall, 1),
+        "operations": {op: latency_summary(v, wall) for op, v in stats.latencies.items()},
+        "outcomes": stats.outcomes,
+        "items": stats.items,
+        "anomalies": anomalies,
+        "sample_errors": stats.errors,
+    }
+
+    for op, s in report["operations"].items():
+        print(
+            f"{op:<7} {s['ops']:>7} ops {s['ops_per_sec'] or 0:>8.1f}/s  p50 {s['p50_ms']:>8.2f}  p95 {s['p95_ms']:>8.2f}"
+            f"  p99 {s['p99_ms']:>8.2f}  max {s['max_ms']:>8.2f} ms  {stats.outcomes[op]}"
+        )
+    print(f"รวม {report['throughput_ops_per_sec']} ops/s  items {stats.items}")
+    bad = {k: v for k, v in anomalies.items() if v}
+    print("⚠ พบความผิดปกติ: " + json.dumps(bad, ensure_ascii=False) if bad else "✅ ไม่พบความผิดปกติของข้อมูล")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"บันทึกผลที่ {args.out}")
+
+    if tmp_dir is not None:
+        tmp_dir.cleanup()
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,230 @@
+# benchmarks/synthetic.py
+"""
+สร้างฐานข้อมูลห้องสมุดสังเคราะห์ขนาดใหญ่สำหรับวัดประสิทธิภาพ
+
+- ชื่อหนังสือ/ผู้แต่ง/สมาชิก ปนภาษาไทยและอังกฤษ (ความยาวไม่เท่ากัน)
+- การยืมเบ้ (skewed): หนังสือและสมาชิกส่วนน้อยถูกยืม/ยืมบ่อยมาก (น้ำหนักแบบ Zipf)
+- ประวัติไล่ตามเวลา เล่มเดียวกันไม่ถูกยืมซ้อนกัน รายการเก่าคืนแล้ว รายการใหม่บางส่วนยังค้าง
+  (books.status ตรงกับรายการที่ค้างอยู่จริง เหมือนข้อมูลที่ได้จากการใช้งานแอป)
+
+    python -m benchmarks.synthetic --db /tmp/bench.db --books 20000 --transactions 50000
+"""
+import argparse
+import bisect
+import itertools
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import auth
+import migrations
+import model
+
+THAI_WORDS = [
+    "การเรียนรู้", "ภาษาไทย", "ประวัติศาสตร์", "วิทยาศาสตร์", "คณิตศาสตร์", "นิทาน", "คู่มือ", "เบื้องต้น",
+    "ฐานข้อมูล", "การเขียนโปรแกรม", "เศรษฐศาสตร์", "จิตวิทยา", "สุขภาพ", "อาหารไทย", "ท่องเที่ยว", "ปรัชญา",
+    "วรรณคดี", "ดาราศาสตร์", "การตลาด", "ชีววิทยา", "ศิลปะ", "ดนตรี", "กฎหมาย", "การเงิน",
+]
+ENGLISH_WORDS = [
+    "Python", "Data", "Science", "History", "Introduction", "Guide", "Modern", "Systems", "Design",
+    "Learning", "Networks", "Algorithms", "Economics", "Philosophy", "Cooking", "Travel", "Advanced",
+    "Practical", "Principles", "Management", "Security", "Cloud", "Statistics", "Biology",
+]
+THAI_FIRST = ["สมชาย", "สมหญิง", "วีรพงษ์", "กมลวรรณ", "ณัฐพล", "ปิยะนุช", "ธนากร", "อรอุมา", "ศุภชัย", "พรทิพย์", "อนุชา", "จันทร์เพ็ญ"]
+THAI_LAST = ["แวววงศ์", "ใจดี", "สุขสวัสดิ์", "ทองคำ", "ศรีสุข", "มั่นคง", "บุญมา", "รักไทย", "เจริญผล", "วงศ์ใหญ่"]
+ENGLISH_FIRST = ["John", "Mary", "David", "Sarah", "Michael", "Emma", "Daniel", "Olivia", "James", "Sophia"]
+ENGLISH_LAST = ["Smith", "Johnson", "Brown", "Taylor", "Wilson", "Clark", "Walker", "Young", "King", "Wright"]
+
+# ค่าเริ่มต้นของขนาดข้อมูล
+DEFAULT_COUNTS = {
+    "books": 20_000,
+    "members": 5_000,
+    "users": 10,
+    "transactions": 50_000,
+}
+
+# ช่วงเวลาของประวัติ (วัน ย้อนหลังจาก end_date) และระยะยืม
+HISTORY_DAYS = 730
+LOAN_DAYS = 14
+# สัดส่วนของรายการในช่วง RECENT_DAYS ล่าสุดที่ยังไม่คืน
+RECENT_DAYS = 30
+RECENT_OPEN_RATIO = 0.5
+# ความเบ้ของการยืม (เลขชี้กำลัง Zipf มากขึ้น = กระจุกที่หนังสือ/สมาชิกยอดนิยมมากขึ้น)
+ZIPF_EXPONENT = 1.1
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _title(rnd: random.Random) -> str:
+    if rnd.random() < 0.6:
+        words = rnd.sample(THAI_WORDS, rnd.choice((1, 2, 2, 3, 4)))
+        if rnd.random() < 0.3:
+            words.append(rnd.choice(ENGLISH_WORDS))
+        return " ".join(words) + (f" เล่ม {rnd.randint(1, 5)}" if rnd.random() < 0.2 else "")
+    words = rnd.sample(ENGLISH_WORDS, rnd.choice((1, 2, 3, 3, 5)))
+    return " ".join(words) + (f", {rnd.randint(2, 9)}th Edition" if rnd.random() < 0.15 else "")
+
+
+def _person(rnd: random.Random) -> str:
+    if rnd.random() < 0.75:
+        return f"{rnd.choice(THAI_FIRST)} {rnd.choice(THAI_LAST)}"
+    return f"{rnd.choice(ENGLISH_FIRST)} {rnd.choice(ENGLISH_LAST)}"
+
+
+def zipf_cumulative(n: int, exponent: float, rnd: random.Random) -> list[float]:
+    """น้ำหนักสะสมแบบ Zipf (ลำดับความนิยมสุ่มสลับกับ id ไม่ให้ id น้อยยอดนิยมเสมอ)"""
+    weights = [1.0 / (rank ** exponent) for rank in range(1, n + 1)]
+    rnd.shuffle(weights)
+    return list(itertools.accumulate(weights))
+
+
+def pick_weighted(cumulative: list[float], rnd: random.Random) -> int:
+    """ตำแหน่ง (0-based) ที่สุ่มตามน้ำหนักสะสม"""
+    return bisect.bisect_left(cumulative, rnd.random() * cumulative[-1])
+
+
+def generate_library(
+    db_path: str,
+    books: int = DEFAULT_COUNTS["books"],
+    members: int = DEFAULT_COUNTS["members"],
+    users: int = DEFAULT_COUNTS["users"],
+    transactions: int = DEFAULT_COUNTS["transactions"],
+    max_items_per_tx: int = 3,
+    end_date: datetime | None = None,
+    seed: int = 42,
+) -> dict:
+    """
+    สร้างไฟล์ฐานข้อมูลใหม่ที่ db_path (ลบไฟล์เดิมทิ้ง) แล้วเติมข้อมูลสังเคราะห์
+    return: จำนวนแถวจริงของแต่ละตาราง
+    """
+    rnd = random.Random(seed)
+    end_date = end_date or datetime.now().replace(microsecond=0)
+    start_date = end_date - timedelta(days=HISTORY_DAYS)
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    conn = sqlite3.connect(db_path)
+    model.apply_pragmas(conn, "concurrent")
+    migrations.migrate(conn)
+    c = conn.cursor()
+    conn.execute("BEGIN IMMEDIATE")
+
+    # users: admin 1 คน ที่เหลือเป็น staff (ใช้ hash เดียวกันหมด ไม่ต้องรัน PBKDF2 ทุกแถว)
+    password_hash = auth.hash_password("1234")
+    c.executemany(
+        "INSERT INTO users (username, password_hash, role, is_active) VALUES (?, ?, ?, 1)",
+        [("admin" if i == 0 else f"staff{i:02d}", password_hash, "admin" if i == 0 else "staff") for i in range(max(users, 1))],
+    )
+    user_ids = [r[0] for r in c.execute("SELECT id FROM users ORDER BY id")]
+
+    c.executemany(
+        "INSERT INTO members (member_code, name, gender, email, phone, is_active) VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (
+                f"M{i:06d}", _person(rnd), rnd.choice(("ชาย", "หญิง", "อื่น ๆ")),
+                f"member{i}@example.com", f"08{rnd.randrange(10**8):08d}", 0 if rnd.random() < 0.05 else 1,
+            )
+            for i in range(1, members + 1)
+        ],
+    )
+    member_ids = [r[0] for r in c.execute("SELECT id FROM members ORDER BY id")]
+
+    c.executemany(
+        "INSERT INTO books (title, author, status, barcode) VALUES (?, ?, 'available', ?)",
+        [(_title(rnd), _person(rnd), f"B{i:08d}") for i in range(1, books + 1)],
+    )
+    book_ids = [r[0] for r in c.execute("SELECT id FROM books ORDER BY id")]
+
+    # ประวัติการยืม: เวลายืมเรียงจากเก่าไปใหม่ เล่มที่ยังไม่คืนยืมซ้ำไม่ได้
+    book_weights = zipf_cumulative(len(book_ids), ZIPF_EXPONENT, rnd)
+    member_weights = zipf_cumulative(len(member_ids), ZIPF_EXPONENT, rnd)
+    span_seconds = HISTORY_DAYS * 86400
+    borrow_times = sorted(rnd.randrange(span_seconds) for _ in range(transactions))
+    recent_from = span_seconds - RECENT_DAYS * 86400
+
+    busy_until = {}   # book_id -> วินาทีที่คืน (None = ยังไม่คืน)
+    tx_rows, item_rows, open_books = [], [], set()
+    for tx_id, offset in enumerate(borrow_times, start=1):
+        borrowed_at = start_date + timedelta(seconds=offset)
+        due = (borrowed_at + timedelta(days=LOAN_DAYS)).strftime("%Y-%m-%d")
+        chosen = set()
+        for _ in range(rnd.randint(1, max_items_per_tx)):
+            for _attempt in range(5):
+                book_id = book_ids[pick_weighted(book_weights, rnd)]
+                until = busy_until.get(book_id, 0)
+                if book_id not in chosen and until is not None and until <= offset:
+                    chosen.add(book_id)
+                    break
+        if not chosen:
+            continue
+
+        tx_open = False
+        for book_id in chosen:
+            if offset >= recent_from and rnd.random() < RECENT_OPEN_RATIO:
+                busy_until[book_id] = None
+                open_books.add(book_id)
+                item_rows.append((tx_id, book_id, due, None, "borrowed", None))
+                tx_open = True
+            else:
+                returned = min(offset + rnd.randrange(3600, (LOAN_DAYS + 7) * 86400), span_seconds)
+                busy_until[book_id] = returned
+                item_rows.append((
+                    tx_id, book_id, due, (start_date + timedelta(seconds=returned)).strftime(TIME_FORMAT),
+                    "returned", rnd.choice(user_ids),
+                ))
+        tx_rows.append((
+            tx_id, member_ids[pick_weighted(member_weights, rnd)], rnd.choice(user_ids),
+            borrowed_at.strftime(TIME_FORMAT), due, "open" if tx_open else "closed",
+        ))
+
+    c.executemany(
+        "INSERT INTO borrow_tx (id, member_id, staff_user_id, borrow_date, default_due_date, status) VALUES (?, ?, ?, ?, ?, ?)",
+        tx_rows,
+    )
+    c.executemany(
+        "INSERT INTO borrow_items (tx_id, book_id, due_date, return_date, status, return_staff_user_id) VALUES (?, ?, ?, ?, ?, ?)",
+        item_rows,
+    )
+    c.executemany("UPDATE books SET status = 'borrowed' WHERE id = ?", [(b,) for b in open_books])
+
+    # รายการคืนที่ insert ตรง ๆ ไม่ผ่าน trigger ของการคืน: คำนวณตารางสรุปใหม่ทั้งหมด
+    migrations.rebuild_aggregates(conn)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+    return {
+        "books": len(book_ids),
+        "members": len(member_ids),
+        "users": len(user_ids),
+        "borrow_tx": len(tx_rows),
+        "borrow_items": len(item_rows),
+        "open_items": len(open_books),
+        "start_date": start_date.strftime("%Y-%m-%d"),
+        "end_date": end_date.strftime("%Y-%m-%d"),
+        "seed": seed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True, help="ไฟล์ฐานข้อมูลที่จะสร้าง (ไฟล์เดิมถูกลบ)")
+    for name, default in DEFAULT_COUNTS.items():
+        parser.add_argument(f"--{name}", type=int, default=default)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    counts = generate_library(
+        args.db, books=args.books, members=args.members, users=args.users,
+        transactions=args.transactions, seed=args.seed,
+    )
+    print(f"สร้าง {args.db} ใน {time.perf_counter() - t0:.1f} s: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 # controller.py
 import re
+import sqlite3
+import auth
+import export_jobs
 import model
 
 EMAIL_PATTERN = r"^[^@\s]+@[^@\s]+\.[^@\s]+$"
@@ -21,15 +24,31 @@ def create_book(title: str, author: str):
     model.add_book(title.strip(), author.strip())
     return True, [f"✅ บันทึก '{title.strip()}' สำเร็จแล้ว"]
 
-def edit_book(book_id: int, title: str, author: str):
+def edit_book(book_id: int, title: str, author: str, barcode: str | None = None):
+    """barcode: None = ไม่แก้บาร์โค้ด, ค่าว่าง = ลบบาร์โค้ด"""
     errors = validate_book_input(title)
+    if barcode is not None and barcode.strip() and model.is_barcode_exists(barcode, exclude_book_id=book_id):
+        errors.append("⚠ บาร์โค้ดนี้ถูกใช้กับหนังสือเล่มอื่นแล้ว")
     if errors:
         return False, errors
-    model.update_book(book_id, title.strip(), author.strip())
+    try:
+        model.update_book(book_id, title.strip(), author.strip(), barcode)
+    except sqlite3.IntegrityError:
+        # อีกเครื่องเพิ่งตั้งบาร์โค้ดเดียวกันหลังจากตรวจซ้ำด้านบน (unique index กันไว้)
+        return False, ["⚠ บาร์โค้ดนี้ถูกใช้กับหนังสือเล่มอื่นแล้ว"]
     return True, ["✅ แก้ไขข้อมูลหนังสือเรียบร้อยแล้ว"]
 
-def remove_book(book_id: int):
-    model.delete_book(book_id)
+def remove_books(book_ids: list[int]):
+    """ลบหนังสือที่เลือกหลายเล่ม คืนค่า (ok:bool, messages:list[str])"""
+    if not book_ids:
+        return False, ["⚠ กรุณาเลือกหนังสือที่จะลบอย่างน้อย 1 เล่ม"]
+    deleted, skipped = model.delete_books([int(x) for x in book_ids])
+    msgs = []
+    if deleted:
+        msgs.append(f"✅ ลบหนังสือ {len(deleted)} เล่มเรียบร้อยแล้ว")
+    if skipped:
+        msgs.append(f"⚠ ลบไม่ได้ (ไม่พบ หรือยังถูกยืมอยู่): รหัส {skipped}")
+    return bool(deleted), msgs
 
 # =========================
 # Members: validation + actions
@@ -105,61 +124,28 @@ def edit_member(
 def remove_member(member_id: int):
     model.delete_member(member_id)
 
-import hashlib
-# อย่าลืม import ไฟล์ model ของคุณด้วย เช่น:
-# import model 
-
-def _hash_password(pw: str) -> str:
-    return hashlib.sha256(pw.encode("utf-8")).hexdigest()
+def remove_members(member_ids: list[int]):
+    """ลบสมาชิกที่เลือกหลายคน คืนค่า (ok:bool, messages:list[str])"""
+    if not member_ids:
+        return False, ["⚠ กรุณาเลือกสมาชิกที่จะลบอย่างน้อย 1 คน"]
+    deleted, skipped = model.delete_members([int(x) for x in member_ids])
+    msgs = []
+    if deleted:
+        msgs.append(f"✅ ลบสมาชิก {len(deleted)} คนเรียบร้อยแล้ว")
+    if skipped:
+        msgs.append(f"⚠ ลบไม่ได้ (ไม่พบ หรือยังมีหนังสือค้างส่ง): รหัส {skipped}")
+    return bool(deleted), msgs
 
+##############################################
+# manage user
+##############################################
 def login(username: str, password: str):
     """
-    Controller-level login
+    Login (มีการเช็ค active และจำกัดจำนวนครั้งที่ login ผิด)
     return: (ok:bool, messages:list[str], user_info:dict|None)
     user_info: {"id":.., "username":.., "role":..}
     """
     errors = []
-    
-    # 1. ตรวจสอบว่ากรอกข้อมูลครบไหม
-    if not username.strip():
-        errors.append("กรุณากรอก **ชื่อผู้ใช้**")
-    
-    if not password.strip():
-        errors.append("กรุณากรอก **รหัสผ่าน**")
-        
-    if errors:
-        return False, errors, None
-
-    # 2. ดึงข้อมูลผู้ใช้จาก Database (ผ่าน Model)
-    u = model.get_user_auth_row(username)
-
-    # 3. ตรวจสอบว่าพบผู้ใช้ไหม
-    if not u:
-        return False, ["⚠ ไม่พบบัญชีผู้ใช้นี้ในระบบ"], None
-    
-    # 4. ตรวจสอบรหัสผ่าน (เทียบ Hash)
-    if _hash_password(password) != u["password_hash"]:
-        return False, ["⚠ รหัสผ่านไม่ถูกต้อง"], None
-    
-    # 5. ถ้าผ่านทั้งหมด ให้ส่งข้อมูลผู้ใช้กลับไป
-    user_info = {"id": u["id"], "username": u["username"], "role": u["role"]}
-    return True, ["✅ เข้าสู่ระบบสําเร็จ"], user_info
-
-##############################################
-# manage user
-##############################################
-
-
-import hashlib
-
-
-def _hash_password(pw: str) -> str:
-    return hashlib.sha256(pw.encode("utf-8")).hexdigest()
-
-
-def login(username: str, password: str):
-    """Login (มีการเช็ค active)"""
-    errors = []
     if not username.strip():
         errors.append("กรุณากรอก **ชื่อผู้ใช้**")
     if not password.strip():
@@ -167,24 +153,44 @@ def login(username: str, password: str):
     if errors:
         return False, errors, None
 
+    wait = auth.lockout_remaining(username)
+    if wait:
+        return False, [f"⚠ เข้าสู่ระบบผิดหลายครั้งเกินไป กรุณารออีก {wait} วินาที"], None
 
     u = model.get_user_auth_row(username)
     if not u:
+        auth.record_failed_login(username)
         return False, ["⚠ ไม่พบบัญชีผู้ใช้นี้ในระบบ"], None
 
-
     if u["is_active"] != 1:
         return False, ["⚠ บัญชีนี้ถูกปิดใช้งาน กรุณาติดต่อผู้ดูแลระบบ"], None
 
-
-    if _hash_password(password) != u["password_hash"]:
+    ok, needs_rehash = auth.verify_password(password, u["password_hash"])
+    if not ok:
+        if auth.record_failed_login(username):
+            return False, [f"⚠ รหัสผ่านไม่ถูกต้อง ระบบล็อกบัญชีนี้ชั่วคราว {auth.LOCKOUT_SECONDS} วินาที"], None
         return False, ["⚠ รหัสผ่านไม่ถูกต้อง"], None
 
+    auth.reset_failed_logins(username)
+    if needs_rehash:
+        # hash แบบเดิม (SHA-256) หรือจำนวนรอบเก่า: เก็บใหม่ด้วยค่าปัจจุบันตอนที่รู้รหัสผ่าน
+        model.update_user_password_hash(u["id"], auth.hash_password(password))
 
     user_info = {"id": u["id"], "username": u["username"], "role": u["role"]}
+    auth.remember_session(user_info)
     return True, ["✅ เข้าสู่ระบบสำเร็จ"], user_info
 
 
+def current_user(user_info: dict | None):
+    """
+    ตรวจว่าผู้ใช้ใน session ยัง login ได้อยู่ (ใช้ผลที่ cache ไว้ ไม่อ่าน users ทุก rerun)
+    return: user_info ล่าสุด (role อาจเปลี่ยน) หรือ None ถ้าบัญชีถูกลบ/ปิดใช้งาน
+    """
+    if not user_info or not user_info.get("id"):
+        return None
+    return auth.verify_session(user_info["id"])
+
+
 # -------- Admin actions --------
 def create_user(username: str, password: str, role: str, is_active: bool = True):
     errors = []
@@ -210,7 +216,7 @@ def create_user(username: str, password: str, role: str, is_active: bool = True)
 
     model.add_user(
         username=username.strip(),
-        password_hash=_hash_password(password),
+        password_hash=auth.hash_password(password),
         role=role,
         is_active=1 if is_active else 0
     )
@@ -230,6 +236,7 @@ def set_user_role(user_id: int, new_role: str, current_username: str):
 
 
     model.update_user_role(int(user_id), new_role)
+    auth.invalidate_session(user_id)
     return True, ["✅ เปลี่ยน role เรียบร้อยแล้ว"]
 
 
@@ -242,6 +249,7 @@ def set_user_active(user_id: int, is_active: bool, current_username: str):
 
 
     model.update_user_active(int(user_id), 1 if is_active else 0)
+    auth.invalidate_session(user_id)
     return True, ["✅ เปลี่ยนสถานะผู้ใช้เรียบร้อยแล้ว"]
 
 # ============================================================
@@ -290,6 +298,52 @@ def return_book_item(item_id: int, return_staff_user_id: int):
     return True, ["บันทึกการคืนเรียบร้อยแล้ว"]
 
 
+def scan_book_for_checkout(code: str, cart_ids: list[int]):
+    """
+    สแกนบาร์โค้ด/รหัสหนังสือเพื่อเพิ่มลงตะกร้ายืม
+    return: (ok:bool, messages:list[str], book:dict|None) book = ข้อมูลเล่มที่เพิ่มได้
+    """
+    code = (code or "").strip()
+    if not code:
+        return False, ["กรุณาสแกนหรือพิมพ์รหัสหนังสือ"], None
+
+    book = model.get_book_by_code(code)
+    if not book:
+        return False, [f"ไม่พบหนังสือรหัส/บาร์โค้ด {code}"], None
+    if int(book["id"]) in cart_ids:
+        return False, [f"หนังสือ {book['id']} : {book['title']} อยู่ในตะกร้าแล้ว"], None
+    if book["status"] != "available":
+        return False, [f"หนังสือ {book['id']} : {book['title']} ไม่พร้อมให้ยืม (สถานะ {book['status']})"], None
+    return True, [f"เพิ่ม {book['id']} : {book['title']} ลงตะกร้าแล้ว"], book
+
+
+def scan_book_for_return(code: str, return_staff_user_id: int):
+    """
+    สแกนบาร์โค้ด/รหัสหนังสือเพื่อคืนทันที (หารายการยืมที่ค้างของเล่มนั้นให้เอง)
+    return: (ok:bool, messages:list[str])
+    """
+    code = (code or "").strip()
+    if not code:
+        return False, ["กรุณาสแกนหรือพิมพ์รหัสหนังสือ"]
+    if not return_staff_user_id:
+        return False, ["ไม่พบข้อมูลผู้ทำรายการ (กรุณาเข้าสู่ระบบใหม่)"]
+
+    book = model.get_book_by_code(code)
+    if not book:
+        return False, [f"ไม่พบหนังสือรหัส/บาร์โค้ด {code}"]
+    item = model.get_active_borrow_item_by_book(book["id"])
+    if not item:
+        return False, [f"หนังสือ {book['id']} : {book['title']} ไม่มีรายการยืมค้างอยู่"]
+
+    try:
+        returned, _failed = model.return_borrow_items([int(item["item_id"])], int(return_staff_user_id))
+    except Exception as e:
+        return False, [f"ไม่สามารถบันทึกการคืนได้: {e}"]
+    if not returned:
+        return False, [f"หนังสือ {book['id']} : {book['title']} ถูกคืนไปแล้ว"]
+    return True, [f"คืน {book['id']} : {book['title']} ของ {item['member_code']} : {item['member_name']} เรียบร้อยแล้ว"]
+
+
 def return_book_items(item_ids: list[int], return_staff_user_id: int):
     """
     คืนหนังสือหลายรายการ (ติ๊กได้หลายเล่ม) พร้อมบันทึกผู้ทำรายการคืน
@@ -301,24 +355,49 @@ def return_book_items(item_ids: list[int], return_staff_user_id: int):
         return False, ["ไม่พบข้อมูลผู้ทำรายการ (กรุณาเข้าสู่ระบบใหม่)"]
 
 
-    success = 0
-    failed = []
-
-
-    for item_id in item_ids:
-        try:
-            ok = model.return_borrow_item(int(item_id), int(return_staff_user_id))
-            if ok:
-                success += 1
-            else:
-                failed.append(int(item_id))
-        except Exception:
-            failed.append(int(item_id))
+    try:
+        returned, failed = model.return_borrow_items(
+            [int(x) for x in item_ids],
+            int(return_staff_user_id)
+        )
+    except Exception as e:
+        return False, [f"ไม่สามารถบันทึกการคืนได้: {e}"]
 
 
-    msgs = [f"บันทึกการคืนสำเร็จ {success} รายการ"]
+    msgs = [f"บันทึกการคืนสำเร็จ {len(returned)} รายการ"]
     if failed:
         msgs.append(f"รายการที่คืนไม่สำเร็จ/ถูกคืนแล้ว: {failed}")
 
 
     return True, msgs
+
+
+# ============================================================
+# Report export jobs (ทำเบื้องหลังใน export_jobs.py)
+# ============================================================
+REPORT_STATUSES = ("all", "borrowed", "returned")
+
+
+def request_report_export(kind: str, start_date: str, end_date: str, status: str, requested_by: int | None):
+    """
+    ส่งงานส่งออกรายงานเข้าคิว
+    return: (ok:bool, messages:list[str], job_id:int|None)
+    """
+    errors = []
+    if kind not in export_jobs.EXPORT_FORMATS:
+        errors.append("รูปแบบไฟล์ไม่ถูกต้อง")
+    if status not in REPORT_STATUSES:
+        errors.append("สถานะการยืม–คืนไม่ถูกต้อง")
+    if start_date > end_date:
+        errors.append("วันที่เริ่มต้นต้องไม่มากกว่าวันที่สิ้นสุด")
+    if errors:
+        return False, errors, None
+
+    try:
+        job_id, created = export_jobs.submit_export(kind, start_date, end_date, status, requested_by)
+    except Exception as e:
+        return False, [f"ไม่สามารถส่งงานส่งออกได้: {e}"], None
+
+    if created:
+        return True, [f"✅ ส่งงานส่งออกเข้าคิวแล้ว (งาน #{job_id})"], job_id
+    return True, [f"ℹ️ มีงานส่งออกเงื่อนไขเดียวกันกำลังทำอยู่แล้ว (งาน #{job_id})"], job_id
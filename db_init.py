@@ -1,46 +1,25 @@
+import sys
 import sqlite3
-import hashlib   # 👈 ต้องมี
 
-def hash_password(pw: str) -> str:
-    return hashlib.sha256(pw.encode("utf-8")).hexdigest()
-#ฟังชั่นในการเข้ารหัส
+import auth
+import migrations
+import model
 
 # 1. เชื่อมต่อ (หรือสร้างไฟล์ถ้าไม่มี)
-conn = sqlite3.connect("library.db")
+conn = sqlite3.connect(model.DB_PATH)
+# ตั้งค่าโปรไฟล์ฐานข้อมูล (WAL / busy_timeout / cache) ครั้งแรกตอนเตรียมไฟล์
+# journal_mode=WAL จะถูกบันทึกติดไฟล์ (model ตั้งซ้ำตอนเปิด connection ก็ไม่มีผลอะไร)
+model.apply_pragmas(conn)
 c = conn.cursor()
-# 2. สร้างตาราง books ถ้ายังไม่มี
-c.execute("""
-CREATE TABLE IF NOT EXISTS books (
-    id     INTEGER PRIMARY KEY AUTOINCREMENT,
-    title  TEXT NOT NULL,
-    author TEXT,
-    status TEXT DEFAULT 'available'
-)
-""")
-c.execute("""
-CREATE TABLE IF NOT EXISTS members (
-    id          INTEGER PRIMARY KEY AUTOINCREMENT, 
-    member_code TEXT NOT NULL UNIQUE,
-    name        TEXT NOT NULL, 
-    gender      TEXT ,
-    email       TEXT UNIQUE,
-    phone       TEXT,
-    is_active   INTEGER DEFAULT 1,
-    created_at  TEXT DEFAULT CURRENT_TIMESTAMP
-)
-""")
-# -------------------------
-# users (NEW) เพิ่มส่วนนี้
-# -------------------------
-c.execute("""
-CREATE TABLE IF NOT EXISTS users (
-id INTEGER PRIMARY KEY AUTOINCREMENT,
-username TEXT NOT NULL UNIQUE,
-password_hash TEXT NOT NULL,
-role TEXT NOT NULL CHECK(role IN ('admin','staff')),
-is_active INTEGER NOT NULL DEFAULT 1
-)
-""")
+# 2. สร้าง/ปรับตารางทั้งหมด (books / members / users / borrow_*) ตามเวอร์ชันใน migrations.py
+migrations.migrate(conn)
+
+# python db_init.py --rebuild-aggregates : คำนวณตารางสรุปของหน้ารายงานใหม่ทั้งหมด
+if "--rebuild-aggregates" in sys.argv:
+    conn.execute("BEGIN IMMEDIATE")
+    migrations.rebuild_aggregates(conn)
+    conn.commit()
+    print("✅ คำนวณตารางสรุป (agg_*) ใหม่เรียบร้อยแล้ว")
 
 # seed admin (ถ้ายังไม่มี user เลย) เพิ่มส่วนนี้
 c.execute("SELECT COUNT(*) FROM users")
@@ -48,7 +27,7 @@ c.execute("SELECT COUNT(*) FROM users")
 if count == 0:
  c.execute(
     "INSERT INTO users (username, password_hash, role, is_active) VALUES (?, ?, ?, ?)",
-("admin", hash_password("1234"), "admin", 1)
+("admin", auth.hash_password("1234"), "admin", 1)
 )
 # 3. บันทึกการเปลี่ยนแปลง
 conn.commit()
@@ -0,0 +1,163 @@
+# export_jobs.py
+"""
+งานส่งออกรายงานเบื้องหลัง (CSV / Excel / PDF)
+
+- หน้า report ส่งคำขอเข้าคิวแล้วกลับไปทำงานต่อได้ทันที ไม่ต้องรอไฟล์เสร็จใน script thread
+- worker thread (จำนวนจำกัด) อ่านรายงานจาก cursor เขียนลงไฟล์ในโฟลเดอร์ exports/
+- สถานะ/ความคืบหน้าเก็บในตาราง export_jobs จึงดูต่อได้หลัง rerun หรือเปิดหน้าใหม่
+- คำขอเงื่อนไขเดียวกันที่ยังทำไม่เสร็จ ได้งานเดิมกลับไป (ไม่สร้างไฟล์ซ้ำ)
+"""
+import importlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO
+
+import model
+
+# จำนวน worker (ค่าน้อยไว้ไม่ให้แย่ง CPU/ฐานข้อมูลกับงานยืม-คืนหน้าเคาน์เตอร์)
+EXPORT_WORKERS = int(os.environ.get("LIBRARY_EXPORT_WORKERS", "1"))
+
+# เก็บไฟล์ที่ส่งออกแล้วไว้กี่ชั่วโมงก่อนลบทิ้ง
+EXPORT_RETENTION_HOURS = 24
+
+# บันทึกความคืบหน้าลงฐานข้อมูลห่างกันอย่างน้อยกี่วินาที
+PROGRESS_INTERVAL = 0.5
+
+# รูปแบบไฟล์ -> ("module:ฟังก์ชันสร้างไฟล์", นามสกุล, MIME type)
+# ระบุเป็นชื่อแล้ว import ตอนทำงานจริง (ReportLab / openpyxl ไม่ถูกโหลดตอนเปิดแอป)
+EXPORT_FORMATS = {
+    "csv": ("report_export:borrow_report_csv", "csv", "text/csv"),
+    "xlsx": ("report_export:borrow_report_excel", "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "pdf": ("pdf_report:borrow_report_pdf", "pdf", "application/pdf"),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _exporter(kind: str):
+    """ฟังก์ชันสร้างไฟล์ของรูปแบบ kind (import module ครั้งแรกที่ใช้)"""
+    module_name, _, func_name = EXPORT_FORMATS[kind][0].partition(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def export_dir() -> str:
+    """โฟลเดอร์เก็บไฟล์ที่ส่งออก (อยู่ข้างไฟล์ฐานข้อมูล)"""
+    return os.path.join(os.path.dirname(os.path.abspath(model.DB_PATH)), "exports")
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    สร้าง worker pool ครั้งแรกที่ใช้ แล้วส่งงานที่ค้างจาก process ก่อน (queued/running) กลับเข้าคิว
+    เรียกทั้งตอนส่งงานและตอนอ่านสถานะงาน: หลังรีสตาร์ท แค่เปิดหน้ารายงานงานที่ค้างก็ได้ทำต่อ
+    (ไม่ต้องรอให้มีคนส่งงานใหม่ ซึ่งระหว่างนั้นหน้ารายงานจะโชว์งานค้างและ poll ไม่รู้จบ)
+    """
+    global _executor
+    if _executor is not None:
+        return _executor
+    with _executor_lock:
+        if _executor is None:
+            executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export")
+            for job_id in model.requeue_unfinished_export_jobs():
+                executor.submit(_run_job, job_id)
+            _executor = executor
+        return _executor
+
+
+def submit_export(kind: str, start_date: str, end_date: str, status: str, requested_by: int | None) -> tuple[int, bool]:
+    """
+    ส่งงานส่งออกเข้าคิว
+    return: (job_id, สร้างใหม่หรือไม่) ถ้ามีงานเดียวกันค้างอยู่จะได้ id ของงานนั้น
+    """
+    executor = _get_executor()
+    purge_expired()
+    job_id, created = model.create_export_job(kind, start_date, end_date, status, requested_by)
+    if created:
+        executor.submit(_run_job, job_id)
+    return job_id, created
+
+
+def _run_job(job_id: int):
+    job = model.get_export_job(job_id)
+    if job is None or job["state"] != "queued":
+        return
+
+    _, extension, _ = EXPORT_FORMATS[job["kind"]]
+    path = os.path.join(export_dir(), f"report_{job_id}.{extension}")
+    part_path = path + ".part"
+    written = {"rows": 0, "saved_at": 0.0}
+
+    def progress(rows_done: int):
+        written["rows"] = rows_done
+        now = time.monotonic()
+        if now - written["saved_at"] >= PROGRESS_INTERVAL:
+            model.update_export_job_progress(job_id, rows_done)
+            written["saved_at"] = now
+
+    try:
+        total_rows = model.count_borrow_report(job["start_date"], job["end_date"], job["status_filter"])
+        if not model.start_export_job(job_id, total_rows):
+            return
+
+        exporter = _exporter(job["kind"])
+        os.makedirs(export_dir(), exist_ok=True)
+        # เขียนลงไฟล์ .part ก่อน เสร็จแล้วค่อยเปลี่ยนชื่อ (ไม่มีใครดาวน์โหลดไฟล์ที่เขียนไม่ครบ)
+        with open(part_path, "wb") as out:
+            exporter(job["start_date"], job["end_date"], job["status_filter"], out=out, progress=progress)
+        os.replace(part_path, path)
+        model.finish_export_job(job_id, path, written["rows"])
+    except Exception as e:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        model.fail_export_job(job_id, f"{type(e).__name__}: {e}")
+
+
+def get_job(job_id: int):
+    _get_executor()
+    return model.get_export_job(job_id)
+
+
+def recent_jobs(limit: int = 10) -> list[dict]:
+    _get_executor()
+    return model.get_recent_export_jobs(limit)
+
+
+def job_progress(job: dict) -> float:
+    """ความคืบหน้า 0.0 - 1.0"""
+    if job["state"] == "done":
+        return 1.0
+    if not job["total_rows"]:
+        return 0.0
+    return min(job["rows_done"] / job["total_rows"], 1.0)
+
+
+def open_result(job: dict) -> BinaryIO:
+    """
+    เปิดไฟล์ผลลัพธ์ของงานที่เสร็จแล้ว (ไม่อ่านทั้งไฟล์เข้าหน่วยความจำเอง)
+    ใช้เป็นค่าที่คืนจาก callable ของ st.download_button ได้โดยตรง
+    """
+    return open(job["file_path"], "rb")
+
+
+def result_available(job: dict) -> bool:
+    return job["state"] == "done" and bool(job["file_path"]) and os.path.exists(job["file_path"])
+
+
+def download_name(job: dict) -> str:
+    _, extension, _ = EXPORT_FORMATS[job["kind"]]
+    return f"borrow_report_{job['start_date']}_{job['end_date']}_{job['status_filter']}.{extension}"
+
+
+def mime_type(job: dict) -> str:
+    return EXPORT_FORMATS[job["kind"]][2]
+
+
+def purge_expired(max_age_hours: float = EXPORT_RETENTION_HOURS):
+    """ลบงานที่เก่ากว่า max_age_hours พร้อมไฟล์ผลลัพธ์"""
+    for path in model.delete_expired_export_jobs(max_age_hours):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,351 @@
+# migrations.py
+"""
+ปรับโครงสร้างฐานข้อมูล (schema migrations) แบบมีเวอร์ชัน
+- เก็บเวอร์ชันที่ติดตั้งแล้วในตาราง schema_version
+- MIGRATIONS เรียงตามเวอร์ชัน แต่ละขั้นเป็นคำสั่ง SQL (str) หรือฟังก์ชัน fn(conn)
+- เพิ่มการเปลี่ยน schema ใหม่ = ต่อท้าย MIGRATIONS ด้วยเวอร์ชันถัดไป (ห้ามแก้ขั้นที่ปล่อยไปแล้ว)
+"""
+import sqlite3
+
+# คำนวณตารางสรุป agg_* ใหม่ทั้งหมดจากข้อมูลจริง (ใช้ตอนติดตั้งครั้งแรก หรือเมื่อสงสัยว่าตัวเลขเพี้ยน)
+AGGREGATE_REBUILD_SQL = [
+    "DELETE FROM agg_book_status",
+    """
+    INSERT INTO agg_book_status (status, total)
+    SELECT COALESCE(status, ''), COUNT(*) FROM books GROUP BY COALESCE(status, '')
+    """,
+    "DELETE FROM agg_borrows_month",
+    """
+    INSERT INTO agg_borrows_month (month, total)
+    SELECT strftime('%Y-%m', borrow_date), COUNT(*) FROM borrow_tx GROUP BY 1
+    """,
+    "DELETE FROM agg_returns_month",
+    """
+    INSERT INTO agg_returns_month (month, total)
+    SELECT strftime('%Y-%m', return_date), COUNT(*) FROM borrow_items
+    WHERE status = 'returned' AND return_date IS NOT NULL
+    GROUP BY 1
+    """,
+    "DELETE FROM agg_member_active_loans",
+    """
+    INSERT INTO agg_member_active_loans (member_id, total)
+    SELECT tx.member_id, COUNT(*)
+    FROM borrow_items bi
+    JOIN borrow_tx tx ON tx.id = bi.tx_id
+    WHERE bi.status = 'borrowed'
+    GROUP BY tx.member_id
+    """,
+]
+
+
+def rebuild_aggregates(conn: sqlite3.Connection):
+    """คำนวณตาราง agg_* ใหม่ (ผู้เรียกเป็นคนเปิด/ปิด transaction)"""
+    for sql in AGGREGATE_REBUILD_SQL:
+        conn.execute(sql)
+
+
+MIGRATIONS = [
+    (1, "books / members / users", [
+        """
+        CREATE TABLE IF NOT EXISTS books (
+            id     INTEGER PRIMARY KEY AUTOINCREMENT,
+            title  TEXT NOT NULL,
+            author TEXT,
+            status TEXT DEFAULT 'available'
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS members (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            member_code TEXT NOT NULL UNIQUE,
+            name        TEXT NOT NULL,
+            gender      TEXT ,
+            email       TEXT UNIQUE,
+            phone       TEXT,
+            is_active   INTEGER DEFAULT 1,
+            created_at  TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL CHECK(role IN ('admin','staff')),
+            is_active INTEGER NOT NULL DEFAULT 1
+        )
+        """,
+    ]),
+    (2, "borrow_tx / borrow_items (header-detail)", [
+        """
+        CREATE TABLE IF NOT EXISTS borrow_tx (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          member_id INTEGER NOT NULL,
+          staff_user_id INTEGER NOT NULL,
+          borrow_date TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+          default_due_date TEXT,
+          status TEXT NOT NULL DEFAULT 'open',
+          note TEXT,
+          FOREIGN KEY (member_id) REFERENCES members(id),
+          FOREIGN KEY (staff_user_id) REFERENCES users(id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS borrow_items (
+          id INTEGER PRIMARY KEY AUTOINCREMENT,
+          tx_id INTEGER NOT NULL,
+          book_id INTEGER NOT NULL,
+          due_date TEXT,
+          return_date TEXT,
+          status TEXT NOT NULL DEFAULT 'borrowed',
+          return_staff_user_id INTEGER,
+          FOREIGN KEY (tx_id) REFERENCES borrow_tx(id),
+          FOREIGN KEY (book_id) REFERENCES books(id),
+          FOREIGN KEY (return_staff_user_id) REFERENCES users(id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_borrow_items_tx ON borrow_items(tx_id)",
+        "CREATE INDEX IF NOT EXISTS idx_borrow_items_book ON borrow_items(book_id)",
+        "CREATE INDEX IF NOT EXISTS idx_borrow_items_status ON borrow_items(status)",
+    ]),
+    (3, "books: index สำหรับเรียงตามชื่อ/ผู้แต่ง (แบ่งหน้าใน SQL)", [
+        "CREATE INDEX IF NOT EXISTS idx_books_title_nocase ON books(title COLLATE NOCASE, id)",
+        "CREATE INDEX IF NOT EXISTS idx_books_author_nocase ON books(author COLLATE NOCASE, id)",
+    ]),
+    # FTS5 + tokenizer trigram (SQLite 3.34 ขึ้นไป) ค้นได้ทุก substring ยาว 3 ตัวอักษรขึ้นไป
+    # ใช้กับภาษาไทยที่ไม่มีการเว้นวรรคระหว่างคำได้ดีกว่าการตัดคำตามช่องว่าง
+    (4, "books_fts: ดัชนีค้นหาข้อความเต็ม (ชื่อหนังสือ/ผู้แต่ง) + triggers", [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, author,
+            content='books', content_rowid='id',
+            tokenize='trigram'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+        """,
+        "INSERT INTO books_fts (books_fts) VALUES ('rebuild')",
+    ]),
+    (5, "borrow_tx: index ตามสมาชิก (ค้นประวัติการยืมของสมาชิก)", [
+        "CREATE INDEX IF NOT EXISTS idx_borrow_tx_member ON borrow_tx(member_id)",
+    ]),
+    (6, "agg_*: ตารางสรุปสำหรับ dashboard (อัปเดตด้วย triggers)", [
+        "CREATE TABLE IF NOT EXISTS agg_book_status (status TEXT PRIMARY KEY, total INTEGER NOT NULL DEFAULT 0)",
+        "CREATE TABLE IF NOT EXISTS agg_borrows_month (month TEXT PRIMARY KEY, total INTEGER NOT NULL DEFAULT 0)",
+        "CREATE TABLE IF NOT EXISTS agg_returns_month (month TEXT PRIMARY KEY, total INTEGER NOT NULL DEFAULT 0)",
+        "CREATE TABLE IF NOT EXISTS agg_member_active_loans (member_id INTEGER PRIMARY KEY, total INTEGER NOT NULL DEFAULT 0)",
+
+        # books -> จำนวนหนังสือตามสถานะ (status ว่างเก็บเป็น '')
+        """
+        CREATE TRIGGER IF NOT EXISTS agg_books_ai AFTER INSERT ON books BEGIN
+            INSERT INTO agg_book_status (status, total) VALUES (COALESCE(new.status, ''), 1)
+            ON CONFLICT(status) DO UPDATE SET total = total + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS agg_books_ad AFTER DELETE ON books BEGIN
+            UPDATE agg_book_status SET total = total - 1 WHERE status = COALESCE(old.status, '');
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS agg_books_au AFTER UPDATE OF status ON books
+        WHEN old.status IS NOT new.status BEGIN
+            UPDATE agg_book_status SET total = total - 1 WHERE status = COALESCE(old.status, '');
+            INSERT INTO agg_book_status (status, total) VALUES (COALESCE(new.status, ''), 1)
+            ON CONFLICT(status) DO UPDATE SET total = total + 1;
+        END
+        """,
+
+        # borrow_tx -> จำนวนการยืมรายเดือน
+        """
+        CREATE TRIGGER IF NOT EXISTS agg_borrow_tx_ai AFTER INSERT ON borrow_tx BEGIN
+            INSERT INTO agg_borrows_month (month, total) VALUES (strftime('%Y-%m', new.borrow_date), 1)
+            ON CONFLICT(month) DO UPDATE SET total = total + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS agg_borrow_tx_ad AFTER DELETE ON borrow_tx BEGIN
+            UPDATE agg_borrows_month SET total = total - 1 WHERE month = strftime('%Y-%m', old.borrow_date);
+        END
+        """,
+
+        # borrow_items -> จำนวนการคืนรายเดือน + จำนวนเล่มที่สมาชิกยืมค้าง
+        """
+        CREATE TRIGGER IF NOT EXISTS agg_borrow_items_ai AFTER INSERT ON borrow_items
+        WHEN new.status = 'borrowed' BEGIN
+            INSERT INTO agg_member_active_loans (member_id, total)
+            SELECT member_id, 1 FROM borrow_tx WHERE id = new.tx_id
+            ON CONFLICT(member_id) DO UPDATE SET total = total + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS agg_borrow_items_ad AFTER DELETE ON borrow_items
+        WHEN old.status = 'borrowed' BEGIN
+            UPDATE agg_member_active_loans SET total = total - 1
+            WHERE member_id = (SELECT member_id FROM borrow_tx WHERE id = old.tx_id);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS agg_borrow_items_au AFTER UPDATE OF status ON borrow_items
+        WHEN old.status = 'borrowed' AND new.status = 'returned' BEGIN
+            INSERT INTO agg_returns_month (month, total)
+            VALUES (strftime('%Y-%m', COALESCE(new.return_date, CURRENT_TIMESTAMP)), 1)
+            ON CONFLICT(month) DO UPDATE SET total = total + 1;
+            UPDATE agg_member_active_loans SET total = total - 1
+            WHERE member_id = (SELECT member_id FROM borrow_tx WHERE id = new.tx_id);
+        END
+        """,
+        rebuild_aggregates,
+    ]),
+    # รายงานกรองช่วงวันที่ด้วย borrow_date ตรง ๆ (ไม่ครอบด้วย DATE()) จึงใช้ index ได้
+    # index ของ borrow_tx ครอบคลุมทุกคอลัมน์ที่รายงานใช้ ไม่ต้องกลับไปอ่านตารางหลัก
+    (7, "index ช่วงวันที่ยืมสำหรับรายงาน (borrow_tx.borrow_date, borrow_items.tx_id+status)", [
+        "CREATE INDEX IF NOT EXISTS idx_borrow_tx_date ON borrow_tx(borrow_date, id, member_id, staff_user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_borrow_items_tx_status ON borrow_items(tx_id, status)",
+        # idx_borrow_items_tx(tx_id) เป็น prefix ของ index ใหม่แล้ว
+        "DROP INDEX IF EXISTS idx_borrow_items_tx",
+    ]),
+    # งานส่งออกรายงานที่ทำเบื้องหลัง (export_jobs.py) สถานะอยู่ในฐานข้อมูลจึงดูต่อได้หลัง rerun/เปิดหน้าใหม่
+    (8, "export_jobs: คิวงานส่งออกรายงาน (CSV / Excel / PDF)", [
+        """
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_key       TEXT NOT NULL,
+            kind          TEXT NOT NULL CHECK (kind IN ('csv', 'xlsx', 'pdf')),
+            start_date    TEXT NOT NULL,
+            end_date      TEXT NOT NULL,
+            status_filter TEXT NOT NULL,
+            state         TEXT NOT NULL DEFAULT 'queued' CHECK (state IN ('queued', 'running', 'done', 'failed')),
+            rows_done     INTEGER NOT NULL DEFAULT 0,
+            total_rows    INTEGER,
+            file_path     TEXT,
+            error         TEXT,
+            requested_by  INTEGER,
+            created_at    TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            started_at    TEXT,
+            finished_at   TEXT
+        )
+        """,
+        # งานที่ยังไม่เสร็จซ้ำกันไม่ได้ (คำขอเดียวกันพร้อมกันหลายครั้ง = งานเดียว)
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_export_jobs_active_key
+        ON export_jobs(job_key) WHERE state IN ('queued', 'running')
+        """,
+    ]),
+    # ค้นหาสมาชิกแบบพิมพ์นำหน้า (type-ahead) ด้วยช่วงของ index แทนการกรองทั้งตารางใน pandas
+    # member_code บางฐานข้อมูลเป็น INTEGER affinity จึงเก็บสำเนาเป็นข้อความตัวเล็กไว้อีกคอลัมน์
+    # lower() ของ SQLite แปลงเฉพาะ A-Z (ภาษาไทยไม่มีตัวเล็ก-ใหญ่อยู่แล้ว)
+    (9, "members: คอลัมน์ค้นหา member_code_lower / name_lower + index + triggers", [
+        "ALTER TABLE members ADD COLUMN member_code_lower TEXT",
+        "ALTER TABLE members ADD COLUMN name_lower TEXT",
+        "UPDATE members SET member_code_lower = lower(CAST(member_code AS TEXT)), name_lower = lower(name)",
+        """
+        CREATE TRIGGER IF NOT EXISTS members_search_ai AFTER INSERT ON members BEGIN
+            UPDATE members
+            SET member_code_lower = lower(CAST(new.member_code AS TEXT)), name_lower = lower(new.name)
+            WHERE rowid = new.rowid;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS members_search_au AFTER UPDATE OF member_code, name ON members BEGIN
+            UPDATE members
+            SET member_code_lower = lower(CAST(new.member_code AS TEXT)), name_lower = lower(new.name)
+            WHERE rowid = new.rowid;
+        END
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_members_code_lower ON members(member_code_lower)",
+        "CREATE INDEX IF NOT EXISTS idx_members_name_lower ON members(name_lower)",
+    ]),
+    # บาร์โค้ดบนตัวเล่ม (ไม่บังคับ เล่มที่ไม่มีสแกนด้วยรหัสหนังสือได้)
+    (10, "books: คอลัมน์ barcode + unique index สำหรับสแกนยืม-คืน", [
+        "ALTER TABLE books ADD COLUMN barcode TEXT",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_books_barcode ON books(barcode) WHERE barcode IS NOT NULL",
+    ]),
+    # ฐานข้อมูลเก่าบางไฟล์สร้าง members ด้วย PRIMARY KEY(id, member_code): id ไม่ใช่ rowid จึงไม่รันเลขให้เอง
+    # สมาชิกที่เพิ่มผ่านแอปได้ id เป็น NULL และเลือกยืมไม่ได้ เติม id ให้แถวเดิมและแถวใหม่ที่ไม่ได้ระบุ id
+    # (ตาราง members แบบปัจจุบัน id เป็น INTEGER PRIMARY KEY ไม่มีทางเป็น NULL trigger จึงไม่ทำอะไร)
+    (11, "members: เติม id ที่เป็น NULL (schema เก่า) + trigger กำหนด id ตอนเพิ่มสมาชิก", [
+        "UPDATE members SET id = (SELECT COALESCE(MAX(id), 0) FROM members) + rowid WHERE id IS NULL",
+        """
+        CREATE TRIGGER IF NOT EXISTS members_assign_id AFTER INSERT ON members
+        WHEN new.id IS NULL BEGIN
+            UPDATE members
+            SET id = (SELECT COALESCE(MAX(id), 0) + 1 FROM members)
+            WHERE rowid = new.rowid;
+        END
+        """,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _ensure_version_table(conn: sqlite3.Connection):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version    INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+    conn.commit()
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    """เวอร์ชัน schema ที่ติดตั้งแล้ว (0 = ยังไม่เคย migrate)"""
+    _ensure_version_table(conn)
+    (version,) = conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()
+    return int(version)
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    ติดตั้ง migration ที่ยังขาดทีละเวอร์ชัน (แต่ละเวอร์ชันอยู่ใน transaction ของตัวเอง)
+    return: เวอร์ชันล่าสุดหลัง migrate
+    """
+    version = current_version(conn)
+    for target, description, steps in MIGRATIONS:
+        if target <= version:
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # process อื่นอาจ migrate ไปก่อนระหว่างรอ lock
+            (version,) = conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()
+            if target <= version:
+                conn.rollback()
+                continue
+
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+
+            conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (target, description)
+            )
+            conn.commit()
+            version = target
+        except Exception:
+            conn.rollback()
+            raise
+
+    return version
@@ -1,79 +1,499 @@
 # model.py
+import functools
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager
+
 import pandas as pd
 
+import migrations
+import query_stats
+
 DB_PATH = "library.db"
 
+# =========================
+# PRAGMA profiles
+# =========================
+# ชุดค่า PRAGMA ที่ตั้งครั้งเดียวตอนเปิด connection (ชื่อ PRAGMA -> ค่า, ตั้งตามลำดับ)
+# - default   : ค่าเดิมของ SQLite (rollback journal) เหมาะกับเครื่องทดลอง/ไฟล์บน network share
+# - concurrent: WAL + busy_timeout สำหรับหลายเคาน์เตอร์ทำรายการพร้อมกัน
+#               (ผู้อ่าน เช่น รายงาน/ประวัติ ไม่บล็อกผู้เขียน และผู้เขียนรอ lock แทนการ error ทันที)
+PRAGMA_PROFILES = {
+    "default": {
+        "temp_store": "MEMORY",
+    },
+    "concurrent": {
+        "busy_timeout": 5000,          # ms ที่รอ lock ก่อนคืน "database is locked"
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",       # ปลอดภัยใน WAL และลด fsync ต่อ commit
+        "cache_size": -32000,          # ค่าติดลบ = KiB (ประมาณ 32 MB ต่อ connection)
+        "mmap_size": 268435456,        # 256 MB
+        "temp_store": "MEMORY",
+    },
+}
+
+# เลือกโปรไฟล์ได้จาก environment (LIBRARY_DB_PROFILE=default|concurrent)
+DB_PROFILE = os.environ.get("LIBRARY_DB_PROFILE", "concurrent")
+
+# จำนวน connection ว่างสูงสุดที่เก็บไว้ใน pool
+POOL_MAX_IDLE = 8
+
+
+def apply_pragmas(conn, profile: str | None = None):
+    """ตั้งค่า PRAGMA ตามโปรไฟล์ให้กับ connection"""
+    name = profile or DB_PROFILE
+    if name not in PRAGMA_PROFILES:
+        raise ValueError(f"ไม่รู้จักโปรไฟล์ฐานข้อมูล: {name}")
+    for pragma, value in PRAGMA_PROFILES[name].items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+
+
 def get_connection():
-    """สร้างการเชื่อมต่อฐานข้อมูล SQLite"""
-    return sqlite3.connect(DB_PATH)
+    """
+    สร้างการเชื่อมต่อฐานข้อมูล SQLite ใหม่ (ตั้งค่า PRAGMA ตามโปรไฟล์ให้เรียบร้อย)
+    ทุกคำสั่งผ่าน connection นี้ถูกจับเวลาโดย query_stats (ปิดได้ด้วย LIBRARY_QUERY_STATS=0)
+    """
+    conn = query_stats.connect(DB_PATH, check_same_thread=False)
+    apply_pragmas(conn)
+    return conn
+
+
+# =========================
+# Connection pool
+# =========================
+class ConnectionPool:
+    """
+    Pool ของ connection ที่เปิดค้างไว้ใช้ซ้ำ (แทนการ connect/close ทุกครั้งที่เรียก)
+    - แต่ละ thread (เช่น script thread ของ Streamlit) ยืมได้ครั้งละ 1 connection
+    - ถ้าเรียกซ้อนกันใน thread เดียวกัน จะได้ connection เดิมกลับไป
+    - คืน connection แล้วจะถูกเก็บไว้ให้ rerun ถัดไปใช้ต่อ
+    """
+
+    def __init__(self, db_path: str, max_idle: int = POOL_MAX_IDLE):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def connection(self):
+        held = getattr(self._local, "conn", None)
+        if held is not None:
+            yield held
+            return
+
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = get_connection()
+
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._release(conn)
+
+    def _release(self, conn):
+        try:
+            # กันกรณีฟังก์ชันลืม commit/rollback ไม่ให้ transaction ค้างไปถึงผู้ยืมคนถัดไป
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        """ปิด connection ว่างทั้งหมดใน pool"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ConnectionPool:
+    """คืน pool ของ DB_PATH ปัจจุบัน (สร้างใหม่ถ้า DB_PATH ถูกเปลี่ยน)"""
+    global _pool
+    pool = _pool
+    if pool is not None and pool.db_path == DB_PATH:
+        return pool
+    with _pool_lock:
+        if _pool is None or _pool.db_path != DB_PATH:
+            pool = ConnectionPool(DB_PATH)
+            # migrate schema ครั้งเดียวต่อ process (ต่อไฟล์ฐานข้อมูล) ก่อนให้ใครยืม connection
+            with pool.connection() as conn:
+                migrations.migrate(conn)
+            if _pool is not None:
+                _pool.close_all()
+            _pool = pool
+        return _pool
+
+
+def borrow_connection():
+    """
+    ยืม connection จาก pool ใช้กับ with:
+        with borrow_connection() as conn:
+            ...
+    """
+    return _get_pool().connection()
+
+
+def ensure_schema():
+    """เตรียม schema ให้เป็นเวอร์ชันล่าสุด (migrate จริงแค่ครั้งแรกของ process เท่านั้น)"""
+    _get_pool()
+
+
+def close_all_connections():
+    """ปิด connection ที่ค้างอยู่ใน pool (เช่น ก่อนย้าย/ลบไฟล์ฐานข้อมูล)"""
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+
+
+def set_db_profile(profile: str):
+    """เปลี่ยนโปรไฟล์ PRAGMA (connection ที่เปิดอยู่จะถูกปิด แล้วเปิดใหม่ด้วยค่าชุดใหม่)"""
+    global DB_PROFILE
+    if profile not in PRAGMA_PROFILES:
+        raise ValueError(f"ไม่รู้จักโปรไฟล์ฐานข้อมูล: {profile}")
+    DB_PROFILE = profile
+    close_all_connections()
+
+
+# =========================
+# Read cache (ล้างตามตารางที่ถูกเขียน)
+# =========================
+# ผลลัพธ์ของฟังก์ชันอ่านถูกเก็บไว้ระดับ process (ทุก session/ทุก browser ใช้ร่วมกัน)
+# แต่ละตารางมีเลข generation ที่ฟังก์ชันเขียนเพิ่มทุกครั้งหลัง commit
+# ถ้า generation ของตารางที่เกี่ยวข้องไม่เปลี่ยน rerun ของ Streamlit จะได้ DataFrame เดิม (สำเนา) โดยไม่ query ใหม่
+# หมายเหตุ: นับเฉพาะการเขียนผ่าน model.py ใน process นี้ (ถ้าแก้ไฟล์ฐานข้อมูลจากที่อื่นให้เรียก clear_read_cache())
+CIRCULATION_TABLES = ("books", "borrow_tx", "borrow_items")
+REPORT_TABLES = ("books", "borrow_tx", "borrow_items", "members", "users")
+
+READ_CACHE_MAX_ENTRIES = 256
+
+_table_generations = {}
+_read_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _bump_tables(*tables):
+    """แจ้งว่าตารางถูกเขียนแล้ว (cache ที่อ่านตารางเหล่านี้จะหมดอายุ)"""
+    with _cache_lock:
+        for table in tables:
+            _table_generations[table] = _table_generations.get(table, 0) + 1
+
+
+def _copy_result(value):
+    # DataFrame ต้องคืนเป็นสำเนา กันหน้า UI แก้ข้อมูลใน cache ที่ใช้ร่วมกัน
+    return value.copy() if isinstance(value, pd.DataFrame) else value
+
+
+def _cached_read(*tables):
+    """decorator: cache ผลลัพธ์ (DataFrame หรือค่าธรรมดา) จนกว่าตารางใน tables จะถูกเขียน"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (fn.__name__, DB_PATH, args, tuple(sorted(kwargs.items())))
+            with _cache_lock:
+                generations = tuple(_table_generations.get(t, 0) for t in tables)
+                hit = _read_cache.get(key)
+            if hit is not None and hit[0] == generations:
+                return _copy_result(hit[1])
+
+            # เก็บ generation ก่อน query: ถ้ามีการเขียนระหว่างนี้ entry จะหมดอายุเองในครั้งถัดไป
+            result = fn(*args, **kwargs)
+            with _cache_lock:
+                _read_cache.pop(key, None)
+                if len(_read_cache) >= READ_CACHE_MAX_ENTRIES:
+                    _read_cache.pop(next(iter(_read_cache)))
+                _read_cache[key] = (generations, result)
+            return _copy_result(result)
+        return wrapper
+    return decorator
+
+
+def clear_read_cache():
+    """ล้าง cache ของฟังก์ชันอ่านทั้งหมด"""
+    with _cache_lock:
+        _read_cache.clear()
+
 
 # =========================
 # Books (CRUD)
 # =========================
 def add_book(title: str, author: str):
     """เพิ่มหนังสือใหม่"""
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO books (title, author) VALUES (?, ?)",
-        (title, author)
-    )
-    conn.commit()
-    conn.close()
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO books (title, author) VALUES (?, ?)",
+            (title, author)
+        )
+        conn.commit()
+        _bump_tables("books")
 
+@_cached_read("books")
 def get_all_books() -> pd.DataFrame:
     """อ่านรายการหนังสือทั้งหมด"""
-    conn = get_connection()
-    df = pd.read_sql_query("SELECT id, title, author FROM books", conn)
-    conn.close()
-    return df
+    with borrow_connection() as conn:
+        return pd.read_sql_query("SELECT id, title, author FROM books", conn)
 
-def delete_book(book_id: int):
-    """ลบหนังสือตาม id"""
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM books WHERE id = ?", (book_id,))
-    conn.commit()
-    conn.close()
+# คอลัมน์เรียงลำดับที่อนุญาตให้ส่งมาจากหน้า UI (ชื่อ -> ORDER BY)
+BOOK_SORTS = {
+    "id_desc": "id DESC",
+    "id_asc": "id ASC",
+    "title": "title COLLATE NOCASE ASC, id ASC",
+    "author": "author COLLATE NOCASE ASC, id ASC",
+}
 
-def update_book(book_id: int, title: str, author: str):
-    """แก้ไขหนังสือตาม id"""
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute(
-        """
-        UPDATE books
-        SET title = ?, author = ?
-        WHERE id = ?
-        """,
-        (title, author, book_id)
+
+def _like_pattern(keyword: str) -> str:
+    """แปลงคำค้นเป็น pattern ของ LIKE แบบ substring (escape % และ _ ด้วย \\)"""
+    kw = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{kw}%"
+
+
+# trigram ต้องการคำค้นยาวอย่างน้อย 3 ตัวอักษร สั้นกว่านี้ใช้ LIKE แทน
+FTS_MIN_QUERY_LENGTH = 3
+
+
+def _fts_phrase(keyword: str) -> str:
+    """ห่อคำค้นเป็น phrase ของ FTS5 (กันอักขระพิเศษอย่าง " - * ถูกตีความเป็น syntax)"""
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+def _book_search_where(query: str, prefix: str = ""):
+    """เงื่อนไขค้นหาหนังสือจากชื่อ/ผู้แต่ง (ใช้ดัชนี books_fts ถ้าคำค้นยาวพอ), prefix = alias ของตาราง books เช่น 'b.'"""
+    kw = (query or "").strip()
+    if not kw:
+        return "", []
+    if len(kw) >= FTS_MIN_QUERY_LENGTH:
+        return f" WHERE {prefix}id IN (SELECT rowid FROM books_fts WHERE books_fts MATCH ?)", [_fts_phrase(kw)]
+    pattern = _like_pattern(kw)
+    return (
+        f" WHERE ({prefix}title LIKE ? ESCAPE '\\' OR {prefix}author LIKE ? ESCAPE '\\')",
+        [pattern, pattern]
     )
-    conn.commit()
-    conn.close()
+
+
+@_cached_read("books")
+def search_books(query: str = "", offset: int = 0, limit: int = 50, sort: str = "id_desc") -> pd.DataFrame:
+    """
+    ค้นหาหนังสือจากบางส่วนของชื่อหรือผู้แต่ง (ไม่สนตัวพิมพ์เล็ก-ใหญ่) แบบแบ่งหน้าใน SQL
+    - sort: คีย์ใน BOOK_SORTS
+    - คืนเฉพาะแถวของหน้านั้น (LIMIT/OFFSET) ไม่โหลดทั้งตาราง
+    """
+    if sort not in BOOK_SORTS:
+        raise ValueError(f"ไม่รู้จักการเรียงลำดับ: {sort}")
+    where, params = _book_search_where(query)
+    sql = f"SELECT id, title, author FROM books{where} ORDER BY {BOOK_SORTS[sort]} LIMIT ? OFFSET ?"
+    with borrow_connection() as conn:
+        return pd.read_sql_query(sql, conn, params=[*params, int(limit), int(offset)])
+
+
+@_cached_read("books")
+def count_books(query: str = "") -> int:
+    """จำนวนหนังสือที่ตรงกับคำค้น (ใช้คำนวณจำนวนหน้า)"""
+    where, params = _book_search_where(query)
+    with borrow_connection() as conn:
+        (count,) = conn.execute(f"SELECT COUNT(*) FROM books{where}", params).fetchone()
+    return int(count)
+
+@_cached_read("books")
+def search_books_fts(query: str, limit: int = 50, offset: int = 0, available_only: bool = False) -> pd.DataFrame:
+    """
+    ค้นหาหนังสือแบบเรียงตามความเกี่ยวข้อง (bm25 ของ books_fts)
+    - คำค้นที่เป็นตัวเลขจะได้หนังสือรหัสนั้นเป็นอันดับแรก
+    - คำค้นสั้นกว่า FTS_MIN_QUERY_LENGTH ใช้ LIKE และเรียงตามรหัสล่าสุด
+    - available_only=True คืนเฉพาะเล่มที่พร้อมให้ยืม
+    """
+    kw = (query or "").strip()
+    status_sql = " AND b.status = 'available'" if available_only else ""
+
+    parts = []
+    params = []
+    if kw.isdigit():
+        parts.append(f"SELECT b.id, b.title, b.author, b.barcode, 0 AS grp, 0.0 AS score FROM books b WHERE b.id = ?{status_sql}")
+        params.append(int(kw))
+
+    if len(kw) >= FTS_MIN_QUERY_LENGTH:
+        parts.append(
+            f"""
+            SELECT b.id, b.title, b.author, b.barcode, 1 AS grp, f.rank AS score
+            FROM books_fts f
+            JOIN books b ON b.id = f.rowid
+            WHERE books_fts MATCH ?{status_sql}
+            """
+        )
+        params.append(_fts_phrase(kw))
+    else:
+        where, like_params = _book_search_where(kw, prefix="b.")
+        where = where or " WHERE 1 = 1"
+        parts.append(f"SELECT b.id, b.title, b.author, b.barcode, 1 AS grp, -b.id AS score FROM books b{where}{status_sql}")
+        params.extend(like_params)
+
+    sql = f"""
+        SELECT id, title, author, barcode
+        FROM ({" UNION ALL ".join(parts)})
+        GROUP BY id
+        ORDER BY MIN(grp), MIN(score)
+        LIMIT ? OFFSET ?
+    """
+    with borrow_connection() as conn:
+        return pd.read_sql_query(sql, conn, params=[*params, int(limit), int(offset)])
+
+
+def delete_books(book_ids: list[int]) -> tuple[list[int], list[int]]:
+    """
+    ลบหนังสือหลายเล่มใน transaction เดียว
+    - ไม่ลบเล่มที่ยังถูกยืมอยู่ (มี borrow_items สถานะ borrowed)
+    return: (book_id ที่ลบแล้ว, book_id ที่ไม่พบ/ยังถูกยืมอยู่)
+    """
+    wanted = list(dict.fromkeys(int(x) for x in book_ids))
+    if not wanted:
+        return [], []
+
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            q_marks = ",".join(["?"] * len(wanted))
+            c.execute(
+                f"""
+                SELECT id FROM books
+                WHERE id IN ({q_marks})
+                  AND NOT EXISTS (
+                      SELECT 1 FROM borrow_items bi
+                      WHERE bi.book_id = books.id AND bi.status = 'borrowed'
+                  )
+                """,
+                tuple(wanted)
+            )
+            found = {int(r[0]) for r in c.fetchall()}
+            deleted = [x for x in wanted if x in found]
+            skipped = [x for x in wanted if x not in found]
+            if not deleted:
+                conn.rollback()
+                return [], skipped
+
+            del_marks = ",".join(["?"] * len(deleted))
+            c.execute(f"DELETE FROM books WHERE id IN ({del_marks})", tuple(deleted))
+            conn.commit()
+            _bump_tables("books")
+            return deleted, skipped
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def is_barcode_exists(barcode: str, exclude_book_id: int | None = None) -> bool:
+    """ตรวจบาร์โค้ดซ้ำ (ไม่นับหนังสือ exclude_book_id)"""
+    with borrow_connection() as conn:
+        (count,) = conn.execute(
+            "SELECT COUNT(*) FROM books WHERE barcode = ? AND id IS NOT ?",
+            (barcode.strip(), exclude_book_id)
+        ).fetchone()
+    return count > 0
+
+
+def update_book(book_id: int, title: str, author: str, barcode: str | None = None):
+    """
+    แก้ไขหนังสือตาม id (ชื่อ ผู้แต่ง และบาร์โค้ด ในคำสั่งเดียว)
+    barcode: None = ไม่แก้บาร์โค้ด, ค่าว่าง = ลบบาร์โค้ด
+    บาร์โค้ดซ้ำกับเล่มอื่น -> sqlite3.IntegrityError (unique index) และไม่มีอะไรถูกบันทึก
+    """
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        if barcode is None:
+            c.execute(
+                """
+                UPDATE books
+                SET title = ?, author = ?
+                WHERE id = ?
+                """,
+                (title, author, book_id)
+            )
+        else:
+            c.execute(
+                """
+                UPDATE books
+                SET title = ?, author = ?, barcode = ?
+                WHERE id = ?
+                """,
+                (title, author, barcode.strip() or None, book_id)
+            )
+        conn.commit()
+        _bump_tables("books")
 
 # =========================
 # Members (CRUD + Checks)
 # =========================
 def add_member(member_code: str, name: str, gender: str, email: str, phone: str, is_active: bool = True):
     """เพิ่มสมาชิกใหม่"""
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute(
-        """
-        INSERT INTO members (member_code, name, gender, email, phone, is_active)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """,
-        (member_code, name, gender, email, phone, 1 if is_active else 0)
-    )
-    conn.commit()
-    conn.close()
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            """
+            INSERT INTO members (member_code, name, gender, email, phone, is_active)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (member_code, name, gender, email, phone, 1 if is_active else 0)
+        )
+        conn.commit()
+        _bump_tables("members")
 
+@_cached_read("members")
 def get_all_members() -> pd.DataFrame:
     """อ่านข้อมูลสมาชิกทั้งหมด (จัดชื่อคอลัมน์สำหรับแสดงผล)"""
-    conn = get_connection()
-    df = pd.read_sql_query(
-        """
+    with borrow_connection() as conn:
+        return pd.read_sql_query(
+            """
+            SELECT
+                id,
+                member_code AS รหัสสมาชิก,
+                name        AS ชื่อสกุล,
+                gender      AS เพศ,
+                email       AS อีเมล,
+                phone       AS เบอร์โทร,
+                CASE is_active WHEN 1 THEN 'ใช้งาน' ELSE 'ยกเลิก' END AS สถานะ
+            FROM members
+            ORDER BY id DESC
+            """,
+            conn
+        )
+
+def _member_search_where(query: str, active_only: bool = False):
+    """WHERE ของการค้นหาสมาชิกจากบางส่วนของรหัส/ชื่อ (ไม่สนตัวพิมพ์เล็ก-ใหญ่)"""
+    conditions, params = [], []
+    kw = (query or "").strip()
+    if kw:
+        pattern = _like_pattern(kw)
+        conditions.append("(member_code LIKE ? ESCAPE '\\' OR name LIKE ? ESCAPE '\\')")
+        params += [pattern, pattern]
+    if active_only:
+        conditions.append("is_active = 1")
+    if not conditions:
+        return "", []
+    return " WHERE " + " AND ".join(conditions), params
+
+
+@_cached_read("members")
+def search_members(query: str = "", offset: int = 0, limit: int = 50) -> pd.DataFrame:
+    """สมาชิกที่ตรงกับคำค้น แบบแบ่งหน้าใน SQL (คอลัมน์เหมือน get_all_members)"""
+    where, params = _member_search_where(query)
+    sql = f"""
         SELECT
             id,
             member_code AS รหัสสมาชิก,
@@ -82,119 +502,189 @@ def get_all_members() -> pd.DataFrame:
             email       AS อีเมล,
             phone       AS เบอร์โทร,
             CASE is_active WHEN 1 THEN 'ใช้งาน' ELSE 'ยกเลิก' END AS สถานะ
-        FROM members
+        FROM members{where}
         ORDER BY id DESC
-        """,
-        conn
-    )
-    conn.close()
-    return df
+        LIMIT ? OFFSET ?
+    """
+    with borrow_connection() as conn:
+        return pd.read_sql_query(sql, conn, params=[*params, int(limit), int(offset)])
+
+
+@_cached_read("members")
+def count_members(query: str = "", active_only: bool = False) -> int:
+    """จำนวนสมาชิกที่ตรงกับคำค้น (ใช้คำนวณจำนวนหน้า) active_only = นับเฉพาะที่ยังใช้งาน"""
+    where, params = _member_search_where(query, active_only)
+    with borrow_connection() as conn:
+        (count,) = conn.execute(f"SELECT COUNT(*) FROM members{where}", params).fetchone()
+    return int(count)
+
+
+# จำนวนสมาชิกสูงสุดที่ lookup_members คืนให้ต่อครั้ง
+MEMBER_LOOKUP_LIMIT = 20
+
+
+@_cached_read("members")
+def lookup_members(prefix: str, limit: int = MEMBER_LOOKUP_LIMIT, active_only: bool = True) -> pd.DataFrame:
+    """
+    ค้นหาสมาชิกแบบพิมพ์นำหน้า (type-ahead) สำหรับหน้าเคาน์เตอร์
+    - รหัสสมาชิกหรือชื่อที่ขึ้นต้นด้วย prefix (ไม่สนตัวพิมพ์เล็ก-ใหญ่)
+    - ไล่ช่วงบน idx_members_code_lower / idx_members_name_lower อ่านแค่แถวที่ตรง ไม่สแกนทั้งตาราง
+    - รหัสที่ตรงขึ้นก่อนชื่อที่ตรง
+    return: DataFrame (id, member_code, name) ไม่เกิน limit แถว (prefix ว่าง = ไม่มีผล)
+    """
+    kw = (prefix or "").strip()
+    if not kw:
+        return pd.DataFrame(columns=["id", "member_code", "name"])
+
+    active_sql = " AND is_active = 1" if active_only else ""
+    # ช่วง [prefix, prefix + U+10FFFF) = ทุกข้อความที่ขึ้นต้นด้วย prefix (เรียงแบบ BINARY)
+    sql = f"""
+        SELECT id, member_code, name
+        FROM (
+            SELECT * FROM (
+                SELECT id, member_code, name, member_code_lower AS sort_key, 0 AS match_rank
+                FROM members
+                WHERE member_code_lower >= lower(?) AND member_code_lower < lower(?) || char(1114111){active_sql}
+                ORDER BY member_code_lower
+                LIMIT ?
+            )
+            UNION ALL
+            SELECT * FROM (
+                SELECT id, member_code, name, name_lower AS sort_key, 1 AS match_rank
+                FROM members
+                WHERE name_lower >= lower(?) AND name_lower < lower(?) || char(1114111){active_sql}
+                ORDER BY name_lower
+                LIMIT ?
+            )
+        )
+        GROUP BY id
+        ORDER BY MIN(match_rank), MIN(sort_key)
+        LIMIT ?
+    """
+    limit = int(limit)
+    with borrow_connection() as conn:
+        return pd.read_sql_query(sql, conn, params=[kw, kw, limit, kw, kw, limit, limit])
+
 
 ##### 20260202 เพิ่มกาารตรวจ members
+@_cached_read("members")
 def get_active_members() -> pd.DataFrame:
     """ดึงสมาชิกที่ยังใช้งานอยู่ (is_active = 1)"""
-    conn = get_connection()
-    df = pd.read_sql_query(
-        """
-        SELECT id, member_code, name
-        FROM members
-        WHERE is_active = 1
-        ORDER BY id DESC
-        """,
-        conn
-    )
-    conn.close()
-    return df
+    with borrow_connection() as conn:
+        return pd.read_sql_query(
+            """
+            SELECT id, member_code, name
+            FROM members
+            WHERE is_active = 1
+            ORDER BY id DESC
+            """,
+            conn
+        )
 #################################
 
 
 def delete_member(member_id: int):
     """ลบสมาชิกตาม id"""
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM members WHERE id = ?", (member_id,))
-    conn.commit()
-    conn.close()
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM members WHERE id = ?", (member_id,))
+        conn.commit()
+        _bump_tables("members")
+
+def delete_members(member_ids: list[int]) -> tuple[list[int], list[int]]:
+    """
+    ลบสมาชิกหลายคนใน transaction เดียว
+    - ไม่ลบสมาชิกที่ยังมีหนังสือค้างส่ง
+    return: (member_id ที่ลบแล้ว, member_id ที่ไม่พบ/ยังมีหนังสือค้างส่ง)
+    """
+    wanted = list(dict.fromkeys(int(x) for x in member_ids))
+    if not wanted:
+        return [], []
+
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            q_marks = ",".join(["?"] * len(wanted))
+            c.execute(
+                f"""
+                SELECT id FROM members
+                WHERE id IN ({q_marks})
+                  AND NOT EXISTS (
+                      SELECT 1 FROM borrow_tx tx
+                      JOIN borrow_items bi ON bi.tx_id = tx.id
+                      WHERE tx.member_id = members.id AND bi.status = 'borrowed'
+                  )
+                """,
+                tuple(wanted)
+            )
+            found = {int(r[0]) for r in c.fetchall()}
+            deleted = [x for x in wanted if x in found]
+            skipped = [x for x in wanted if x not in found]
+            if not deleted:
+                conn.rollback()
+                return [], skipped
+
+            del_marks = ",".join(["?"] * len(deleted))
+            c.execute(f"DELETE FROM members WHERE id IN ({del_marks})", tuple(deleted))
+            conn.commit()
+            _bump_tables("members")
+            return deleted, skipped
+        except Exception:
+            conn.rollback()
+            raise
+
 
 def update_member(member_id: int, member_code: str, name: str, gender: str, email: str, phone: str, is_active: bool):
     """แก้ไขข้อมูลสมาชิกตาม id"""
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute(
-        """
-        UPDATE members
-        SET member_code = ?,
-            name        = ?,
-            gender      = ?,
-            email       = ?,
-            phone       = ?,
-            is_active   = ?
-        WHERE id = ?
-        """,
-        (member_code, name, gender, email, phone, 1 if is_active else 0, member_id)
-    )
-    conn.commit()
-    conn.close()
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            """
+            UPDATE members
+            SET member_code = ?,
+                name        = ?,
+                gender      = ?,
+                email       = ?,
+                phone       = ?,
+                is_active   = ?
+            WHERE id = ?
+            """,
+            (member_code, name, gender, email, phone, 1 if is_active else 0, member_id)
+        )
+        conn.commit()
+        _bump_tables("members")
 
 def is_member_code_exists(member_code: str) -> bool:
     """ตรวจรหัสสมาชิกซ้ำ"""
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM members WHERE member_code = ?", (member_code,))
-    (count,) = c.fetchone()
-    conn.close()
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM members WHERE member_code = ?", (member_code,))
+        (count,) = c.fetchone()
     return count > 0
 
 def is_email_exists(email: str) -> bool:
     """ตรวจอีเมลซ้ำ (ถ้า email ว่างให้ถือว่าไม่ซ้ำ)"""
     if not email:
         return False
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM members WHERE email = ?", (email,))
-    (count,) = c.fetchone()
-    conn.close()
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM members WHERE email = ?", (email,))
+        (count,) = c.fetchone()
     return count > 0
 
 #################################################
 # user login
 ################################################
-
-def get_user_auth_row(username: str):
-    """
-    ดึงข้อมูลสําหรับตรวจสอบ login (DB only)
-    return: dict หรือ None
-    """
-    # ทุกบรรทัดข้างล่างนี้ต้อง 'เยื้อง' เข้ามาให้ตรงกัน
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute(
-        "SELECT id, username, password_hash, role FROM users WHERE username = ?",
-        (username.strip(),)
-    )
-    row = c.fetchone()
-    conn.close()
-
-    if not row:
-        return None
-
-    # ส่วนนี้ก็ต้องเยื้องให้ตรงกับแนวของ conn
-    user_id, uname, pw_hash, role = row
-    return {"id": user_id, "username": uname, "password_hash": pw_hash, "role": role}
-
-###########################################
-# manage user role
-###########################################
 def get_user_auth_row(username: str):
     """ดึงข้อมูล user สำหรับ login (DB-only)"""
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute(
-        "SELECT id, username, password_hash, role, is_active FROM users WHERE username = ?",
-        (username.strip(),)
-    )
-    row = c.fetchone()
-    conn.close()
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            "SELECT id, username, password_hash, role, is_active FROM users WHERE username = ?",
+            (username.strip(),)
+        )
+        row = c.fetchone()
     if not row:
         return None
     user_id, uname, pw_hash, role, is_active = row
@@ -207,56 +697,78 @@ def get_user_auth_row(username: str):
     }
 
 
+def get_user_by_id(user_id: int):
+    """ข้อมูล user สำหรับตรวจ session ที่ login อยู่ (ไม่มี password_hash) return: dict หรือ None"""
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, username, role, is_active FROM users WHERE id = ?", (int(user_id),))
+        row = c.fetchone()
+    if not row:
+        return None
+    user_id, uname, role, is_active = row
+    return {"id": user_id, "username": uname, "role": role, "is_active": int(is_active)}
+
+
+def update_user_password_hash(user_id: int, password_hash: str):
+    """เปลี่ยน hash รหัสผ่าน (ใช้ตอนแปลง hash แบบเดิมเป็นแบบใหม่หลัง login)"""
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, int(user_id)))
+        conn.commit()
+        _bump_tables("users")
+
+
+###########################################
+# manage user role
+###########################################
+@_cached_read("users")
 def get_all_users():
     """ดึง users ทั้งหมดเพื่อแสดงในหน้า admin"""
-    conn = get_connection()
-    df = pd.read_sql_query(
-        """
-        SELECT id, username, role,
-               CASE is_active WHEN 1 THEN 'ใช้งาน' ELSE 'ปิดใช้งาน' END AS สถานะ
-        FROM users
-        ORDER BY id DESC
-        """,
-        conn
-    )
-    conn.close()
-    return df
+    with borrow_connection() as conn:
+        return pd.read_sql_query(
+            """
+            SELECT id, username, role,
+                   CASE is_active WHEN 1 THEN 'ใช้งาน' ELSE 'ปิดใช้งาน' END AS สถานะ
+            FROM users
+            ORDER BY id DESC
+            """,
+            conn
+        )
 
 
 def is_username_exists(username: str) -> bool:
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM users WHERE username = ?", (username.strip(),))
-    (count,) = c.fetchone()
-    conn.close()
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) FROM users WHERE username = ?", (username.strip(),))
+        (count,) = c.fetchone()
     return count > 0
 
 
 def add_user(username: str, password_hash: str, role: str, is_active: int = 1):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO users (username, password_hash, role, is_active) VALUES (?, ?, ?, ?)",
-        (username.strip(), password_hash, role, int(is_active))
-    )
-    conn.commit()
-    conn.close()
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            "INSERT INTO users (username, password_hash, role, is_active) VALUES (?, ?, ?, ?)",
+            (username.strip(), password_hash, role, int(is_active))
+        )
+        conn.commit()
+        _bump_tables("users")
 
 
 def update_user_role(user_id: int, new_role: str):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("UPDATE users SET role = ? WHERE id = ?", (new_role, user_id))
-    conn.commit()
-    conn.close()
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE users SET role = ? WHERE id = ?", (new_role, user_id))
+        conn.commit()
+        _bump_tables("users")
 
 
 def update_user_active(user_id: int, is_active: int):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("UPDATE users SET is_active = ? WHERE id = ?", (int(is_active), user_id))
-    conn.commit()
-    conn.close()
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE users SET is_active = ? WHERE id = ?", (int(is_active), user_id))
+        conn.commit()
+        _bump_tables("users")
 
 # ============================================================
 # สร้างตารางยืม คืน Schema: Borrow (Header-Detail)
@@ -266,49 +778,9 @@ def ensure_borrow_schema():
     สร้างตารางสำหรับงานยืม-คืน (รองรับยืม 1 ครั้งหลายเล่ม) หากยังไม่มี
     - borrow_tx: หัวรายการ (ใครยืม / ใครทำรายการ / เมื่อไหร่ / กำหนดส่ง)
     - borrow_items: รายการย่อย (หนังสือแต่ละเล่ม + สถานะคืนรายเล่ม + ผู้ทำรายการคืน)
+    ตอนนี้ DDL อยู่ใน migrations.py แล้ว ฟังก์ชันนี้คงไว้ให้โค้ดเดิมเรียกได้
     """
-    conn = get_connection()
-    c = conn.cursor()
-
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS borrow_tx (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      member_id INTEGER NOT NULL,
-      staff_user_id INTEGER NOT NULL,
-      borrow_date TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
-      default_due_date TEXT,
-      status TEXT NOT NULL DEFAULT 'open',
-      note TEXT,
-      FOREIGN KEY (member_id) REFERENCES members(id),
-      FOREIGN KEY (staff_user_id) REFERENCES users(id)
-    )
-    """)
-
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS borrow_items (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      tx_id INTEGER NOT NULL,
-      book_id INTEGER NOT NULL,
-      due_date TEXT,
-      return_date TEXT,
-      status TEXT NOT NULL DEFAULT 'borrowed',
-      return_staff_user_id INTEGER,
-      FOREIGN KEY (tx_id) REFERENCES borrow_tx(id),
-      FOREIGN KEY (book_id) REFERENCES books(id),
-      FOREIGN KEY (return_staff_user_id) REFERENCES users(id)
-    )
-    """)
-
-
-    c.execute("CREATE INDEX IF NOT EXISTS idx_borrow_items_tx ON borrow_items(tx_id)")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_borrow_items_book ON borrow_items(book_id)")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_borrow_items_status ON borrow_items(status)")
-
-
-    conn.commit()
-    conn.close()
+    ensure_schema()
 
 
 # ============================================================
@@ -316,22 +788,76 @@ def ensure_borrow_schema():
 # ============================================================
 def set_book_status(book_id: int, status: str):
     """อัปเดตสถานะหนังสือ: available / borrowed"""
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("UPDATE books SET status = ? WHERE id = ?", (status, int(book_id)))
-    conn.commit()
-    conn.close()
+    with borrow_connection() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE books SET status = ? WHERE id = ?", (status, int(book_id)))
+        conn.commit()
+        _bump_tables("books")
 
 
+@_cached_read("books")
 def get_available_books() -> pd.DataFrame:
     """ดึงเฉพาะหนังสือที่พร้อมให้ยืม (status='available')"""
-    conn = get_connection()
-    df = pd.read_sql_query(
-        "SELECT id, title, author FROM books WHERE status = 'available' ORDER BY id DESC",
-        conn
-    )
-    conn.close()
-    return df
+    with borrow_connection() as conn:
+        return pd.read_sql_query(
+            "SELECT id, title, author FROM books WHERE status = 'available' ORDER BY id DESC",
+            conn
+        )
+
+
+def get_book_by_code(code: str):
+    """
+    หาหนังสือจากบาร์โค้ดหรือรหัสหนังสือ (สำหรับสแกน) ด้วย index เดียว ไม่ผ่าน DataFrame
+    - ตรงกับ barcode ก่อน ถ้าไม่มีและเป็นตัวเลขจึงหาตาม id
+    return: dict (id, title, author, status, barcode) หรือ None
+    """
+    code = (code or "").strip()
+    if not code:
+        return None
+
+    sql = "SELECT id, title, author, status, barcode, 0 AS grp FROM books WHERE barcode = ?"
+    params = [code]
+    if code.isdigit():
+        sql += " UNION ALL SELECT id, title, author, status, barcode, 1 AS grp FROM books WHERE id = ?"
+        params.append(int(code))
+    sql = f"SELECT id, title, author, status, barcode FROM ({sql}) ORDER BY grp LIMIT 1"
+
+    with borrow_connection() as conn:
+        row = conn.execute(sql, params).fetchone()
+    if not row:
+        return None
+    book_id, title, author, status, barcode = row
+    return {"id": book_id, "title": title, "author": author, "status": status, "barcode": barcode}
+
+
+def get_active_borrow_item_by_book(book_id: int):
+    """
+    รายการยืมที่ยังไม่คืนของหนังสือเล่มนี้ (สำหรับสแกนคืน)
+    return: dict (item_id, tx_id, member_code, member_name, due_date) หรือ None
+    """
+    with borrow_connection() as conn:
+        row = conn.execute(
+            """
+            SELECT bi.id, tx.id, m.member_code, m.name, bi.due_date
+            FROM borrow_items bi
+            JOIN borrow_tx tx ON tx.id = bi.tx_id
+            LEFT JOIN members m ON m.id = tx.member_id
+            WHERE bi.book_id = ? AND bi.status = 'borrowed'
+            ORDER BY bi.id DESC
+            LIMIT 1
+            """,
+            (int(book_id),)
+        ).fetchone()
+    if not row:
+        return None
+    item_id, tx_id, member_code, member_name, due_date = row
+    return {
+        "item_id": item_id,
+        "tx_id": tx_id,
+        "member_code": member_code,
+        "member_name": member_name,
+        "due_date": due_date,
+    }
 
 
 # ============================================================
@@ -343,139 +869,138 @@ def create_borrow_transaction(member_id: int, staff_user_id: int, default_due_da
     เงื่อนไข:
       - หนังสือทุกเล่มต้องมีสถานะ available
       - หลังบันทึก ต้องอัปเดต books.status = borrowed
+    ตรวจสถานะและจองหนังสือด้วย UPDATE ... WHERE status = 'available' คำสั่งเดียวใน transaction
+    (สองเคาน์เตอร์ยืมเล่มเดียวกันพร้อมกันไม่ได้) และเพิ่ม borrow_items ด้วย executemany
     """
-    ensure_borrow_schema()
-
-
     if not book_ids:
         raise ValueError("ต้องระบุรายการหนังสืออย่างน้อย 1 เล่ม")
 
 
-    conn = get_connection()
-    c = conn.cursor()
+    ids = list(dict.fromkeys(int(bid) for bid in book_ids))
+    q_marks = ",".join(["?"] * len(ids))
 
 
-    try:
-        # ตรวจสอบสถานะหนังสือทั้งหมดก่อน
-        q_marks = ",".join(["?"] * len(book_ids))
-        c.execute(f"SELECT id, status FROM books WHERE id IN ({q_marks})", tuple(map(int, book_ids)))
-        rows = c.fetchall()
+    with borrow_connection() as conn:
+        c = conn.cursor()
 
 
-        found_ids = {int(r[0]) for r in rows}
-        missing = [bid for bid in book_ids if int(bid) not in found_ids]
-        if missing:
-            raise ValueError(f"ไม่พบหนังสือ id: {missing}")
+        try:
+            # เริ่ม transaction (IMMEDIATE = จอง write lock ตั้งแต่ต้น ไม่ชนกันตอนอัปเกรด lock ใน WAL)
+            conn.execute("BEGIN IMMEDIATE")
 
 
-        not_available = [int(r[0]) for r in rows if (r[1] or "").lower() != "available"]
-        if not_available:
-            raise ValueError(f"หนังสือบางเล่มไม่พร้อมให้ยืม (status ไม่ใช่ available): {not_available}")
+            # 1) จองหนังสือ: เปลี่ยนเฉพาะเล่มที่ยัง available
+            c.execute(
+                f"UPDATE books SET status = 'borrowed' WHERE id IN ({q_marks}) AND status = 'available'",
+                tuple(ids)
+            )
+            if c.rowcount != len(ids):
+                # มีบางเล่มจองไม่ได้ -> ยกเลิกทั้งหมด แล้วหาเหตุผลเพื่อแจ้งผู้ใช้
+                conn.rollback()
+                c.execute(f"SELECT id, status FROM books WHERE id IN ({q_marks})", tuple(ids))
+                rows = c.fetchall()
 
+                found_ids = {int(r[0]) for r in rows}
+                missing = [bid for bid in ids if bid not in found_ids]
+                if missing:
+                    raise ValueError(f"ไม่พบหนังสือ id: {missing}")
 
-        # เริ่ม transaction
-        conn.execute("BEGIN")
+                not_available = [int(r[0]) for r in rows if r[1] != "available"]
+                raise ValueError(f"หนังสือบางเล่มไม่พร้อมให้ยืม (status ไม่ใช่ available): {not_available}")
 
 
-        # 1) insert header
-        c.execute(
-            """
-            INSERT INTO borrow_tx (member_id, staff_user_id, default_due_date, status, note)
-            VALUES (?, ?, ?, 'open', ?)
-            """,
-            (int(member_id), int(staff_user_id), default_due_date, note)
-        )
-        tx_id = c.lastrowid
+            # 2) insert header
+            c.execute(
+                """
+                INSERT INTO borrow_tx (member_id, staff_user_id, default_due_date, status, note)
+                VALUES (?, ?, ?, 'open', ?)
+                """,
+                (int(member_id), int(staff_user_id), default_due_date, note)
+            )
+            tx_id = int(c.lastrowid)
 
 
-        # 2) insert items + update book status
-        for bid in book_ids:
-            c.execute(
+            # 3) insert items ทั้งหมดในครั้งเดียว
+            c.executemany(
                 """
                 INSERT INTO borrow_items (tx_id, book_id, due_date, status)
                 VALUES (?, ?, ?, 'borrowed')
                 """,
-                (int(tx_id), int(bid), default_due_date)
+                [(tx_id, bid, default_due_date) for bid in ids]
             )
-            c.execute("UPDATE books SET status = 'borrowed' WHERE id = ?", (int(bid),))
 
 
-        conn.commit()
-        return int(tx_id)
+            conn.commit()
+            _bump_tables(*CIRCULATION_TABLES)
+            return tx_id
 
 
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+        except Exception:
+            conn.rollback()
+            raise
 
 
+@_cached_read(*REPORT_TABLES)
 def get_active_borrow_items() -> pd.DataFrame:
     """ดึงรายการหนังสือที่กำลังถูกยืมอยู่ (ยังไม่คืน) เพื่อแสดงในหน้า UI"""
-    ensure_borrow_schema()
-    conn = get_connection()
-    df = pd.read_sql_query(
-        """
-        SELECT
-            bi.id AS item_id,
-            tx.id AS tx_id,
-            m.member_code AS รหัสสมาชิก,
-            m.name AS ชื่อสมาชิก,
-            bk.id AS รหัสหนังสือ,
-            bk.title AS ชื่อหนังสือ,
-            tx.borrow_date AS วันที่ยืม,
-            bi.due_date AS กำหนดส่ง,
-            u.username AS ผู้ทำรายการยืม,
-            u.role AS บทบาทผู้ทำรายการ
-        FROM borrow_items bi
-        JOIN borrow_tx tx ON tx.id = bi.tx_id
-        JOIN members m ON m.id = tx.member_id
-        JOIN books bk ON bk.id = bi.book_id
-        JOIN users u ON u.id = tx.staff_user_id
-        WHERE bi.status = 'borrowed'
-        ORDER BY bi.id DESC
-        """,
-        conn
-    )
-    conn.close()
-    return df
+    with borrow_connection() as conn:
+        return pd.read_sql_query(
+            """
+            SELECT
+                bi.id AS item_id,
+                tx.id AS tx_id,
+                m.member_code AS รหัสสมาชิก,
+                m.name AS ชื่อสมาชิก,
+                bk.id AS รหัสหนังสือ,
+                bk.title AS ชื่อหนังสือ,
+                tx.borrow_date AS วันที่ยืม,
+                bi.due_date AS กำหนดส่ง,
+                u.username AS ผู้ทำรายการยืม,
+                u.role AS บทบาทผู้ทำรายการ
+            FROM borrow_items bi
+            JOIN borrow_tx tx ON tx.id = bi.tx_id
+            JOIN members m ON m.id = tx.member_id
+            JOIN books bk ON bk.id = bi.book_id
+            JOIN users u ON u.id = tx.staff_user_id
+            WHERE bi.status = 'borrowed'
+            ORDER BY bi.id DESC
+            """,
+            conn
+        )
 
 
+@_cached_read(*REPORT_TABLES)
 def get_active_borrow_items_by_member(member_id: int) -> pd.DataFrame:
     """
     ดึงรายการหนังสือที่กำลังถูกยืมอยู่ (ยังไม่คืน) เฉพาะสมาชิก 1 คน
     ใช้ในหน้า 'คืน' เพื่อดูรายการค้างส่งแบบกรองตามสมาชิก
     """
-    ensure_borrow_schema()
-    conn = get_connection()
-    df = pd.read_sql_query(
-        """
-        SELECT
-            bi.id AS item_id,
-            tx.id AS tx_id,
-            m.member_code AS รหัสสมาชิก,
-            m.name AS ชื่อสมาชิก,
-            bk.id AS รหัสหนังสือ,
-            bk.title AS ชื่อหนังสือ,
-            tx.borrow_date AS วันที่ยืม,
-            bi.due_date AS กำหนดส่ง,
-            u.username AS ผู้ทำรายการยืม,
-            u.role AS บทบาทผู้ทำรายการ
-        FROM borrow_items bi
-        JOIN borrow_tx tx ON tx.id = bi.tx_id
-        JOIN members m ON m.id = tx.member_id
-        JOIN books bk ON bk.id = bi.book_id
-        JOIN users u ON u.id = tx.staff_user_id
-        WHERE bi.status = 'borrowed'
-          AND m.id = ?
-        ORDER BY bi.id DESC
-        """,
-        conn,
-        params=(int(member_id),)
-    )
-    conn.close()
-    return df
+    with borrow_connection() as conn:
+        return pd.read_sql_query(
+            """
+            SELECT
+                bi.id AS item_id,
+                tx.id AS tx_id,
+                m.member_code AS รหัสสมาชิก,
+                m.name AS ชื่อสมาชิก,
+                bk.id AS รหัสหนังสือ,
+                bk.title AS ชื่อหนังสือ,
+                tx.borrow_date AS วันที่ยืม,
+                bi.due_date AS กำหนดส่ง,
+                u.username AS ผู้ทำรายการยืม,
+                u.role AS บทบาทผู้ทำรายการ
+            FROM borrow_items bi
+            JOIN borrow_tx tx ON tx.id = bi.tx_id
+            JOIN members m ON m.id = tx.member_id
+            JOIN books bk ON bk.id = bi.book_id
+            JOIN users u ON u.id = tx.staff_user_id
+            WHERE bi.status = 'borrowed'
+              AND m.id = ?
+            ORDER BY bi.id DESC
+            """,
+            conn,
+            params=(int(member_id),)
+        )
 
 
 def return_borrow_item(item_id: int, return_staff_user_id: int) -> bool:
@@ -485,149 +1010,327 @@ def return_borrow_item(item_id: int, return_staff_user_id: int) -> bool:
       - อัปเดต books.status = available
       - หากใน tx เดียวกันไม่มี item ค้างแล้ว ให้ปิด tx (status=closed)
     """
-    ensure_borrow_schema()
-    conn = get_connection()
-    c = conn.cursor()
+    with borrow_connection() as conn:
+        c = conn.cursor()
 
 
-    try:
-        conn.execute("BEGIN")
+        try:
+            conn.execute("BEGIN IMMEDIATE")
 
 
-        # หา book_id + tx_id ที่ยังค้าง
-        c.execute(
-            "SELECT tx_id, book_id FROM borrow_items WHERE id = ? AND status = 'borrowed'",
-            (int(item_id),)
-        )
-        row = c.fetchone()
-        if not row:
+            # หา book_id + tx_id ที่ยังค้าง
+            c.execute(
+                "SELECT tx_id, book_id FROM borrow_items WHERE id = ? AND status = 'borrowed'",
+                (int(item_id),)
+            )
+            row = c.fetchone()
+            if not row:
+                conn.rollback()
+                return False
+
+
+            tx_id, book_id = int(row[0]), int(row[1])
+
+
+            c.execute(
+                """
+                UPDATE borrow_items
+                SET status = 'returned',
+                    return_date = CURRENT_TIMESTAMP,
+                    return_staff_user_id = ?
+                WHERE id = ?
+                """,
+                (int(return_staff_user_id), int(item_id))
+            )
+
+
+            c.execute("UPDATE books SET status = 'available' WHERE id = ?", (int(book_id),))
+
+
+            # ถ้าไม่มีรายการค้างใน tx นี้แล้ว -> ปิดหัวรายการ
+            c.execute("SELECT COUNT(*) FROM borrow_items WHERE tx_id = ? AND status = 'borrowed'", (int(tx_id),))
+            (remain,) = c.fetchone()
+            if int(remain) == 0:
+                c.execute("UPDATE borrow_tx SET status = 'closed' WHERE id = ?", (int(tx_id),))
+
+
+            conn.commit()
+            _bump_tables(*CIRCULATION_TABLES)
+            return True
+
+
+        except Exception:
             conn.rollback()
-            return False
+            raise
 
 
-        tx_id, book_id = int(row[0]), int(row[1])
+def return_borrow_items(item_ids: list[int], return_staff_user_id: int) -> tuple[list[int], list[int]]:
+    """
+    คืนหนังสือหลายเล่มใน transaction เดียว (ใช้ UPDATE แบบ set-based แทนการวนคืนทีละเล่ม)
+      - อัปเดต borrow_items ทุกรายการที่ยังค้าง (status = borrowed)
+      - อัปเดต books.status = available ของเล่มที่คืน
+      - ปิดหัวรายการ borrow_tx ที่ไม่มี item ค้างแล้วในคำสั่งเดียว
+    return: (item_id ที่คืนสำเร็จ, item_id ที่ไม่พบ/ถูกคืนไปแล้ว)
+    """
+    wanted = list(dict.fromkeys(int(x) for x in item_ids))
+    if not wanted:
+        return [], []
 
+    with borrow_connection() as conn:
+        c = conn.cursor()
 
-        c.execute(
-            """
-            UPDATE borrow_items
-            SET status = 'returned',
-                return_date = CURRENT_TIMESTAMP,
-                return_staff_user_id = ?
-            WHERE id = ?
-            """,
-            (int(return_staff_user_id), int(item_id))
-        )
+        try:
+            conn.execute("BEGIN IMMEDIATE")
 
+            q_marks = ",".join(["?"] * len(wanted))
+            c.execute(
+                f"SELECT id, tx_id, book_id FROM borrow_items WHERE id IN ({q_marks}) AND status = 'borrowed'",
+                tuple(wanted)
+            )
+            rows = c.fetchall()
 
-        c.execute("UPDATE books SET status = 'available' WHERE id = ?", (int(book_id),))
+            found = {int(r[0]) for r in rows}
+            returned = [x for x in wanted if x in found]
+            failed = [x for x in wanted if x not in found]
+            if not returned:
+                conn.rollback()
+                return [], failed
 
+            book_ids = sorted({int(r[2]) for r in rows})
+            tx_ids = sorted({int(r[1]) for r in rows})
 
-        # ถ้าไม่มีรายการค้างใน tx นี้แล้ว -> ปิดหัวรายการ
-        c.execute("SELECT COUNT(*) FROM borrow_items WHERE tx_id = ? AND status = 'borrowed'", (int(tx_id),))
-        (remain,) = c.fetchone()
-        if int(remain) == 0:
-            c.execute("UPDATE borrow_tx SET status = 'closed' WHERE id = ?", (int(tx_id),))
+            item_marks = ",".join(["?"] * len(returned))
+            c.execute(
+                f"""
+                UPDATE borrow_items
+                SET status = 'returned',
+                    return_date = CURRENT_TIMESTAMP,
+                    return_staff_user_id = ?
+                WHERE id IN ({item_marks}) AND status = 'borrowed'
+                """,
+                (int(return_staff_user_id), *returned)
+            )
 
+            book_marks = ",".join(["?"] * len(book_ids))
+            c.execute(f"UPDATE books SET status = 'available' WHERE id IN ({book_marks})", tuple(book_ids))
 
-        conn.commit()
-        return True
+            # ปิดหัวรายการที่ไม่มีรายการค้างแล้ว (ทุก tx ที่เกี่ยวข้องในคำสั่งเดียว)
+            tx_marks = ",".join(["?"] * len(tx_ids))
+            c.execute(
+                f"""
+                UPDATE borrow_tx
+                SET status = 'closed'
+                WHERE id IN ({tx_marks})
+                  AND NOT EXISTS (
+                      SELECT 1 FROM borrow_items bi
+                      WHERE bi.tx_id = borrow_tx.id AND bi.status = 'borrowed'
+                  )
+                """,
+                tuple(tx_ids)
+            )
 
+            conn.commit()
+            _bump_tables(*CIRCULATION_TABLES)
+            return returned, failed
 
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+@_cached_read(*REPORT_TABLES)
+def get_borrow_history(
+    limit: int = 200,
+    keyword: str = "",
+    start_date: str | None = None,
+    end_date: str | None = None,
+    status: str = "all",
+    before_id: int | None = None,
+) -> pd.DataFrame:
+    """
+    ประวัติการยืม-คืน (รวมข้อมูลผู้ทำรายการยืมและผู้ทำรายการคืน)
+    - keyword: บางส่วนของชื่อหนังสือ / รหัสสมาชิก / ชื่อสมาชิก (กรองใน SQL ครอบคลุมประวัติทั้งหมด)
+    - start_date, end_date: ช่วงวันที่ยืม 'YYYY-MM-DD' (รวมวันสุดท้าย)
+    - status: borrowed / returned / all
+    - before_id: แบ่งหน้าแบบ keyset ส่ง item_id ของแถวสุดท้ายในหน้าก่อนหน้า เพื่อดึงหน้าถัดไป
+    """
+    where = []
+    params = []
+
+    kw = (keyword or "").strip()
+    if kw:
+        pattern = _like_pattern(kw)
+        if len(kw) >= FTS_MIN_QUERY_LENGTH:
+            book_sql = "bi.book_id IN (SELECT rowid FROM books_fts WHERE books_fts MATCH ?)"
+            params.append("title : " + _fts_phrase(kw))
+        else:
+            book_sql = "bk.title LIKE ? ESCAPE '\\'"
+            params.append(pattern)
+        where.append(
+            f"""({book_sql}
+                 OR tx.member_id IN (
+                     SELECT id FROM members
+                     WHERE member_code LIKE ? ESCAPE '\\' OR name LIKE ? ESCAPE '\\'
+                 ))"""
+        )
+        params.extend([pattern, pattern])
 
+    if start_date:
+        where.append("tx.borrow_date >= ?")
+        params.append(start_date)
+    if end_date:
+        where.append("tx.borrow_date < date(?, '+1 day')")
+        params.append(end_date)
 
-def get_borrow_history(limit: int = 200) -> pd.DataFrame:
-    """ประวัติการยืม-คืน (รวมข้อมูลผู้ทำรายการยืมและผู้ทำรายการคืน)"""
-    # ensure_borrow_schema()
-    conn = get_connection()
-    df = pd.read_sql_query(
-        f"""
-        SELECT
-            bi.id AS item_id,
-            tx.id AS tx_id,
-            m.member_code AS รหัสสมาชิก,
-            m.name AS ชื่อสมาชิก,
-            bk.id AS รหัสหนังสือ,
-            bk.title AS ชื่อหนังสือ,
-            tx.borrow_date AS วันที่ยืม,
-            bi.due_date AS กำหนดส่ง,
-            bi.return_date AS วันที่คืน,
-            bi.status AS สถานะ,
-            u1.username AS ผู้ทำรายการยืม,
-            u1.role AS บทบาทผู้ทำรายการยืม,
-            u2.username AS ผู้ทำรายการคืน
-        FROM borrow_items bi
-        JOIN borrow_tx tx ON tx.id = bi.tx_id
-        JOIN members m ON m.id = tx.member_id
-        JOIN books bk ON bk.id = bi.book_id
-        JOIN users u1 ON u1.id = tx.staff_user_id
-        LEFT JOIN users u2 ON u2.id = bi.return_staff_user_id
-        ORDER BY bi.id DESC
-        LIMIT {int(limit)}
-        """,
-        conn
-    )
-    conn.close()
-    return df
+    if status != "all":
+        where.append("bi.status = ?")
+        params.append(status)
+
+    if before_id is not None:
+        where.append("bi.id < ?")
+        params.append(int(before_id))
+
+    where_sql = ("WHERE " + " AND ".join(where)) if where else ""
+
+    with borrow_connection() as conn:
+        return pd.read_sql_query(
+            f"""
+            SELECT
+                bi.id AS item_id,
+                tx.id AS tx_id,
+                m.member_code AS รหัสสมาชิก,
+                m.name AS ชื่อสมาชิก,
+                bk.id AS รหัสหนังสือ,
+                bk.title AS ชื่อหนังสือ,
+                tx.borrow_date AS วันที่ยืม,
+                bi.due_date AS กำหนดส่ง,
+                bi.return_date AS วันที่คืน,
+                bi.status AS สถานะ,
+                u1.username AS ผู้ทำรายการยืม,
+                u1.role AS บทบาทผู้ทำรายการยืม,
+                u2.username AS ผู้ทำรายการคืน
+            FROM borrow_items bi
+            JOIN borrow_tx tx ON tx.id = bi.tx_id
+            JOIN members m ON m.id = tx.member_id
+            JOIN books bk ON bk.id = bi.book_id
+            JOIN users u1 ON u1.id = tx.staff_user_id
+            LEFT JOIN users u2 ON u2.id = bi.return_staff_user_id
+            {where_sql}
+            ORDER BY bi.id DESC
+            LIMIT ?
+            """,
+            conn,
+            params=[*params, int(limit)]
+        )
 
+# ============================================================
+# Dashboard: อ่านจากตารางสรุป agg_* (อัปเดตด้วย triggers ใน migrations.py)
+# ขนาดตารางสรุปขึ้นกับจำนวนสถานะ/เดือน/สมาชิก ไม่ขึ้นกับจำนวนธุรกรรม
+# ============================================================
 ############ ดึงข้อมูลสถานะหนังสือทั้งหมด ##############
+@_cached_read("books")
 def get_book_status_summary():
-    conn = get_connection()
-    df = pd.read_sql_query(
-        """
-        SELECT
-            status AS สถานะหนังสือ,
-            COUNT(*) AS จำนวน
-        FROM books
-        GROUP BY status
-        """,
-        conn
-    )
-    conn.close()
-    return df
+    with borrow_connection() as conn:
+        return pd.read_sql_query(
+            """
+            SELECT
+                NULLIF(status, '') AS สถานะหนังสือ,
+                total AS จำนวน
+            FROM agg_book_status
+            WHERE total > 0
+            ORDER BY status
+            """,
+            conn
+        )
 
 
 ############## ดึงข้อมูล จำนวนการยืมรายเดือน ######
+@_cached_read("borrow_tx")
 def get_borrow_summary_by_month(start_date: str, end_date: str):
     """
     สรุปจำนวนการยืมรายเดือน
+    - นับเป็นรายเดือนเต็ม: เดือนของ start_date ถึงเดือนของ end_date ('YYYY-MM-DD')
+    """
+    sql = """
+        SELECT
+            month AS เดือน,
+            total AS จำนวนการยืม
+        FROM agg_borrows_month
+        WHERE month BETWEEN substr(?, 1, 7) AND substr(?, 1, 7)
+          AND total > 0
+        ORDER BY month
     """
-    conn = get_connection()
 
 
+    with borrow_connection() as conn:
+        return pd.read_sql_query(sql, conn, params=[start_date, end_date])
+
+
+@_cached_read("borrow_items")
+def get_return_summary_by_month(start_date: str, end_date: str):
+    """สรุปจำนวนการคืนรายเดือน (นับเป็นรายเดือนเต็มเหมือน get_borrow_summary_by_month)"""
     sql = """
         SELECT
-            strftime('%Y-%m', borrow_date) AS เดือน,
-            COUNT(*) AS จำนวนการยืม
-        FROM borrow_tx
-        WHERE DATE(borrow_date) BETWEEN ? AND ?
-        GROUP BY strftime('%Y-%m', borrow_date)
-        ORDER BY เดือน
+            month AS เดือน,
+            total AS จำนวนการคืน
+        FROM agg_returns_month
+        WHERE month BETWEEN substr(?, 1, 7) AND substr(?, 1, 7)
+          AND total > 0
+        ORDER BY month
     """
 
 
-    df = pd.read_sql_query(sql, conn, params=[start_date, end_date])
-    conn.close()
-    return df
+    with borrow_connection() as conn:
+        return pd.read_sql_query(sql, conn, params=[start_date, end_date])
+
+
+@_cached_read("borrow_items", "members")
+def get_member_active_loans(limit: int = 10):
+    """สมาชิกที่มีหนังสือค้างส่งมากที่สุด"""
+    with borrow_connection() as conn:
+        return pd.read_sql_query(
+            """
+            SELECT
+                m.member_code AS รหัสสมาชิก,
+                m.name AS ชื่อสมาชิก,
+                a.total AS จำนวนค้างส่ง
+            FROM agg_member_active_loans a
+            JOIN members m ON m.id = a.member_id
+            WHERE a.total > 0
+            ORDER BY a.total DESC, m.member_code
+            LIMIT ?
+            """,
+            conn,
+            params=(int(limit),)
+        )
+
+
+def rebuild_aggregates():
+    """คำนวณตารางสรุป agg_* ใหม่ทั้งหมดจากข้อมูลจริง (ใช้เมื่อตัวเลขบน dashboard ไม่ตรง)"""
+    with borrow_connection() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            migrations.rebuild_aggregates(conn)
+            conn.commit()
+            _bump_tables(*CIRCULATION_TABLES)
+        except Exception:
+            conn.rollback()
+            raise
 
 
 ######### ดึงข้อมูลรายงานการยืม-คืน ทั้งหมด กรองตามช่วงเวลา ###
-def get_borrow_report(start_date: str, end_date: str, status: str):
+# จำนวนแถวที่อ่านจาก cursor ต่อครั้งตอนส่งออกรายงาน
+REPORT_CHUNK_SIZE = 2000
+
+
+def _borrow_report_query(start_date: str, end_date: str, status: str, select_sql: str | None = None):
     """
-    รายงานการยืม-คืนทั้งหมด
-    - กรองตามช่วงเวลา
+    SQL + params ของรายงานการยืม-คืน (ใช้ร่วมกันระหว่างแสดงผล / นับ / ส่งออกแบบ streaming)
+    - กรองตามช่วงเวลา (start_date ถึง end_date รวมวันสุดท้าย เทียบ borrow_date ตรง ๆ เพื่อใช้ idx_borrow_tx_date)
     - กรองตามสถานะ borrowed / returned / all
     """
-    conn = get_connection()
-
-
-    base_sql = """
-        SELECT
+    if select_sql is None:
+        select_sql = """
             m.member_code AS รหัสสมาชิก,
             m.name AS ชื่อสมาชิก,
             bk.title AS ชื่อหนังสือ,
@@ -637,13 +1340,17 @@ def get_borrow_report(start_date: str, end_date: str, status: str):
             bi.status AS สถานะ,
             u1.username AS ผู้ทำรายการยืม,
             u2.username AS ผู้ทำรายการคืน
+        """
+    base_sql = f"""
+        SELECT {select_sql}
         FROM borrow_items bi
         JOIN borrow_tx tx ON tx.id = bi.tx_id
         JOIN members m ON m.id = tx.member_id
         JOIN books bk ON bk.id = bi.book_id
         JOIN users u1 ON u1.id = tx.staff_user_id
         LEFT JOIN users u2 ON u2.id = bi.return_staff_user_id
-        WHERE DATE(tx.borrow_date) BETWEEN ? AND ?
+        WHERE tx.borrow_date >= ?
+          AND tx.borrow_date < date(?, '+1 day')
     """
 
 
@@ -651,14 +1358,235 @@ def get_borrow_report(start_date: str, end_date: str, status: str):
 
 
     if status != "all":
-        base_sql += " AND bi.status = ?"
+        # เครื่องหมาย + กันไม่ให้ planner เลือก idx_borrow_items_status (ครึ่งตาราง) แทนการไล่ช่วงวันที่
+        base_sql += " AND +bi.status = ?"
         params.append(status)
 
 
+    return base_sql, params
+
+
+@_cached_read(*REPORT_TABLES)
+def get_borrow_report(start_date: str, end_date: str, status: str, limit: int | None = None):
+    """
+    รายงานการยืม-คืนทั้งหมด
+    - กรองตามช่วงเวลา
+    - กรองตามสถานะ borrowed / returned / all
+    - limit: จำกัดจำนวนแถว (เช่น แสดงตัวอย่างบนหน้าจอ) None = ทั้งหมด
+    """
+    base_sql, params = _borrow_report_query(start_date, end_date, status)
+    base_sql += " ORDER BY tx.borrow_date DESC"
+    if limit is not None:
+        base_sql += " LIMIT ?"
+        params.append(int(limit))
+
+
+    with borrow_connection() as conn:
+        return pd.read_sql_query(base_sql, conn, params=params)
+
+
+@_cached_read(*REPORT_TABLES)
+def count_borrow_report(start_date: str, end_date: str, status: str) -> int:
+    """จำนวนแถวทั้งหมดของรายงาน (ไม่ต้องโหลดข้อมูลทั้งหมดมานับ)"""
+    base_sql, params = _borrow_report_query(start_date, end_date, status, select_sql="COUNT(*)")
+    with borrow_connection() as conn:
+        (count,) = conn.execute(base_sql, params).fetchone()
+    return int(count)
+
+
+def iter_borrow_report(start_date: str, end_date: str, status: str, chunk_size: int = REPORT_CHUNK_SIZE):
+    """
+    อ่านรายงานการยืม-คืนทีละช่วงจาก cursor (ไม่สร้าง DataFrame ทั้งก้อน)
+    yield: (ชื่อคอลัมน์, list ของแถว) อย่างน้อย 1 ครั้งแม้ไม่มีข้อมูล
+
+    ใช้ connection ของตัวเอง ไม่ยืมจาก pool: generator ค้างอยู่ระหว่าง yield
+    ผู้เรียกใน thread เดียวกัน (เช่น progress ที่ commit ความคืบหน้างานส่งออก) จะได้ connection ของ pool ตามปกติ
+    ไม่มาใช้/commit ซ้อนบน connection ที่กำลังอ่านอยู่ และ connection ถูกปิดทันทีเมื่ออ่านจบหรือเลิกอ่านกลางทาง
+    """
+    base_sql, params = _borrow_report_query(start_date, end_date, status)
     base_sql += " ORDER BY tx.borrow_date DESC"
 
 
-    df = pd.read_sql_query(base_sql, conn, params=params)
-    conn.close()
-    return df
+    conn = get_connection()
+    try:
+        cur = conn.execute(base_sql, params)
+        columns = [d[0] for d in cur.description]
+        rows = cur.fetchmany(chunk_size)
+        yield columns, rows
+        while len(rows) == chunk_size:
+            rows = cur.fetchmany(chunk_size)
+            if rows:
+                yield columns, rows
+        cur.close()
+    finally:
+        conn.close()
+
+
+# ============================================================
+# Export jobs: คิวงานส่งออกรายงาน (ตัวทำงานอยู่ใน export_jobs.py)
+# ============================================================
+EXPORT_JOB_KINDS = ("csv", "xlsx", "pdf")
+EXPORT_JOB_ACTIVE_STATES = ("queued", "running")
+
+_EXPORT_JOB_COLUMNS = """
+    j.id, j.kind, j.start_date, j.end_date, j.status_filter, j.state,
+    j.rows_done, j.total_rows, j.file_path, j.error, j.requested_by,
+    u.username AS requested_by_name, j.created_at, j.started_at, j.finished_at
+"""
+
+
+def _export_job_key(kind: str, start_date: str, end_date: str, status: str) -> str:
+    return f"{kind}|{start_date}|{end_date}|{status}"
+
+
+def create_export_job(kind: str, start_date: str, end_date: str, status: str, requested_by: int | None) -> tuple[int, bool]:
+    """
+    เพิ่มงานส่งออกเข้าคิว
+    ถ้ามีงานเงื่อนไขเดียวกันที่ยังไม่เสร็จ (queued/running) จะคืนงานเดิมแทนการสร้างใหม่
+    return: (job_id, สร้างใหม่หรือไม่)
+    """
+    if kind not in EXPORT_JOB_KINDS:
+        raise ValueError(f"ไม่รู้จักรูปแบบไฟล์: {kind}")
+    job_key = _export_job_key(kind, start_date, end_date, status)
+
+    with borrow_connection() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM export_jobs WHERE job_key = ? AND state IN ('queued', 'running')",
+                (job_key,)
+            ).fetchone()
+            if row:
+                conn.commit()
+                return int(row[0]), False
+
+            cur = conn.execute(
+                """
+                INSERT INTO export_jobs (job_key, kind, start_date, end_date, status_filter, requested_by)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (job_key, kind, start_date, end_date, status, requested_by)
+            )
+            conn.commit()
+            return int(cur.lastrowid), True
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def _export_job_rows(where_sql: str, params) -> list[dict]:
+    with borrow_connection() as conn:
+        cur = conn.execute(
+            f"""
+            SELECT {_EXPORT_JOB_COLUMNS}
+            FROM export_jobs j
+            LEFT JOIN users u ON u.id = j.requested_by
+            {where_sql}
+            """,
+            params
+        )
+        columns = [d[0] for d in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def get_export_job(job_id: int):
+    """ข้อมูลงานส่งออก 1 งาน (dict) หรือ None"""
+    rows = _export_job_rows("WHERE j.id = ?", (int(job_id),))
+    return rows[0] if rows else None
+
+
+def get_recent_export_jobs(limit: int = 10) -> list[dict]:
+    """งานส่งออกล่าสุด (ไม่ cache เพราะความคืบหน้าเปลี่ยนตลอด)"""
+    return _export_job_rows("ORDER BY j.id DESC LIMIT ?", (int(limit),))
+
+
+def _update_export_job(sql: str, params) -> bool:
+    with borrow_connection() as conn:
+        try:
+            cur = conn.execute(sql, params)
+            conn.commit()
+            return cur.rowcount > 0
+        except Exception:
+            conn.rollback()
+            raise
+
 
+def start_export_job(job_id: int, total_rows: int) -> bool:
+    """queued -> running (False = งานถูกหยิบไปแล้ว/ไม่อยู่ในคิว)"""
+    return _update_export_job(
+        """
+        UPDATE export_jobs
+        SET state = 'running', total_rows = ?, rows_done = 0, started_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND state = 'queued'
+        """,
+        (int(total_rows), int(job_id))
+    )
+
+
+def update_export_job_progress(job_id: int, rows_done: int):
+    _update_export_job(
+        "UPDATE export_jobs SET rows_done = ? WHERE id = ? AND state = 'running'",
+        (int(rows_done), int(job_id))
+    )
+
+
+def finish_export_job(job_id: int, file_path: str, rows_done: int):
+    _update_export_job(
+        """
+        UPDATE export_jobs
+        SET state = 'done', file_path = ?, rows_done = ?, finished_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+        """,
+        (file_path, int(rows_done), int(job_id))
+    )
+
+
+def fail_export_job(job_id: int, error: str):
+    _update_export_job(
+        "UPDATE export_jobs SET state = 'failed', error = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?",
+        (error, int(job_id))
+    )
+
+
+def requeue_unfinished_export_jobs() -> list[int]:
+    """
+    งานที่ค้าง running จาก process ก่อน (เช่น เซิร์ฟเวอร์รีสตาร์ท) กลับเข้าคิว
+    return: id ของงานที่รออยู่ในคิวทั้งหมด (เรียงตามลำดับที่ส่งเข้ามา)
+    """
+    with borrow_connection() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE export_jobs SET state = 'queued', rows_done = 0 WHERE state = 'running'")
+            rows = conn.execute("SELECT id FROM export_jobs WHERE state = 'queued' ORDER BY id").fetchall()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return [int(r[0]) for r in rows]
+
+
+def delete_expired_export_jobs(max_age_hours: float) -> list[str]:
+    """
+    ลบงานที่เสร็จ/ล้มเหลวนานกว่า max_age_hours
+    return: path ของไฟล์ผลลัพธ์ที่ต้องลบทิ้ง
+    """
+    with borrow_connection() as conn:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cutoff = f"-{float(max_age_hours)} hours"
+            rows = conn.execute(
+                """
+                SELECT file_path FROM export_jobs
+                WHERE state IN ('done', 'failed') AND finished_at < datetime('now', ?)
+                """,
+                (cutoff,)
+            ).fetchall()
+            conn.execute(
+                "DELETE FROM export_jobs WHERE state IN ('done', 'failed') AND finished_at < datetime('now', ?)",
+                (cutoff,)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return [r[0] for r in rows if r[0]]
@@ -1,7 +1,40 @@
 # pages/admin_page.py
+import pandas as pd
 import streamlit as st
 import model
 import controller
+import query_stats
+import render_stats
+import view_helpers
+
+# จำนวนคำสั่ง SQL ที่แสดงในตารางสถิติ (เรียงตามเวลารวม)
+QUERY_STATS_SHOWN = 50
+
+QUERY_STATS_COLUMNS = {
+    "caller": "ฟังก์ชัน",
+    "calls": "จำนวนครั้ง",
+    "total_ms": "เวลารวม (ms)",
+    "p50_ms": "p50 (ms)",
+    "p95_ms": "p95 (ms)",
+    "p99_ms": "p99 (ms)",
+    "max_ms": "สูงสุด (ms)",
+    "avg_rows": "แถวเฉลี่ย",
+    "sql": "SQL",
+}
+
+RENDER_STATS_COLUMNS = {
+    "page": "หน้า",
+    "section": "ส่วน",
+    "calls": "จำนวนครั้ง",
+    "sessions": "session",
+    "runs_per_session": "ครั้งต่อ session",
+    "reruns": "จบด้วย st.rerun",
+    "total_ms": "เวลารวม (ms)",
+    "p50_ms": "p50 (ms)",
+    "p95_ms": "p95 (ms)",
+    "p99_ms": "p99 (ms)",
+    "max_ms": "สูงสุด (ms)",
+}
 
 
 def render_admin():
@@ -9,6 +42,7 @@ def render_admin():
 
 
     # ---- Add user ----
+    render_stats.section("เพิ่มผู้ใช้")
     st.markdown("### ➕ เพิ่มผู้ใช้")
     with st.form("add_user_form"):
         c1, c2 = st.columns(2)
@@ -38,6 +72,7 @@ def render_admin():
 
 
     # ---- List users ----
+    render_stats.section("รายชื่อผู้ใช้")
     st.markdown("### 📋 รายชื่อผู้ใช้")
     users_df = model.get_all_users()
     if users_df.empty:
@@ -50,12 +85,9 @@ def render_admin():
 
 
     # ---- Change role/status ----
+    render_stats.section("role / สถานะ")
     st.markdown("### 🔧 เปลี่ยน role / สถานะ")
-    options = [f"{r['id']} - {r['username']} ({r['role']}) [{r['สถานะ']}]" for _, r in users_df.iterrows()]
-    selected = st.selectbox("เลือกผู้ใช้", options)
-
-
-    user_id = int(selected.split(" - ")[0])
+    user_id = view_helpers.select_id("เลือกผู้ใช้", users_df, "{id} - {username} ({role}) [{สถานะ}]", limit=None)
     new_role = st.selectbox("role ใหม่", ["staff", "admin"], key="role_change")
     new_active = st.selectbox("สถานะใหม่", ["ใช้งาน", "ปิดใช้งาน"], key="active_change")
 
@@ -86,3 +118,88 @@ def render_admin():
                 for m in msgs:
                     st.success(m)
                 st.rerun()
+
+
+    st.divider()
+    _render_query_stats()
+
+    st.divider()
+    _render_page_timings()
+
+
+def _render_query_stats():
+    """สถิติเวลาของคำสั่ง SQL ใน process นี้ + คำสั่งที่ช้ากว่าเกณฑ์ (เฉพาะ admin)"""
+    render_stats.section("สถิติ SQL")
+    st.markdown("### 📈 สถิติคำสั่ง SQL (ตั้งแต่เริ่ม process)")
+    if not query_stats.ENABLED:
+        st.info("ปิดการเก็บสถิติอยู่ (LIBRARY_QUERY_STATS=0)")
+        return
+
+    stats = query_stats.snapshot()
+    slow = query_stats.recent_slow_queries()
+    c1, c2, c3 = st.columns(3)
+    c1.metric("คำสั่งที่ต่างกัน", f"{len(stats):,}")
+    c2.metric("จำนวนครั้งรวม", f"{sum(r['calls'] for r in stats):,}")
+    c3.metric(f"ช้ากว่า {query_stats.SLOW_QUERY_MS:g} ms (ล่าสุด)", f"{len(slow):,}")
+
+    if stats:
+        df = pd.DataFrame(stats[:QUERY_STATS_SHOWN], columns=list(QUERY_STATS_COLUMNS)).rename(columns=QUERY_STATS_COLUMNS)
+        st.dataframe(df, use_container_width=True, hide_index=True)
+    else:
+        st.info("ยังไม่มีคำสั่ง SQL ที่บันทึกไว้")
+
+    st.markdown("#### 🐢 คำสั่งที่ช้า")
+    if not slow:
+        st.caption(f"ยังไม่มีคำสั่งที่ใช้เวลาเกิน {query_stats.SLOW_QUERY_MS:g} ms")
+    for entry in slow:
+        with st.expander(f"{entry['at']}  {entry['ms']:,.1f} ms  {entry['caller']}  ({entry['rows']:,} แถว)"):
+            st.code(entry["sql"], language="sql")
+            if entry["plan"]:
+                st.code("\n".join(entry["plan"]), language="text")
+
+    if st.button("🧹 ล้างสถิติ", key="query_stats_reset"):
+        query_stats.reset()
+        st.rerun()
+
+
+def _render_timing_table(rows: list[dict]) -> pd.DataFrame:
+    columns = [c for c in RENDER_STATS_COLUMNS if rows and c in rows[0]]
+    return pd.DataFrame(rows, columns=columns).rename(columns=RENDER_STATS_COLUMNS)
+
+
+def _page_timings_csv() -> bytes:
+    """CSV ของสถิติรายหน้า (ส่วน = ทั้งหน้า) ต่อด้วยรายส่วน"""
+    pages = [{**r, "section": "(ทั้งหน้า)"} for r in render_stats.page_snapshot()]
+    df = pd.DataFrame(pages + render_stats.section_snapshot(), columns=list(RENDER_STATS_COLUMNS))
+    return df.rename(columns=RENDER_STATS_COLUMNS).to_csv(index=False).encode("utf-8-sig")
+
+
+def _render_page_timings():
+    """เวลา render ของแต่ละหน้า/ส่วน และจำนวนครั้งต่อ session (ใช้หาหน้าที่ควรปรับก่อน)"""
+    render_stats.section("เวลาแสดงผล")
+    st.markdown("### ⏱️ เวลาแสดงผลแต่ละหน้า (ตั้งแต่เริ่ม process)")
+    pages = render_stats.page_snapshot()
+    if not pages:
+        st.info("ยังไม่มีข้อมูลการแสดงผล")
+        return
+
+    st.dataframe(_render_timing_table(pages), use_container_width=True, hide_index=True)
+    with st.expander("แยกตามส่วนของหน้า"):
+        st.dataframe(_render_timing_table(render_stats.section_snapshot()), use_container_width=True, hide_index=True)
+
+    mine = render_stats.session_counts(st.session_state)
+    st.caption("session นี้: " + ", ".join(f"{page} {n:,} ครั้ง" for page, n in mine.items()))
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.download_button(
+            "⬇️ ดาวน์โหลด CSV",
+            data=_page_timings_csv,
+            file_name="page_timings.csv",
+            mime="text/csv",
+            key="render_stats_csv",
+        )
+    with c2:
+        if st.button("🧹 ล้างสถิติ", key="render_stats_reset"):
+            render_stats.reset()
+            st.rerun()
@@ -1,6 +1,23 @@
+import math
+
 import streamlit as st
 import model
 import controller
+import render_stats
+import view_helpers
+
+
+# จำนวนแถวต่อหน้าในรายการหนังสือ
+PAGE_SIZE = 50
+# จำนวนตัวเลือกสูงสุดใน selectbox แก้ไขหนังสือ
+OPTION_LIMIT = 100
+
+SORT_OPTIONS = {
+    "รหัสล่าสุดก่อน": "id_desc",
+    "รหัสเก่าสุดก่อน": "id_asc",
+    "ชื่อหนังสือ (ก-ฮ, A-Z)": "title",
+    "ผู้แต่ง (ก-ฮ, A-Z)": "author",
+}
 
 
 # =========================
@@ -31,6 +48,7 @@ def on_save_book():
 
 def render_book():
 # -------- Books: Create --------
+    render_stats.section("เพิ่มหนังสือ")
     st.subheader("เพิ่มข้อมูลหนังสือใหม่")
     st.text_input("ชื่อหนังสือ", key="new_title")
     st.text_input("ผู้แต่ง", key="new_author")
@@ -44,66 +62,94 @@ def render_book():
 
 
     # -------- Books: Read --------
+    render_stats.section("รายการหนังสือ")
     st.subheader("📖 รายการหนังสือทั้งหมดในระบบ")
-    books_df = model.get_all_books()
-    if books_df.empty:
-        st.info("ยังไม่มีข้อมูลหนังสือในระบบ")
-    else:
-        st.dataframe(books_df, use_container_width=True)
-
-
-    # -------- Books: Delete --------
-    st.subheader("🗑 ลบข้อมูลหนังสือ")
-    books_df = model.get_all_books()
-    if books_df.empty:
-        st.info("ยังไม่มีข้อมูลหนังสือในระบบ")
+    col_kw, col_sort = st.columns([3, 1])
+    with col_kw:
+        list_kw = st.text_input("ค้นหาชื่อหนังสือ", key="book_list_kw")
+    with col_sort:
+        sort_label = st.selectbox("เรียงตาม", list(SORT_OPTIONS.keys()), key="book_list_sort")
+
+    # ค้นหา/เรียง/แบ่งหน้าใน SQL ดึงมาเฉพาะแถวของหน้าที่แสดง
+    total_books = model.count_books(list_kw)
+    if total_books == 0:
+        if list_kw.strip():
+            st.info("ไม่พบหนังสือตามคำค้นหา")
+        else:
+            st.info("ยังไม่มีข้อมูลหนังสือในระบบ")
     else:
-        for _, row in books_df.iterrows():
-            c1, c2, c3 = st.columns([4, 3, 1])
-            with c1:
-                st.write(f"📘 **{row['title']}** — {row['author']}")
-            with c2:
-                st.write(f"รหัสหนังสือ: {row['id']}")
-            with c3:
-                if st.button("ลบ", key=f"delete_book_{row['id']}"):
-                    controller.remove_book(int(row["id"]))
-                    st.success("ลบข้อมูลหนังสือเรียบร้อยแล้ว")
-                    st.rerun()
+        total_pages = math.ceil(total_books / PAGE_SIZE)
+        # คำค้นเปลี่ยนแล้วจำนวนหน้าลดลง -> กลับไปหน้าแรก
+        if st.session_state.get("book_list_page", 1) > total_pages:
+            st.session_state["book_list_page"] = 1
+        page = st.number_input("หน้า", min_value=1, max_value=total_pages, step=1, key="book_list_page")
+
+        offset = (int(page) - 1) * PAGE_SIZE
+        books_df = model.search_books(list_kw, offset=offset, limit=PAGE_SIZE, sort=SORT_OPTIONS[sort_label])
+
+        # ตารางของหน้าปัจจุบัน + ช่องติ๊กเลือกลบ (จำนวน widget คงที่ไม่ขึ้นกับจำนวนหนังสือทั้งหมด)
+        grid_df = books_df.copy()
+        grid_df.insert(0, "เลือก", False)
+        edited = st.data_editor(
+            grid_df,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "เลือก": st.column_config.CheckboxColumn("เลือก", help="ติ๊กเพื่อเลือกลบ")
+            },
+            disabled=[c for c in grid_df.columns if c != "เลือก"],
+            # key ผูกกับหน้า/คำค้น/การเรียง (และรอบการลบ) ให้รายการที่ติ๊กไว้ไม่ติดไปกับข้อมูลชุดอื่น
+            key=f"book_grid_{offset}_{list_kw}_{sort_label}_{st.session_state.get('book_grid_version', 0)}",
+        )
+        st.caption(f"แสดงรายการที่ {offset + 1}-{offset + len(books_df)} จาก {total_books} รายการ (หน้า {int(page)}/{total_pages})")
+
+        selected_ids = edited.loc[edited["เลือก"], "id"].astype(int).tolist()
+        if st.button(f"🗑 ลบรายการที่เลือก ({len(selected_ids)})", disabled=not selected_ids):
+            _, msgs = controller.remove_books(selected_ids)
+            st.session_state["book_grid_flash"] = msgs
+            st.session_state["book_grid_version"] = st.session_state.get("book_grid_version", 0) + 1
+            st.rerun()
+
+    # ข้อความผลการลบจากรอบก่อน (ก่อน rerun)
+    for m in st.session_state.pop("book_grid_flash", []):
+        (st.success if m.startswith("✅") else st.warning)(m)
 
 
     # -------- Books: Update --------
+    render_stats.section("แก้ไขหนังสือ")
     st.subheader("✏️ แก้ไขข้อมูลหนังสือ")
-    if books_df.empty:
+    if model.count_books() == 0:
         st.info("ยังไม่มีข้อมูลให้แก้ไข")
     else:
         search_title = st.text_input("ค้นหาชื่อหนังสือที่ต้องการแก้ไข", key="search_title")
 
 
-        if search_title.strip():
-            filtered_df = books_df[books_df["title"].str.contains(search_title.strip(), case=False)]
-        else:
-            filtered_df = books_df
+        # ดึงเฉพาะรายการที่เกี่ยวข้องที่สุดมาเป็นตัวเลือก (พิมพ์คำค้นเพิ่มเพื่อจำกัดผล)
+        filtered_df = model.search_books_fts(search_title, limit=OPTION_LIMIT)
 
 
         if filtered_df.empty:
             st.warning("ไม่พบหนังสือตามคำค้นหา")
         else:
-            book_options = [f"{row['id']} - {row['title']}" for _, row in filtered_df.iterrows()]
-            selected_book = st.selectbox("เลือกหนังสือที่จะแก้ไข", book_options, key="selected_book")
-
-
-            book_id = int(selected_book.split(" - ")[0])
-            selected_row = books_df[books_df["id"] == book_id].iloc[0]
+            book_id = view_helpers.select_id(
+                "เลือกหนังสือที่จะแก้ไข", filtered_df, "{id} - {title}",
+                limit=OPTION_LIMIT, key="selected_book"
+            )
+            selected_row = filtered_df[filtered_df["id"] == book_id].iloc[0]
 
 
             with st.form("edit_book_form"):
                 new_title = st.text_input("ชื่อหนังสือ", value=selected_row["title"])
                 new_author = st.text_input("ผู้แต่ง", value=selected_row["author"])
+                new_barcode = st.text_input(
+                    "บาร์โค้ด (ถ้ามี)", value=selected_row["barcode"] or "",
+                    help="ใช้สแกนในหน้ายืม-คืน (เว้นว่างได้ สแกนด้วยรหัสหนังสือแทน)"
+                )
                 save_update = st.form_submit_button("บันทึกการแก้ไข")
 
 
             if save_update:
-                ok, msgs = controller.edit_book(book_id, new_title, new_author)
+                ok, msgs = controller.edit_book(book_id, new_title, new_author, new_barcode)
                 if not ok:
                     for m in msgs:
                         st.error(m)
@@ -111,108 +157,3 @@ def render_book():
                     for m in msgs:
                         st.success(m)
                     st.rerun()
-
-
-
-
-
-
-# app.py
-import streamlit as st
-
-
-from pages import book_page
-from pages import member_page
-from pages import borrow_page
-
-
-# =========================
-# View helpers (reset form)
-# =========================
-
-
-# ซ่อนเมนูอัตโนมัติ (app/book page/...)
-# ✅ ซ่อน Multi-page auto nav (Streamlit sidebar pages list) + fallback หลาย selector
-st.markdown("""
-<style>
-/* 1) ตัวหลัก: Sidebar navigation ของ multipage */
-section[data-testid="stSidebarNav"] {display: none !important;}
-
-
-/* 2) fallback: เผื่อ DOM เปลี่ยนชื่อ/โครง */
-div[data-testid="stSidebarNav"] {display: none !important;}
-nav[data-testid="stSidebarNav"] {display: none !important;}
-
-
-/* 3) fallback เพิ่มเติม: ซ่อนหัวข้อ Pages / รายการหน้า (บางเวอร์ชัน) */
-div[data-testid="stSidebarNavItems"] {display: none !important;}
-div[data-testid="stSidebarNavSeparator"] {display: none !important;}
-
-
-/* 4) fallback สุดท้าย: ถ้า Streamlit render เป็น <ul>/<li> ใน sidebar */
-aside ul:has(a[href*="?page="]) {display: none !important;}
-aside ul:has(a[href*="/book_page"]) {display: none !important;}
-aside ul:has(a[href*="/member_page"]) {display: none !important;}
-aside ul:has(a[href*="/borrow_page"]) {display: none !important;}
-</style>
-""", unsafe_allow_html=True)
-# =========================
-# UI
-# =========================
-st.set_page_config(page_title="ระบบยืม-คืนหนังสือ", page_icon="📚")
-st.title("📚 ระบบยืม-คืนหนังสือ (Streamlit + SQLite)")
-st.write("ตัวอย่าง Web App เชื่อมฐานข้อมูล (ปรับโครงสร้างแบบ MVC เชิงแนวคิด)")
-
-
-# menu = st.sidebar.radio("เมนู", ["📚 หนังสือ", "👤 สมาชิก", "🔄 ยืม-คืน"])
-# if menu == "📚 หนังสือ":
-#     book_page.render_book()
-# elif menu == "👤 สมาชิก":
-#     member_page.render_member()
-# else:
-#     borrow_page.render_borrow()
-
-
-# ---------- เมนูแบบคลิกแถบ ----------
-if "page" not in st.session_state:
-    st.session_state.page = "books"
-
-
-# --- เมนู ---
-# ===== Sidebar Menu Title (Centered & Styled) =====
-st.sidebar.markdown("""
-<style>
-.menu-title {
-    text-align: center;
-    font-size: 22px;
-    font-weight: 700;
-    letter-spacing: 1px;
-    margin-top: 10px;
-    margin-bottom: 20px;
-}
-</style>
-
-
-<div class="menu-title">
-    เมนู
-</div>
-""", unsafe_allow_html=True)
-
-
-def nav_button(label, key, icon=""):
-    active = (st.session_state.page == key)
-    btn = st.sidebar.button(f"{icon} {label}", use_container_width=True, key=f"btn_{key}")
-    if btn:
-        st.session_state.page = key
-        st.rerun()
-    # ทำไฮไลต์แบบง่าย (ตัวหนา/ตัวชี้)
-    # if active:
-    #     st.sidebar.markdown(f"✅ **{label}**")
-
-
-nav_button("หนังสือ", "books", "📚")
-nav_button("สมาชิก", "members", "👤")
-nav_button("ยืม-คืน", "borrows", "🔄")
-
-
-
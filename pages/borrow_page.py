@@ -5,21 +5,76 @@ from datetime import date, timedelta
 
 import model
 import controller
+import render_stats
+import view_helpers
 
 
-def _contains_ignore_case(series, keyword: str):
-    kw = (keyword or "").strip().lower()
-    if not kw:
-        return series.notna()
-    return series.fillna("").astype(str).str.lower().str.contains(kw)
+# จำนวนหนังสือ/สมาชิกสูงสุดที่แสดงเป็นตัวเลือกจากการค้นหา
+BOOK_OPTION_LIMIT = 100
+MEMBER_OPTION_LIMIT = model.MEMBER_LOOKUP_LIMIT
 
+# จำนวนรายการต่อหน้าในประวัติการยืม-คืน
+HISTORY_PAGE_SIZE = 50
+
+HISTORY_STATUS = {"ทั้งหมด": "all", "ยังไม่คืน": "borrowed", "คืนแล้ว": "returned"}
+
+
+# =========================
+# ตะกร้ายืม / สแกนบาร์โค้ด (callback ทำงานก่อน rerun)
+# =========================
+def _init_cart():
+    # borrow_cart: book_id ตามลำดับที่เพิ่ม / borrow_cart_books: book_id -> รายละเอียด (ไม่ต้อง query ซ้ำทุก rerun)
+    st.session_state.setdefault("borrow_cart", [])
+    st.session_state.setdefault("borrow_cart_books", {})
+
+
+def _add_to_cart(book: dict):
+    _init_cart()
+    book_id = int(book["id"])
+    st.session_state["borrow_cart"].append(book_id)
+    st.session_state["borrow_cart_books"][book_id] = {
+        "id": book_id, "title": book["title"], "author": book["author"]
+    }
+
+
+def _remove_from_cart(book_id: int):
+    st.session_state["borrow_cart"] = [x for x in st.session_state["borrow_cart"] if int(x) != book_id]
+    st.session_state["borrow_cart_books"].pop(book_id, None)
 
-def render_borrow():
-    st.subheader("🔄 การทำรายการยืม-คืนหนังสือ")
 
+def _clear_cart():
+    st.session_state["borrow_cart"] = []
+    st.session_state["borrow_cart_books"] = {}
 
-    # สร้าง schema ยืม-คืน หากยังไม่มี
-    model.ensure_borrow_schema()
+
+def _on_scan_checkout():
+    _init_cart()
+    ok, msgs, book = controller.scan_book_for_checkout(
+        st.session_state.get("borrow_scan", ""), st.session_state["borrow_cart"]
+    )
+    if ok:
+        _add_to_cart(book)
+    st.session_state["borrow_scan_flash"] = (ok, msgs)
+    st.session_state["borrow_scan"] = ""  # ล้างช่องให้สแกนเล่มถัดไปได้ทันที
+
+
+def _on_scan_return(staff_user_id):
+    ok, msgs = controller.scan_book_for_return(st.session_state.get("return_scan", ""), staff_user_id)
+    st.session_state["return_scan_flash"] = (ok, msgs)
+    st.session_state["return_scan"] = ""
+
+
+def _show_flash(key: str):
+    """แสดงผลการสแกนครั้งล่าสุด (เก็บไว้ใน session ตอน callback)"""
+    flash = st.session_state.pop(key, None)
+    if flash:
+        ok, msgs = flash
+        for m in msgs:
+            (st.success if ok else st.warning)(m)
+
+
+def render_borrow():
+    st.subheader("🔄 การทำรายการยืม-คืนหนังสือ")
 
 
     # ผู้ทำรายการ (admin/staff)
@@ -30,11 +85,11 @@ def render_borrow():
     # =========================
     # ส่วนที่ 1: ทำรายการยืม
     # =========================
+    render_stats.section("1) ยืม")
     st.markdown("### 1) ทำรายการยืม (ยืมได้มากกว่าหนึ่งเล่มต่อครั้ง)")
 
 
-    members_df = model.get_active_members()
-    if members_df.empty:
+    if model.count_members(active_only=True) == 0:
         st.warning("ไม่พบสมาชิกที่ใช้งานอยู่ กรุณาเพิ่มสมาชิกก่อนทำรายการยืม")
         return
 
@@ -43,118 +98,108 @@ def render_borrow():
     st.markdown("**1.1 เลือกสมาชิก (ค้นหาจากรหัสสมาชิกหรือชื่อสมาชิก)**")
     member_kw = st.text_input(
         "ค้นหาสมาชิก",
-        placeholder="พิมพ์รหัสสมาชิก หรือ ชื่อสมาชิก เช่น M010 หรือ Martha",
+        placeholder="พิมพ์ต้นรหัสสมาชิก หรือ ต้นชื่อสมาชิก เช่น M010 หรือ Martha",
         key="borrow_member_kw",
     )
 
 
-    mdf = members_df.copy()
-    mask_m = _contains_ignore_case(mdf["member_code"], member_kw) | _contains_ignore_case(mdf["name"], member_kw)
-    mdf = mdf[mask_m].copy()
-
-
-    if mdf.empty:
-        st.info("ไม่พบสมาชิกตามคำค้น กรุณาลองใหม่")
-        selected_member_id = None
+    # ค้นหาเมื่อพิมพ์แล้วเท่านั้น (รหัส/ชื่อที่ขึ้นต้นด้วยคำค้น ผ่าน index ของตาราง members)
+    selected_member_id = None
+    if not member_kw.strip():
+        st.caption("พิมพ์รหัสสมาชิกหรือชื่อสมาชิกเพื่อค้นหา")
     else:
-        member_options = {
-            f"{r['member_code']} : {r['name']}": int(r["id"])
-            for _, r in mdf.iterrows()
-        }
-        member_label = st.selectbox("รายการสมาชิกที่พบ", list(member_options.keys()), key="borrow_member_select")
-        selected_member_id = member_options.get(member_label)
+        mdf = model.lookup_members(member_kw, limit=MEMBER_OPTION_LIMIT)
+        if mdf.empty:
+            st.info("ไม่พบสมาชิกตามคำค้น กรุณาลองใหม่")
+        else:
+            selected_member_id = view_helpers.select_id(
+                "รายการสมาชิกที่พบ", mdf, "{member_code} : {name}",
+                limit=MEMBER_OPTION_LIMIT, key="borrow_member_select"
+            )
 
 
     st.markdown("---")
 
 
-    # --- 1.2 ค้นหา/เพิ่มหนังสือทีละรายการ (ตะกร้ายืม) ---
-    st.markdown("**1.2 เพิ่มรายการหนังสือ (ค้นหาจากรหัสหนังสือหรือชื่อหนังสือ และเพิ่มทีละรายการ)**")
-
-
-    if "borrow_cart" not in st.session_state:
-        st.session_state["borrow_cart"] = []  # เก็บ book_id ที่เลือกแล้ว (list[int])
-
-
-    books_df = model.get_available_books()
+    # --- 1.2 สแกน/ค้นหาหนังสือเพิ่มลงตะกร้ายืม ---
+    st.markdown("**1.2 เพิ่มรายการหนังสือ (สแกนบาร์โค้ด/รหัสหนังสือ หรือค้นหาจากชื่อหนังสือ)**")
+    _init_cart()
 
 
-    if books_df.empty:
-        st.info("ขณะนี้ไม่มีหนังสือสถานะ available สำหรับให้ยืม")
-    else:
-        book_kw = st.text_input(
-            "ค้นหาหนังสือ",
-            placeholder="พิมพ์รหัสหนังสือ หรือ ชื่อหนังสือ เช่น 6, 16, หรือ โด, python",
-            key="borrow_book_kw",
-        )
+    # สแกนแล้วกด Enter: หาเล่มด้วย barcode/id (index เดียว) แล้วเพิ่มลงตะกร้าใน callback เลย
+    st.text_input(
+        "📷 สแกนบาร์โค้ด / รหัสหนังสือ",
+        placeholder="สแกนหรือพิมพ์รหัสแล้วกด Enter",
+        key="borrow_scan",
+        on_change=_on_scan_checkout,
+    )
+    _show_flash("borrow_scan_flash")
 
 
-        bdf = books_df.copy()
+    book_kw = st.text_input(
+        "ค้นหาหนังสือ",
+        placeholder="พิมพ์รหัสหนังสือ หรือ ชื่อหนังสือ เช่น 6, 16, หรือ โด, python",
+        key="borrow_book_kw",
+    )
 
 
-        # -----------------------------
-        # ✅ ค้นหาแบบ "บางส่วนของรหัส" หรือ "บางส่วนของชื่อ"
-        # - id: แปลงเป็น string แล้วค้นแบบ contains (รองรับบางส่วน เช่น '6' เจอ 6,16,60)
-        # - title: ค้นแบบ contains โดยไม่สนใจตัวพิมพ์เล็ก-ใหญ่ (case-insensitive)
-        # - หากผู้ใช้ไม่พิมพ์อะไร ให้แสดงทั้งหมด
-        # -----------------------------
-        kw = (book_kw or "").strip()
-        if kw:
-            mask_id = bdf["id"].astype(str).str.contains(kw, na=False)  # substring ของรหัส
-            mask_title = bdf["title"].astype(str).str.contains(kw, case=False, na=False)  # substring ของชื่อ
-            mask_b = mask_id | mask_title
-            bdf = bdf[mask_b].copy()
-        # else: ไม่ต้องกรอง แสดงทั้งหมด
+    # -----------------------------
+    # ✅ ค้นหาจาก "รหัสหนังสือ" หรือ "บางส่วนของชื่อ/ผู้แต่ง" ผ่านดัชนี books_fts
+    # - ตัวเลข: หนังสือรหัสนั้นขึ้นก่อน ตามด้วยชื่อที่มีตัวเลขนั้น
+    # - ชื่อ: เรียงตามความเกี่ยวข้อง ไม่สนใจตัวพิมพ์เล็ก-ใหญ่
+    # - หากผู้ใช้ไม่พิมพ์อะไร ให้แสดงรายการล่าสุด
+    # -----------------------------
+    bdf = model.search_books_fts(book_kw, limit=BOOK_OPTION_LIMIT, available_only=True)
 
 
-        if bdf.empty:
+    if bdf.empty:
+        if book_kw.strip():
             st.info("ไม่พบหนังสือตามคำค้น กรุณาลองใหม่")
         else:
-            book_options = {
-                f"{int(r['id'])} : {r['title']}": int(r["id"])
-                for _, r in bdf.iterrows()
-            }
-            book_label = st.selectbox("รายการหนังสือที่พบ", list(book_options.keys()), key="borrow_book_select")
-            add_book_id = book_options.get(book_label)
-
-
-            col_add1, col_add2 = st.columns([1, 2])
-            with col_add1:
-                if st.button("➕ เพิ่มรายการ", use_container_width=True):
-                    if add_book_id in st.session_state["borrow_cart"]:
-                        st.warning("หนังสือเล่มนี้ถูกเพิ่มในรายการแล้ว")
-                    else:
-                        st.session_state["borrow_cart"].append(int(add_book_id))
-                        st.success("เพิ่มรายการเรียบร้อยแล้ว")
-                        st.rerun()
-            with col_add2:
-                if st.button("🧹 ล้างรายการที่เลือกทั้งหมด", use_container_width=True):
-                    st.session_state["borrow_cart"] = []
+            st.info("ขณะนี้ไม่มีหนังสือสถานะ available สำหรับให้ยืม")
+    else:
+        add_book_id = view_helpers.select_id(
+            "รายการหนังสือที่พบ", bdf, "{id} : {title}",
+            limit=BOOK_OPTION_LIMIT, key="borrow_book_select"
+        )
+
+
+        col_add1, col_add2 = st.columns([1, 2])
+        with col_add1:
+            if st.button("➕ เพิ่มรายการ", use_container_width=True):
+                if add_book_id in st.session_state["borrow_cart"]:
+                    st.warning("หนังสือเล่มนี้ถูกเพิ่มในรายการแล้ว")
+                else:
+                    _add_to_cart(bdf[bdf["id"] == add_book_id].iloc[0])
+                    st.success("เพิ่มรายการเรียบร้อยแล้ว")
                     st.rerun()
-    
+        with col_add2:
+            if st.button("🧹 ล้างรายการที่เลือกทั้งหมด", use_container_width=True):
+                _clear_cart()
+                st.rerun()
 
 
-    # แสดงตะกร้ายืม
+
+    # แสดงตะกร้ายืม (จากรายละเอียดที่เก็บไว้ใน session ไม่ต้องกรองรายการหนังสือทั้งหมด)
     if st.session_state["borrow_cart"]:
-        cart_ids = st.session_state["borrow_cart"]
-        cart_df = books_df[books_df["id"].isin(cart_ids)].copy()
-        cart_df = cart_df.sort_values("id")
+        cart_books = st.session_state["borrow_cart_books"]
+        cart_rows = [cart_books[b] for b in st.session_state["borrow_cart"] if b in cart_books]
 
 
-        st.markdown("**รายการหนังสือที่เลือก (ตะกร้ายืม)**")
-        st.dataframe(cart_df[["id", "title", "author"]], use_container_width=True)
+        st.markdown(f"**รายการหนังสือที่เลือก (ตะกร้ายืม) {len(cart_rows)} เล่ม**")
+        st.dataframe(cart_rows, use_container_width=True)
 
 
         # ปุ่มลบรายเล่ม
         st.markdown("**ลบรายการทีละเล่ม**")
-        for _, r in cart_df.iterrows():
-            bid = int(r["id"])
+        for book in cart_rows:
+            bid = book["id"]
             c1, c2 = st.columns([6, 1])
             with c1:
-                st.write(f"📘 {bid} : {r['title']}")
+                st.write(f"📘 {bid} : {book['title']}")
             with c2:
                 if st.button("ลบ", key=f"remove_cart_{bid}"):
-                    st.session_state["borrow_cart"] = [x for x in st.session_state["borrow_cart"] if int(x) != bid]
+                    _remove_from_cart(bid)
                     st.rerun()
     else:
         st.info("ยังไม่มีรายการหนังสือในตะกร้ายืม")
@@ -182,7 +227,7 @@ def render_borrow():
             for m in msgs:
                 st.success("✅ " + m)
             # เคลียร์ตะกร้า
-            st.session_state["borrow_cart"] = []
+            _clear_cart()
             st.rerun()
 
 
@@ -192,32 +237,41 @@ def render_borrow():
     # =========================
     # ส่วนที่ 2: ทำรายการคืน
     # =========================
+    render_stats.section("2) คืน")
     st.markdown("### 2) ทำรายการคืน (ค้นหาสมาชิก → ดูรายการค้างส่ง → ติ๊กคืนได้หลายเล่ม)")
 
 
+    # สแกนคืนทีละเล่ม: หารายการยืมที่ค้างของเล่มนั้นแล้วคืนทันที (ไม่ต้องเลือกสมาชิก)
+    st.text_input(
+        "📷 สแกนคืน (บาร์โค้ด / รหัสหนังสือ)",
+        placeholder="สแกนหรือพิมพ์รหัสแล้วกด Enter",
+        key="return_scan",
+        on_change=_on_scan_return,
+        args=(staff_user_id,),
+    )
+    _show_flash("return_scan_flash")
+
+
     st.markdown("**2.1 เลือกสมาชิกเพื่อดูรายการค้างส่ง**")
     return_member_kw = st.text_input(
         "ค้นหาสมาชิก (สำหรับคืน)",
-        placeholder="พิมพ์รหัสสมาชิก หรือ ชื่อสมาชิก เช่น M010 หรือ Martha",
+        placeholder="พิมพ์ต้นรหัสสมาชิก หรือ ต้นชื่อสมาชิก เช่น M010 หรือ Martha",
         key="return_member_kw",
     )
 
 
-    rdf = members_df.copy()
-    mask_rm = _contains_ignore_case(rdf["member_code"], return_member_kw) | _contains_ignore_case(rdf["name"], return_member_kw)
-    rdf = rdf[mask_rm].copy()
-
-
-    if rdf.empty:
-        st.info("ไม่พบสมาชิกตามคำค้น กรุณาลองใหม่")
-        return_member_id = None
+    return_member_id = None
+    if not return_member_kw.strip():
+        st.caption("พิมพ์รหัสสมาชิกหรือชื่อสมาชิกเพื่อค้นหา")
     else:
-        return_member_options = {
-            f"{r['member_code']} : {r['name']}": int(r["id"])
-            for _, r in rdf.iterrows()
-        }
-        return_member_label = st.selectbox("รายการสมาชิกที่พบ (สำหรับคืน)", list(return_member_options.keys()), key="return_member_select")
-        return_member_id = return_member_options.get(return_member_label)
+        rdf = model.lookup_members(return_member_kw, limit=MEMBER_OPTION_LIMIT)
+        if rdf.empty:
+            st.info("ไม่พบสมาชิกตามคำค้น กรุณาลองใหม่")
+        else:
+            return_member_id = view_helpers.select_id(
+                "รายการสมาชิกที่พบ (สำหรับคืน)", rdf, "{member_code} : {name}",
+                limit=MEMBER_OPTION_LIMIT, key="return_member_select"
+            )
 
 
     if return_member_id:
@@ -268,6 +322,7 @@ def render_borrow():
     # =========================
     # ส่วนที่ 3: รายการหนังสือค้างส่งทั้งหมด
     # =========================
+    render_stats.section("3) ค้างส่ง")
     st.markdown("### 3) รายการหนังสือค้างส่งทั้งหมด (แสดงชื่อสมาชิก)")
 
 
@@ -309,69 +364,77 @@ def render_borrow():
     # =========================
     # ส่วนที่ 4: ประวัติการยืม-คืน
     # =========================
+    render_stats.section("4) ประวัติ")
     st.markdown("### 4) ประวัติการยืม-คืน (ค้นหาได้)")
 
 
-    history_df = model.get_borrow_history(limit=200)
+    # ช่องค้นหา: ค้นจากบางส่วนของชื่อหนังสือ / รหัสสมาชิก / ชื่อสมาชิก
+    hist_kw = st.text_input(
+        "ค้นหาประวัติ",
+        placeholder="พิมพ์บางส่วนของชื่อหนังสือ หรือ รหัสสมาชิก หรือ ชื่อสมาชิก",
+        key="history_search_kw"
+    ).strip()
+
+
+    col_h1, col_h2, col_h3 = st.columns(3)
+    with col_h1:
+        hist_status_label = st.selectbox("สถานะ", list(HISTORY_STATUS.keys()), key="history_status")
+    with col_h2:
+        use_date = st.checkbox("กรองตามช่วงวันที่ยืม", key="history_use_date")
+    with col_h3:
+        hist_range = st.date_input(
+            "ช่วงวันที่ยืม",
+            value=(date.today() - timedelta(days=30), date.today()),
+            disabled=not use_date,
+            key="history_range"
+        )
 
 
-    if history_df.empty:
-        st.info("ยังไม่มีประวัติการยืม-คืน")
-    else:
-        # ช่องค้นหา: ค้นจากบางส่วนของชื่อหนังสือ / รหัสสมาชิก / ชื่อสมาชิก
-        hist_kw = st.text_input(
-            "ค้นหาประวัติ",
-            placeholder="พิมพ์บางส่วนของชื่อหนังสือ หรือ รหัสสมาชิก หรือ ชื่อสมาชิก",
-            key="history_search_kw"
-        ).strip()
+    start_iso = end_iso = None
+    if use_date and isinstance(hist_range, (tuple, list)) and len(hist_range) == 2:
+        start_iso, end_iso = hist_range[0].isoformat(), hist_range[1].isoformat()
 
 
-        df = history_df.copy()
+    # -----------------------------
+    # แบ่งหน้าแบบ keyset: เก็บ item_id สุดท้ายของแต่ละหน้าไว้ใน session
+    # เปลี่ยนเงื่อนไขค้นหาเมื่อไหร่ ให้กลับไปหน้าแรก
+    # -----------------------------
+    filters = (hist_kw, HISTORY_STATUS[hist_status_label], start_iso, end_iso)
+    if st.session_state.get("history_filters") != filters:
+        st.session_state["history_filters"] = filters
+        st.session_state["history_cursors"] = []
+    cursors = st.session_state["history_cursors"]
 
 
-        # -----------------------------
-        # ตัดคอลัมน์ที่ไม่ต้องแสดง
-        # - ไม่แสดง item_id, tx_id
-        # - ไม่แสดงคอลัมน์ที่เกี่ยวกับ 'บทบาท'
-        # -----------------------------
-        drop_cols = []
-        for col in df.columns:
-            if col in ("item_id", "tx_id"):
-                drop_cols.append(col)
-            if "บทบาท" in col:  # เช่น "บทบาทผู้ทำรายการยืม"
-                drop_cols.append(col)
+    # ขอเกินมา 1 แถวเพื่อรู้ว่ามีหน้าถัดไปหรือไม่
+    df = model.get_borrow_history(
+        limit=HISTORY_PAGE_SIZE + 1,
+        keyword=hist_kw,
+        start_date=start_iso,
+        end_date=end_iso,
+        status=HISTORY_STATUS[hist_status_label],
+        before_id=cursors[-1] if cursors else None,
+    )
+    has_next = len(df) > HISTORY_PAGE_SIZE
+    df = df.head(HISTORY_PAGE_SIZE)
 
 
-        if drop_cols:
-            df = df.drop(columns=list(set(drop_cols)), errors="ignore")
+    if df.empty:
+        if hist_kw or use_date or HISTORY_STATUS[hist_status_label] != "all":
+            st.info("ไม่พบข้อมูลตามคำค้น")
+        else:
+            st.info("ยังไม่มีประวัติการยืม-คืน")
+    else:
+        last_item_id = int(df["item_id"].iloc[-1])
 
 
         # -----------------------------
-        # ค้นหาแบบ substring (case-insensitive)
-        # คอลัมน์ที่ใช้ค้นหา:
-        # - ชื่อหนังสือ
-        # - รหัสสมาชิก
-        # - ชื่อสมาชิก
+        # ตัดคอลัมน์ที่ไม่ต้องแสดง
+        # - ไม่แสดง item_id, tx_id
+        # - ไม่แสดงคอลัมน์ที่เกี่ยวกับ 'บทบาท'
         # -----------------------------
-        if hist_kw:
-            kw = hist_kw.lower()
-
-
-            def _col_contains(colname: str):
-                if colname not in df.columns:
-                    # ถ้าไม่มีคอลัมน์นั้น ให้คืน False ทั้งหมด
-                    return df.index.to_series().map(lambda _: False)
-                return df[colname].fillna("").astype(str).str.lower().str.contains(kw, na=False)
-
-
-            mask = (
-                _col_contains("ชื่อหนังสือ") |
-                _col_contains("รหัสสมาชิก") |
-                _col_contains("ชื่อสมาชิก")
-            )
-
-
-            df = df[mask].copy()
+        drop_cols = [c for c in df.columns if c in ("item_id", "tx_id") or "บทบาท" in c]
+        df = df.drop(columns=drop_cols, errors="ignore")
 
 
         # จัดลำดับคอลัมน์ให้อ่านง่าย (แสดงเท่าที่สำคัญ)
@@ -383,10 +446,16 @@ def render_borrow():
             "ผู้ทำรายการยืม", "ผู้ทำรายการคืน"
         ]
         cols_to_show = [c for c in preferred_cols if c in df.columns] + [c for c in df.columns if c not in preferred_cols]
-        df = df[cols_to_show]
-
-
-        if df.empty:
-            st.info("ไม่พบข้อมูลตามคำค้น")
-        else:
-            st.dataframe(df, use_container_width=True)
+        st.dataframe(df[cols_to_show], use_container_width=True)
+        st.caption(f"หน้า {len(cursors) + 1} (แสดง {len(df)} รายการ เรียงจากล่าสุด)")
+
+
+        col_prev, col_next = st.columns(2)
+        with col_prev:
+            if st.button("⬅️ หน้าก่อนหน้า", disabled=not cursors, use_container_width=True, key="history_prev"):
+                cursors.pop()
+                st.rerun()
+        with col_next:
+            if st.button("หน้าถัดไป ➡️", disabled=not has_next, use_container_width=True, key="history_next"):
+                cursors.append(last_item_id)
+                st.rerun()
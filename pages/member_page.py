@@ -1,6 +1,15 @@
+import math
+
 import streamlit as st
 import model
 import controller
+import render_stats
+import view_helpers
+
+# จำนวนแถวต่อหน้าในรายชื่อสมาชิก
+PAGE_SIZE = 50
+# จำนวนตัวเลือกสูงสุดใน selectbox แก้ไขสมาชิก
+OPTION_LIMIT = 100
 
 # =========================
 # View helpers (reset form)
@@ -25,6 +34,7 @@ def render_member():
         st.session_state["_reset_member_next_run"] = False
 
     # -------- 1. Members: Create --------
+    render_stats.section("สมัครสมาชิก")
     st.subheader("สมัครสมาชิกใหม่")
     with st.form("member_form"):
         col_a, col_b = st.columns(2)
@@ -60,44 +70,70 @@ def render_member():
     st.divider()
 
     # -------- 2. Members: Read + Delete --------
+    render_stats.section("รายชื่อสมาชิก")
     st.subheader("📋 รายชื่อสมาชิกทั้งหมด")
-    members_df = model.get_all_members()
-    if members_df.empty:
-        st.info("ยังไม่มีข้อมูลสมาชิกในระบบ")
+    list_kw = st.text_input("ค้นหารหัส/ชื่อสมาชิก", key="member_list_kw")
+
+    # ค้นหา/แบ่งหน้าใน SQL ดึงมาเฉพาะแถวของหน้าที่แสดง
+    total_members = model.count_members(list_kw)
+    if total_members == 0:
+        if list_kw.strip():
+            st.info("ไม่พบสมาชิกตามคำค้นหา")
+        else:
+            st.info("ยังไม่มีข้อมูลสมาชิกในระบบ")
     else:
-        # แสดงตารางภาพรวม
-        st.dataframe(members_df, use_container_width=True)
-        
-        st.write("---")
-        st.caption("จัดการรายบุคคล")
-        for _, row in members_df.iterrows():
-            c1, c2, c3, c4 = st.columns([3, 3, 2, 1])
-            with c1:
-                st.write(f"**{row['รหัสสมาชิก']}** : {row['ชื่อสกุล']}")
-            with c2:
-                st.write(row["อีเมล"] if row["อีเมล"] else "-")
-            with c3:
-                st.write(f"สถานะ: {row['สถานะ']}")
-            with c4:
-                if st.button("ลบ", key=f"delete_member_{row['id']}"):
-                    controller.remove_member(int(row["id"]))
-                    st.success(f"ลบสมาชิก {row['ชื่อสกุล']} เรียบร้อยแล้ว")
-                    st.rerun()
+        total_pages = math.ceil(total_members / PAGE_SIZE)
+        if st.session_state.get("member_list_page", 1) > total_pages:
+            st.session_state["member_list_page"] = 1
+        page = st.number_input("หน้า", min_value=1, max_value=total_pages, step=1, key="member_list_page")
+
+        offset = (int(page) - 1) * PAGE_SIZE
+        page_df = model.search_members(list_kw, offset=offset, limit=PAGE_SIZE)
+
+        # ตารางของหน้าปัจจุบัน + ช่องติ๊กเลือกลบ
+        grid_df = page_df.copy()
+        grid_df.insert(0, "เลือก", False)
+        edited = st.data_editor(
+            grid_df,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "เลือก": st.column_config.CheckboxColumn("เลือก", help="ติ๊กเพื่อเลือกลบ")
+            },
+            disabled=[c for c in grid_df.columns if c != "เลือก"],
+            key=f"member_grid_{offset}_{list_kw}_{st.session_state.get('member_grid_version', 0)}",
+        )
+        st.caption(f"แสดงรายการที่ {offset + 1}-{offset + len(page_df)} จาก {total_members} รายการ (หน้า {int(page)}/{total_pages})")
+
+        selected_ids = edited.loc[edited["เลือก"] & edited["id"].notna(), "id"].astype(int).tolist()
+        if st.button(f"🗑 ลบสมาชิกที่เลือก ({len(selected_ids)})", disabled=not selected_ids):
+            _, msgs = controller.remove_members(selected_ids)
+            st.session_state["member_grid_flash"] = msgs
+            st.session_state["member_grid_version"] = st.session_state.get("member_grid_version", 0) + 1
+            st.rerun()
+
+    # ข้อความผลการลบจากรอบก่อน (ก่อน rerun)
+    for m in st.session_state.pop("member_grid_flash", []):
+        (st.success if m.startswith("✅") else st.warning)(m)
 
     st.divider()
 
     # -------- 3. Members: Update --------
+    render_stats.section("แก้ไขสมาชิก")
     st.subheader("✏️ แก้ไขข้อมูลสมาชิก")
-    if members_df.empty:
+    if model.count_members() == 0:
         st.info("ยังไม่มีข้อมูลให้แก้ไข")
     else:
-        member_options = [
-            f"{row['id']} - {row['รหัสสมาชิก']} : {row['ชื่อสกุล']}"
-            for _, row in members_df.iterrows()
-        ]
-        selected = st.selectbox("เลือกสมาชิกที่จะแก้ไข", member_options, key="selected_member_update")
-        selected_id = int(selected.split(" - ")[0])
-        selected_row = members_df[members_df["id"] == selected_id].iloc[0]
+        search_member = st.text_input("ค้นหารหัส/ชื่อสมาชิกที่ต้องการแก้ไข", key="search_member_update")
+        filtered_df = model.search_members(search_member, limit=OPTION_LIMIT)
+        if filtered_df.empty:
+            st.warning("ไม่พบสมาชิกตามคำค้นหา")
+            return
+        selected_id = view_helpers.select_id(
+            "เลือกสมาชิกที่จะแก้ไข", filtered_df, "{id} - {รหัสสมาชิก} : {ชื่อสกุล}",
+            limit=OPTION_LIMIT, key="selected_member_update"
+        )
+        selected_row = filtered_df[filtered_df["id"] == selected_id].iloc[0]
 
         with st.form("edit_member_form"):
             col1, col2 = st.columns(2)
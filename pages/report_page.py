@@ -1,27 +1,142 @@
 import streamlit as st
+import controller
+import export_jobs
 import model
+import render_stats
+import report_export
 from datetime import date
-import io
 import pandas as pd
-import plotly.express as px
 
-# เพิ่ม Imports สำหรับ ReportLab
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+# จำนวนแถวตัวอย่างที่แสดงบนหน้าจอ
+PREVIEW_ROWS = 200
+
+# รายงานไม่เกินจำนวนนี้ดาวน์โหลดได้ทันที (ไฟล์เล็ก) ใหญ่กว่านี้ให้ส่งออกเป็นงานเบื้องหลัง
+DIRECT_EXPORT_MAX_ROWS = 2000
+
+# งานส่งออก: จำนวนงานล่าสุดที่แสดง / ความถี่ในการดึงความคืบหน้า (วินาที)
+EXPORT_JOBS_SHOWN = 10
+EXPORT_POLL_SECONDS = 2
+
+EXPORT_KIND_LABELS = {"csv": "CSV", "xlsx": "Excel", "pdf": "PDF"}
+EXPORT_STATUS_LABELS = {"all": "ทั้งหมด", "borrowed": "ยังไม่คืน", "returned": "คืนแล้ว"}
+
+
+def _show_export_jobs(jobs: list[dict]):
+    """รายการงานส่งออกล่าสุด พร้อมความคืบหน้า / ปุ่มดาวน์โหลดเมื่อเสร็จ"""
+    if not jobs:
+        st.caption("ยังไม่มีงานส่งออก")
+        return
+
+    for job in jobs:
+        label = (
+            f"#{job['id']} {EXPORT_KIND_LABELS[job['kind']]} "
+            f"{job['start_date']} ถึง {job['end_date']} ({EXPORT_STATUS_LABELS.get(job['status_filter'], job['status_filter'])})"
+            f" · โดย {job['requested_by_name'] or '-'}"
+        )
+        col_info, col_download = st.columns([4, 1])
+        with col_info:
+            if job["state"] == "queued":
+                st.caption(f"{label} — ⏳ รอคิว")
+            elif job["state"] == "running":
+                st.progress(
+                    export_jobs.job_progress(job),
+                    text=f"{label} — {job['rows_done']:,}/{job['total_rows'] or 0:,} แถว"
+                )
+            elif job["state"] == "done":
+                st.caption(f"{label} — ✅ เสร็จแล้ว {job['rows_done']:,} แถว")
+            else:
+                st.caption(f"{label} — ❌ ไม่สำเร็จ: {job['error']}")
+        with col_download:
+            if export_jobs.result_available(job):
+                st.download_button(
+                    "⬇️ ดาวน์โหลด",
+                    data=lambda j=job: export_jobs.open_result(j),
+                    file_name=export_jobs.download_name(job),
+                    mime=export_jobs.mime_type(job),
+                    key=f"export_job_{job['id']}"
+                )
+
+
+@st.fragment(run_every=EXPORT_POLL_SECONDS)
+def _poll_export_jobs():
+    """rerun เฉพาะส่วนนี้ทุก EXPORT_POLL_SECONDS วินาทีระหว่างที่ยังมีงานค้าง"""
+    jobs = export_jobs.recent_jobs(EXPORT_JOBS_SHOWN)
+    _show_export_jobs(jobs)
+    if not any(j["state"] in model.EXPORT_JOB_ACTIVE_STATES for j in jobs):
+        # งานเสร็จหมดแล้ว: rerun ทั้งหน้าหนึ่งครั้งเพื่อหยุดการดึงซ้ำ
+        st.rerun()
+
+
+def _render_export_jobs():
+    render_stats.section("5) ไฟล์ที่ส่งออก")
+    st.markdown("### 5) ไฟล์ที่ส่งออก")
+    jobs = export_jobs.recent_jobs(EXPORT_JOBS_SHOWN)
+    if any(j["state"] in model.EXPORT_JOB_ACTIVE_STATES for j in jobs):
+        _poll_export_jobs()
+    else:
+        _show_export_jobs(jobs)
+
 
 def render_report():
+    # plotly โหลดช้า: import เมื่อเปิดหน้ารายงานจริง (ไม่ใช่ตอนเปิดแอป)
+    import plotly.express as px
+
     st.subheader("📊 รายงานสรุประบบยืม-คืนหนังสือ")
 
-    # ... (ส่วนที่ 1 และ 2: กราฟวงกลมและกราฟแท่ง คงไว้ตามเดิม) ...
-    # [ตัดโค้ดส่วนกราฟออกเพื่อความกระชับ แต่ในไฟล์จริงของคุณให้คงไว้]
+    # กราฟทั้งสองส่วนอ่านจากตารางสรุป agg_* (ขนาดคงที่ ไม่ขึ้นกับจำนวนธุรกรรม)
+
+    # ===============================
+    # 1) สถานะหนังสือทั้งหมด (กราฟวงกลม)
+    # ===============================
+    render_stats.section("1) สถานะหนังสือ")
+    st.markdown("### 1) สถานะหนังสือทั้งหมด")
+    status_df = model.get_book_status_summary()
+    if status_df.empty:
+        st.info("ยังไม่มีข้อมูลหนังสือในระบบ")
+    else:
+        fig_status = px.pie(status_df, names="สถานะหนังสือ", values="จำนวน", hole=0.3)
+        st.plotly_chart(fig_status, use_container_width=True)
+
+    # ===============================
+    # 2) จำนวนการยืม–คืนรายเดือน (กราฟแท่ง)
+    # ===============================
+    render_stats.section("2) รายเดือน")
+    st.markdown("### 2) จำนวนการยืม–คืนรายเดือน")
+    col_m1, col_m2 = st.columns(2)
+    with col_m1:
+        chart_start = st.date_input("ตั้งแต่เดือน", value=date(date.today().year, 1, 1), key="chart_start")
+    with col_m2:
+        chart_end = st.date_input("ถึงเดือน", value=date.today(), key="chart_end")
+
+    borrow_month_df = model.get_borrow_summary_by_month(chart_start.isoformat(), chart_end.isoformat())
+    return_month_df = model.get_return_summary_by_month(chart_start.isoformat(), chart_end.isoformat())
+    month_df = (
+        pd.merge(borrow_month_df, return_month_df, on="เดือน", how="outer")
+        .fillna(0)
+        .astype({"จำนวนการยืม": int, "จำนวนการคืน": int})
+        .sort_values("เดือน")
+    )
+    if month_df.empty:
+        st.info("ไม่มีการยืม–คืนในช่วงเดือนที่เลือก")
+    else:
+        fig_month = px.bar(
+            month_df,
+            x="เดือน",
+            y=["จำนวนการยืม", "จำนวนการคืน"],
+            barmode="group",
+            labels={"value": "จำนวน", "variable": ""},
+        )
+        st.plotly_chart(fig_month, use_container_width=True)
+
+    top_df = model.get_member_active_loans(limit=10)
+    if not top_df.empty:
+        st.markdown("**สมาชิกที่มีหนังสือค้างส่งมากที่สุด**")
+        st.dataframe(top_df, use_container_width=True, hide_index=True)
 
     # ===============================
     # 3) รายการผู้ยืม–คืนทั้งหมด
     # ===============================
+    render_stats.section("3) รายการผู้ยืม-คืน")
     st.markdown("### 3) รายการผู้ยืม–คืนทั้งหมด")
 
     col1, col2, col3 = st.columns(3)
@@ -34,88 +149,95 @@ def render_report():
 
     if report_start > report_end:
         st.warning("วันที่เริ่มต้นต้องไม่มากกว่าวันที่สิ้นสุด")
+        _render_export_jobs()
         return
 
     status_map = {"ทั้งหมด": "all", "ยังไม่คืน": "borrowed", "คืนแล้ว": "returned"}
     selected_status = status_map[status_label]
 
-    report_df = model.get_borrow_report(
-        report_start.isoformat(),
-        report_end.isoformat(),
-        selected_status
-    )
+    start_iso, end_iso = report_start.isoformat(), report_end.isoformat()
 
-    if report_df.empty:
+    # แสดงตัวอย่างเฉพาะแถวแรก ๆ รายงานฉบับเต็มสร้างตอนกดส่งออกเท่านั้น
+    total_rows = model.count_borrow_report(start_iso, end_iso, selected_status)
+    if total_rows == 0:
         st.info("ไม่พบข้อมูลตามเงื่อนไขที่เลือก")
+        _render_export_jobs()
         return
 
-    st.dataframe(report_df, use_container_width=True)
+    preview_df = model.get_borrow_report(start_iso, end_iso, selected_status, limit=PREVIEW_ROWS)
+    st.dataframe(preview_df, use_container_width=True)
+    if total_rows > PREVIEW_ROWS:
+        st.caption(f"แสดงตัวอย่าง {PREVIEW_ROWS} รายการแรกจากทั้งหมด {total_rows} รายการ (ไฟล์ที่ส่งออกมีครบทุกรายการ)")
+    else:
+        st.caption(f"ทั้งหมด {total_rows} รายการ")
 
     # ===============================
     # 4) ส่งออกรายงาน
     # ===============================
+    render_stats.section("4) ส่งออก")
     st.markdown("### 4) ส่งออกรายงาน")
 
-    # --- CSV & Excel (โค้ดเดิมของคุณ) ---
+    # --- งานเบื้องหลัง: สร้างไฟล์ใน worker แล้วดาวน์โหลดจากส่วนที่ 5 ภายหลัง ---
+    col_kind, col_submit = st.columns([2, 1])
+    with col_kind:
+        export_kind = st.radio(
+            "รูปแบบไฟล์",
+            list(EXPORT_KIND_LABELS),
+            format_func=EXPORT_KIND_LABELS.get,
+            horizontal=True,
+            key="export_kind"
+        )
+    with col_submit:
+        if st.button("📨 ส่งออกเบื้องหลัง", use_container_width=True):
+            user = st.session_state.get("user") or {}
+            ok, msgs, _ = controller.request_report_export(
+                export_kind, start_iso, end_iso, selected_status, user.get("id")
+            )
+            for m in msgs:
+                (st.success if ok else st.error)(m)
+
+    # --- รายงานเล็ก: ดาวน์โหลดได้ทันที (สร้างไฟล์ตอนกดปุ่ม) ---
+    if total_rows > DIRECT_EXPORT_MAX_ROWS:
+        st.caption(f"รายงานมีมากกว่า {DIRECT_EXPORT_MAX_ROWS:,} รายการ กรุณาส่งออกแบบเบื้องหลัง")
+    else:
+        _render_direct_downloads(start_iso, end_iso, selected_status)
+
+    _render_export_jobs()
+
+
+def _render_direct_downloads(start_iso: str, end_iso: str, selected_status: str):
+    import pdf_report  # ReportLab โหลดเฉพาะเมื่อมีปุ่มดาวน์โหลดรายงานให้กด
+
     col_csv, col_excel, col_pdf = st.columns(3)
-    
+
     with col_csv:
-        csv_buffer = io.StringIO()
-        report_df.to_csv(csv_buffer, index=False)
-        st.download_button("⬇️ ดาวน์โหลด CSV", data=csv_buffer.getvalue(), file_name="report.csv", mime="text/csv")
+        # สร้างไฟล์เมื่อกดดาวน์โหลดเท่านั้น (อ่าน cursor ทีละช่วงลงไฟล์ชั่วคราว)
+        st.download_button(
+            "⬇️ ดาวน์โหลด CSV",
+            data=lambda: report_export.borrow_report_csv(start_iso, end_iso, selected_status),
+            file_name="report.csv",
+            mime="text/csv"
+        )
 
     with col_excel:
-        excel_buffer = io.BytesIO()
-        with pd.ExcelWriter(excel_buffer) as writer:
-            report_df.to_excel(writer, index=False, sheet_name="Sheet1")
-        st.download_button("⬇️ ดาวน์โหลด Excel", data=excel_buffer.getvalue(), file_name="report.xlsx")
+        # สร้างไฟล์เมื่อกดดาวน์โหลดเท่านั้น (openpyxl แบบ write-only เขียนทีละแถว)
+        st.download_button(
+            "⬇️ ดาวน์โหลด Excel",
+            data=lambda: report_export.borrow_report_excel(start_iso, end_iso, selected_status),
+            file_name="report.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
 
     with col_pdf:
         # ---------- PDF (ภาษาไทยด้วย NotoSansThai) ----------
-        try:
-            # 1. ลงทะเบียน Font (ตรวจสอบว่าไฟล์ .ttf อยู่ในโฟลเดอร์เดียวกับ app.py)
-            pdfmetrics.registerFont(TTFont("NotoSansThai", "NotoSansThai-Regular.ttf"))
-
-            pdf_buffer = io.BytesIO()
-            doc = SimpleDocTemplate(pdf_buffer, pagesize=A4)
-            styles = getSampleStyleSheet()
-            
-            # สร้างสไตล์ภาษาไทย
-            thai_title = ParagraphStyle(name="ThaiTitle", fontName="NotoSansThai", fontSize=16, alignment=1, leading=20)
-            thai_body = ParagraphStyle(name="ThaiBody", fontName="NotoSansThai", fontSize=10, leading=14)
-
-            elements = []
-            elements.append(Paragraph("รายงานผู้ยืม–คืนหนังสือ", thai_title))
-            elements.append(Paragraph(f"ช่วงวันที่ {report_start} ถึง {report_end}", thai_body))
-            elements.append(Paragraph("<br/><br/>", thai_body))
-
-            # เตรียมข้อมูลตาราง (ใช้ Paragraph เพื่อให้ตัดคำไทยได้)
-            table_data = []
-            # หัวตาราง
-            header = [Paragraph(f"<b>{col}</b>", thai_body) for col in report_df.columns]
-            table_data.append(header)
-            
-            # ข้อมูลในตาราง
-            for _, row in report_df.iterrows():
-                table_data.append([Paragraph(str(val), thai_body) for val in row.values])
-
-            # สร้างตาราง
-            table = Table(table_data, repeatRows=1)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.whitesmoke),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ]))
-
-            elements.append(table)
-            doc.build(elements)
-
+        if not pdf_report.fonts_available():
+            st.error("ไม่สามารถสร้าง PDF ได้: ไม่พบไฟล์ฟอนต์")
+            st.info(f"โปรดตรวจสอบว่ามีไฟล์ NotoSansThai-Regular.ttf / NotoSansThai-Bold.ttf อยู่ใน {pdf_report.FONT_DIR}")
+        else:
+            # สร้างไฟล์เมื่อกดดาวน์โหลดเท่านั้น
             st.download_button(
                 label="⬇️ ดาวน์โหลด PDF",
-                data=pdf_buffer.getvalue(),
+                data=lambda: pdf_report.borrow_report_pdf(start_iso, end_iso, selected_status),
                 file_name="borrow_report.pdf",
                 mime="application/pdf"
             )
-        except Exception as e:
-            st.error(f"ไม่สามารถสร้าง PDF ได้: {e}")
-            st.info("โปรดตรวจสอบว่ามีไฟล์ NotoSansThai-Regular.ttf อยู่ในเครื่อง")
\ No newline at end of file
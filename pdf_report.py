@@ -0,0 +1,241 @@
+# pdf_report.py
+"""
+สร้างรายงานการยืม-คืนเป็น PDF (ภาษาไทยด้วย NotoSansThai) ด้วย ReportLab
+
+แนวทางให้เร็วพอสำหรับรายงานหลายหมื่นแถว:
+- ลงทะเบียนฟอนต์ครั้งเดียวต่อ process (ไม่ใช่ทุกครั้งที่ render หน้า)
+- แบ่งข้อมูลเป็น Table ย่อยขนาดประมาณหนึ่งหน้า แทน Table ก้อนเดียว
+  (ReportLab คำนวณ layout / split ของ Table ใหญ่ช้ามาก)
+- ใช้ string ธรรมดาในช่องที่ข้อความพอดีคอลัมน์ ใช้ Paragraph (ตัดบรรทัด) เฉพาะช่องที่ยาวเกิน
+- สร้าง Table ย่อยทีละไม่กี่อันระหว่างที่ ReportLab จัดหน้า (ไม่สร้าง story ทั้งรายงานไว้ก่อน build)
+  หน่วยความจำจึงไม่โตตามจำนวนแถว และนับความคืบหน้าตามแถวที่จัดหน้าแล้วจริง
+"""
+import os
+import tempfile
+import threading
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+import report_export
+
+# ==========================================================
+# Fonts
+# ==========================================================
+FONT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts", "NotoSansThai-Regular", "static")
+FONT_NAME = "NotoSansThai"
+FONT_NAME_BOLD = "NotoSansThai-Bold"
+FONT_FILES = {
+    FONT_NAME: "NotoSansThai-Regular.ttf",
+    FONT_NAME_BOLD: "NotoSansThai-Bold.ttf",
+}
+
+_font_lock = threading.Lock()
+_fonts_registered = False
+
+
+def fonts_available() -> bool:
+    """ตรวจว่ามีไฟล์ฟอนต์ครบใน fonts/ หรือไม่"""
+    return all(os.path.isfile(os.path.join(FONT_DIR, f)) for f in FONT_FILES.values())
+
+
+def register_fonts():
+    """
+    ลงทะเบียนฟอนต์ไทยกับ ReportLab ครั้งเดียวต่อ process
+    (การโหลด TTF ทั้งไฟล์ใช้เวลาหลายสิบ ms จึงไม่ควรทำทุก rerun)
+    """
+    global _fonts_registered
+    if _fonts_registered:
+        return
+    with _font_lock:
+        if _fonts_registered:
+            return
+        for name, filename in FONT_FILES.items():
+            pdfmetrics.registerFont(TTFont(name, os.path.join(FONT_DIR, filename)))
+        pdfmetrics.registerFontFamily(FONT_NAME, normal=FONT_NAME, bold=FONT_NAME_BOLD)
+        _fonts_registered = True
+
+
+# ==========================================================
+# Layout
+# ==========================================================
+PAGE_SIZE = landscape(A4)
+PAGE_MARGIN = 12 * mm
+FONT_SIZE = 8
+LEADING = 10
+CELL_PADDING = 3
+
+# จำนวนแถวต่อ Table ย่อย (ประมาณหนึ่งหน้า A4 แนวนอนเมื่อไม่มีช่องที่ตัดบรรทัด)
+ROWS_PER_TABLE = 40
+
+# จำนวน Table ย่อยที่สร้างรอไว้ใน story ล่วงหน้า (ReportLab มองไปข้างหน้าเพื่อ keepWithNext)
+TABLES_AHEAD = 2
+
+# สัดส่วนความกว้างคอลัมน์ตามลำดับคอลัมน์ของ model.get_borrow_report
+COLUMN_WEIGHTS = (6, 14, 22, 12, 8, 12, 7, 9, 10)
+
+TABLE_STYLE = TableStyle([
+    ("FONTNAME", (0, 0), (-1, -1), FONT_NAME),
+    ("FONTNAME", (0, 0), (-1, 0), FONT_NAME_BOLD),
+    ("FONTSIZE", (0, 0), (-1, -1), FONT_SIZE),
+    ("LEADING", (0, 0), (-1, -1), LEADING),
+    ("BACKGROUND", (0, 0), (-1, 0), colors.whitesmoke),
+    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ("LEFTPADDING", (0, 0), (-1, -1), CELL_PADDING),
+    ("RIGHTPADDING", (0, 0), (-1, -1), CELL_PADDING),
+    ("TOPPADDING", (0, 0), (-1, -1), 2),
+    ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
+])
+
+
+def _column_widths(n_cols: int) -> list:
+    usable = PAGE_SIZE[0] - 2 * PAGE_MARGIN
+    weights = COLUMN_WEIGHTS if len(COLUMN_WEIGHTS) == n_cols else (1,) * n_cols
+    total = sum(weights)
+    return [usable * w / total for w in weights]
+
+
+def _make_cell(value, max_width: float, style: ParagraphStyle):
+    """ข้อความที่พอดีคอลัมน์ส่งเป็น string ตรง ๆ (เร็วกว่า Paragraph มาก) ที่เหลือจึงตัดบรรทัดด้วย Paragraph"""
+    if value is None:
+        return ""
+    text = str(value)
+    if pdfmetrics.stringWidth(text, FONT_NAME, FONT_SIZE) <= max_width:
+        return text
+    return Paragraph(escape(text), style)
+
+
+def _data_table(header, rows, col_widths):
+    table = Table([header] + rows, colWidths=col_widths, repeatRows=1, style=TABLE_STYLE)
+    table.report_rows = len(rows)   # ใช้นับความคืบหน้าตอนจัดหน้า
+    return table
+
+
+def _table_chunks(columns, row_chunks, col_widths, style):
+    """แปลงแถวข้อมูลเป็น Table ย่อยละ ROWS_PER_TABLE แถว (ทุก Table มีหัวตาราง)"""
+    text_widths = [w - 2 * CELL_PADDING for w in col_widths]
+    header = [str(c) for c in columns]
+    buffer = []
+    for rows in row_chunks:
+        for row in rows:
+            buffer.append([_make_cell(v, w, style) for v, w in zip(row, text_widths)])
+            if len(buffer) >= ROWS_PER_TABLE:
+                yield _data_table(header, buffer, col_widths)
+                buffer = []
+    if buffer:
+        yield _data_table(header, buffer, col_widths)
+
+
+class _StreamingDocTemplate(SimpleDocTemplate):
+    """
+    SimpleDocTemplate ที่เติม story จาก generator ของ Table ระหว่าง build
+    (build วนจนกว่า list ของ story จะว่าง จึงเติมต่อท้ายก่อนจัดหน้าแต่ละชิ้นได้)
+    """
+
+    def __init__(self, *args, tables=None, progress=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tables = tables
+        self._progress = progress
+        self._rows_laid_out = 0
+        self._story = None
+
+    def build(self, flowables, *args, **kwargs):
+        self._story = flowables
+        super().build(flowables, *args, **kwargs)
+
+    def handle_flowable(self, flowables):
+        # handle_flowable ถูกเรียกกับ list ภายในของ ReportLab ด้วย (เช่น _hanging) เติมเฉพาะ story
+        while flowables is self._story and self._tables is not None and len(flowables) < TABLES_AHEAD:
+            table = next(self._tables, None)
+            if table is None:
+                self._tables = None
+            else:
+                flowables.append(table)
+
+        # นับเมื่อ Table ออกจากหัว story แล้ว (ถ้าหน้าเต็ม ReportLab ใส่กลับไว้ที่เดิมเพื่อลองหน้าถัดไป)
+        # Table ที่ถูก split ข้ามหน้า ชิ้นส่วนเป็น Table ใหม่ที่ไม่มี report_rows จึงนับครั้งเดียว
+        table = flowables[0] if flowables else None
+        rows = getattr(table, "report_rows", 0)
+        super().handle_flowable(flowables)
+        if rows and not (flowables and flowables[0] is table):
+            table.report_rows = 0
+            self._rows_laid_out += rows
+            if self._progress is not None:
+                self._progress(self._rows_laid_out)
+
+
+def build_pdf(out, title: str, subtitle: str, chunks, progress=None):
+    """
+    เขียน PDF ลง out (ไฟล์ / file-like)
+    chunks: iterable ของ (columns, rows) แบบเดียวกับ model.iter_borrow_report
+    progress: fn(จำนวนแถวที่จัดหน้าแล้ว) เรียกหลัง ReportLab จัดหน้า Table ย่อยแต่ละอัน (None = ไม่แจ้ง)
+    return: จำนวนแถวข้อมูลที่เขียน
+    """
+    register_fonts()
+    title_style = ParagraphStyle(name="ThaiTitle", fontName=FONT_NAME_BOLD, fontSize=16, leading=20, alignment=1)
+    body_style = ParagraphStyle(name="ThaiBody", fontName=FONT_NAME, fontSize=FONT_SIZE, leading=LEADING)
+    sub_style = ParagraphStyle(name="ThaiSub", parent=body_style, fontSize=10, leading=14, alignment=1)
+
+    story = [Paragraph(escape(title), title_style), Paragraph(escape(subtitle), sub_style), Spacer(1, 4 * mm)]
+
+    # ดึงหัวตารางจาก chunk แรก แล้วส่งแถวที่เหลือต่อให้ _table_chunks (สร้าง Table เมื่อ ReportLab ต้องใช้)
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    n_rows = 0
+    tables = None
+    if first is not None:
+        columns, first_rows = first
+        col_widths = _column_widths(len(columns))
+
+        def counted():
+            nonlocal n_rows
+            n_rows += len(first_rows)
+            yield first_rows
+            for _, rows in chunks:
+                n_rows += len(rows)
+                yield rows
+
+        tables = _table_chunks(columns, counted(), col_widths, body_style)
+        first_table = next(tables, None)
+        if first_table is None:
+            tables = None
+        else:
+            story.append(first_table)
+
+    if tables is None:
+        story.append(Paragraph("ไม่พบข้อมูลตามเงื่อนไขที่เลือก", sub_style))
+
+    doc = _StreamingDocTemplate(
+        out, pagesize=PAGE_SIZE,
+        leftMargin=PAGE_MARGIN, rightMargin=PAGE_MARGIN, topMargin=PAGE_MARGIN, bottomMargin=PAGE_MARGIN,
+        title=title, tables=tables, progress=progress,
+    )
+    doc.build(story)
+    return n_rows
+
+
+def borrow_report_pdf(start_date: str, end_date: str, status: str, out=None, progress=None):
+    """
+    สร้าง PDF รายงานการยืม-คืน (อ่านจาก cursor ทีละช่วง)
+    out / progress: เหมือน report_export.borrow_report_csv
+    return: ไฟล์ที่เขียนแล้ว (seek กลับต้นไฟล์แล้ว)
+    """
+    if out is None:
+        out = tempfile.TemporaryFile()
+    # ความคืบหน้านับตอนจัดหน้า (ช่วงที่ช้า) ไม่ใช่ตอนอ่านจากฐานข้อมูล
+    build_pdf(
+        out,
+        "รายงานผู้ยืม–คืนหนังสือ",
+        f"ช่วงวันที่ {start_date} ถึง {end_date}",
+        report_export.report_chunks(start_date, end_date, status),
+        progress=progress,
+    )
+    out.seek(0)
+    return out
@@ -0,0 +1,330 @@
+# query_stats.py
+"""
+วัดเวลาของทุกคำสั่ง SQL ที่ model.py ส่งเข้าฐานข้อมูล (เปิดไว้ใน production ได้)
+
+- model.get_connection เปิด connection ด้วย InstrumentedConnection แทน sqlite3.Connection
+  ทุก execute / executemany / fetch* / commit ถูกจับเวลา (นับเฉพาะเวลาที่อยู่ใน SQLite
+  ไม่รวมเวลาที่ผู้เรียกใช้ประมวลผลระหว่าง fetchmany แต่ละช่วง)
+- สถิติแยกตามคำสั่ง SQL (ช่องว่างและรายการ ?,?,? ของ IN ถูกยุบให้เป็นคำสั่งเดียวกัน)
+  เก็บเวลา ROLLING_WINDOW ครั้งล่าสุดไว้คำนวณ p50/p95/p99 ตอนเปิดดู (ไม่เรียงทุกครั้งที่ query)
+- คำสั่งที่ช้ากว่า SLOW_QUERY_MS บันทึกลง slow_queries.log (JSON ทีละบรรทัด ข้างไฟล์ฐานข้อมูล)
+  พร้อม EXPLAIN QUERY PLAN (ทำครั้งเดียวต่อคำสั่งในช่วง PLAN_TTL_SECONDS)
+
+ปิดได้ด้วย env LIBRARY_QUERY_STATS=0 (model จะใช้ sqlite3.Connection ตามเดิม)
+"""
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+ENABLED = os.environ.get("LIBRARY_QUERY_STATS", "1") != "0"
+
+# คำสั่งที่ใช้เวลาเกินนี้ (ms) ถือว่าช้า
+SLOW_QUERY_MS = float(os.environ.get("LIBRARY_SLOW_QUERY_MS", "200"))
+
+# จำนวนครั้งล่าสุดต่อคำสั่งที่ใช้คำนวณ percentile
+ROLLING_WINDOW = 500
+
+# จำนวนคำสั่งช้าล่าสุดที่เก็บในหน่วยความจำ (ไฟล์ log เก็บทั้งหมด)
+SLOW_LOG_KEEP = 100
+
+# EXPLAIN QUERY PLAN ของคำสั่งเดิมซ้ำได้เมื่อผ่านไปกี่วินาที
+PLAN_TTL_SECONDS = 600
+
+SLOW_LOG_FILENAME = "slow_queries.log"
+
+# ชื่อ module ที่นับเป็น "ผู้เรียก" (ฟังก์ชันแรกใน stack ที่อยู่ใน module เหล่านี้)
+CALLER_MODULES = ("model",)
+_CALLER_SKIP = {"connection", "_release", "__exit__", "__enter__"}
+
+_PARAM_LIST = re.compile(r"\b(IN|VALUES)\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SKIP_PLAN = ("BEGIN", "COMMIT", "ROLLBACK", "PRAGMA", "EXPLAIN", "SAVEPOINT", "RELEASE", "ANALYZE", "VACUUM")
+
+_lock = threading.Lock()
+_stats = {}                       # (sql ที่ยุบแล้ว, ผู้เรียก) -> _Stat
+_normalized = {}                  # sql ดิบ -> sql ที่ยุบแล้ว
+_NORMALIZED_MAX = 2048
+_slow = deque(maxlen=SLOW_LOG_KEEP)
+_planned = {}                     # sql ที่ยุบแล้ว -> เวลาที่ EXPLAIN ล่าสุด (monotonic)
+_log_lock = threading.Lock()
+
+
+class _Stat:
+    __slots__ = ("calls", "total", "rows", "max", "recent")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.rows = 0
+        self.max = 0.0
+        self.recent = deque(maxlen=ROLLING_WINDOW)
+
+
+def normalize_sql(sql: str) -> str:
+    """ยุบช่องว่างและรายการ IN (?,?,?) / VALUES (?,?) ให้คำสั่งที่ต่างแค่จำนวนพารามิเตอร์นับรวมกัน"""
+    with _lock:
+        cached = _normalized.get(sql)
+    if cached is not None:
+        return cached
+    text = _PARAM_LIST.sub(r"\1 (?,…)", " ".join(sql.split()))
+    with _lock:
+        if len(_normalized) >= _NORMALIZED_MAX:
+            _normalized.clear()
+        _normalized[sql] = text
+    return text
+
+
+def _caller() -> str:
+    """ฟังก์ชันใน model.py ที่ส่งคำสั่งนี้ (ข้าม pandas / contextlib / ตัว pool)"""
+    frame = sys._getframe(2)
+    depth = 0
+    while frame is not None and depth < 40:
+        if frame.f_globals.get("__name__") in CALLER_MODULES and frame.f_code.co_name not in _CALLER_SKIP:
+            return frame.f_code.co_name
+        frame = frame.f_back
+        depth += 1
+    return "-"
+
+
+def record(sql: str, seconds: float, rows: int, caller: str, conn=None, params=None, explain: bool = True):
+    """
+    บันทึกผลของคำสั่ง 1 ครั้ง (ถ้าช้ากว่าเกณฑ์ บันทึกลง slow log ด้วย)
+    conn / params: ใช้ทำ EXPLAIN QUERY PLAN และหาไฟล์ slow log
+    """
+    key = (normalize_sql(sql), caller)
+    with _lock:
+        stat = _stats.get(key)
+        if stat is None:
+            stat = _stats[key] = _Stat()
+        stat.calls += 1
+        stat.total += seconds
+        stat.rows += rows
+        stat.recent.append(seconds)
+        if seconds > stat.max:
+            stat.max = seconds
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        _log_slow(sql, key[0], seconds, rows, caller, conn, params if explain else None, explain)
+
+
+def _explain(conn, sql: str, params) -> list[str] | None:
+    """EXPLAIN QUERY PLAN ด้วย connection และพารามิเตอร์เดิม (None = ไม่ทำ/ทำไม่ได้)"""
+    if conn is None or sql.lstrip().upper().startswith(_SKIP_PLAN):
+        return None
+    try:
+        rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params or ()).fetchall()
+    except sqlite3.Error:
+        return None
+    return [row[3] for row in rows]
+
+
+def _log_slow(sql: str, normalized: str, seconds: float, rows: int, caller: str, conn, params, explain: bool):
+    plan = None
+    if explain:
+        now = time.monotonic()
+        with _lock:
+            due = now - _planned.get(normalized, -PLAN_TTL_SECONDS) >= PLAN_TTL_SECONDS
+            if due:
+                _planned[normalized] = now
+        if due:
+            plan = _explain(conn, sql, params)
+
+    entry = {
+        "at": datetime.now().isoformat(timespec="seconds"),
+        "ms": round(seconds * 1000, 2),
+        "rows": rows,
+        "caller": caller,
+        "sql": normalized,
+        "plan": plan,
+    }
+    with _lock:
+        _slow.append(entry)
+
+    path = getattr(conn, "slow_log_path", None)
+    if path:
+        try:
+            with _log_lock, open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+
+
+def slow_log_path(db_path: str) -> str:
+    """ไฟล์ slow log ของฐานข้อมูล db_path (อยู่โฟลเดอร์เดียวกัน)"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), SLOW_LOG_FILENAME)
+
+
+# ==========================================================
+# Connection / Cursor
+# ==========================================================
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    cursor ที่จับเวลา execute + fetch รวมเป็น 1 ครั้งของคำสั่ง
+    บันทึกผลเมื่ออ่านแถวหมด / execute คำสั่งใหม่ / ปิด cursor
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending = None      # [sql, params, caller, seconds, rows]
+
+    def _finish(self, explain: bool = True):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            sql, params, caller, seconds, rows = pending
+            record(sql, seconds, rows, caller, self.connection, params, explain=explain)
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        caller = _caller()
+        t0 = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - t0
+            self._pending = [sql, parameters, caller, elapsed, 0]
+        if self.description is None:
+            # INSERT / UPDATE / DELETE / BEGIN: ไม่มีแถวให้อ่าน จบได้เลย
+            self._pending[4] = max(self.rowcount, 0)
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        caller = _caller()
+        t0 = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        finally:
+            # executemany ไม่ EXPLAIN (ไม่มีพารามิเตอร์ชุดเดียวให้ใช้)
+            record(sql, time.perf_counter() - t0, max(self.rowcount, 0), caller, self.connection, explain=False)
+        return self
+
+    def _timed_fetch(self, fetch, *args):
+        t0 = time.perf_counter()
+        rows = fetch(*args)
+        pending = self._pending
+        if pending is not None:
+            pending[3] += time.perf_counter() - t0
+        return rows
+
+    def fetchone(self):
+        row = self._timed_fetch(super().fetchone)
+        if self._pending is not None:
+            if row is None:
+                self._finish()
+            else:
+                self._pending[4] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._timed_fetch(super().fetchmany, size)
+        if self._pending is not None:
+            self._pending[4] += len(rows)
+            if len(rows) < size:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(super().fetchall)
+        if self._pending is not None:
+            self._pending[4] += len(rows)
+            self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        # cursor ที่อ่านไม่หมดแล้วถูกทิ้ง (เช่น fetchone แถวเดียว) ยังนับเป็น 1 ครั้ง
+        # บันทึกแค่เวลา ไม่ EXPLAIN: ตอน GC อาจอยู่คนละ thread กับเจ้าของ connection หรืออยู่กลาง transaction
+        try:
+            self._finish(explain=False)
+        except Exception:
+            pass
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3.Connection ที่ส่งทุกคำสั่งผ่าน InstrumentedCursor"""
+
+    slow_log_path = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute ของ sqlite3 สร้าง cursor ธรรมดาในภาษา C จึงต้องเขียนทับให้ผ่าน self.cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        if not self.in_transaction:
+            return super().commit()
+        caller = _caller()
+        t0 = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            record("COMMIT", time.perf_counter() - t0, 0, caller, self, explain=False)
+
+
+def connect(db_path: str, **kwargs) -> sqlite3.Connection:
+    """เปิด connection แบบวัดเวลา (หรือแบบธรรมดาถ้าปิด ENABLED)"""
+    if not ENABLED:
+        return sqlite3.connect(db_path, **kwargs)
+    conn = sqlite3.connect(db_path, factory=InstrumentedConnection, **kwargs)
+    conn.slow_log_path = slow_log_path(db_path)
+    return conn
+
+
+# ==========================================================
+# Reading stats
+# ==========================================================
+def _percentile(ordered: list[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def snapshot() -> list[dict]:
+    """สถิติทุกคำสั่ง เรียงตามเวลารวมมากไปน้อย (ms)"""
+    with _lock:
+        items = [(key, s.calls, s.total, s.rows, s.max, list(s.recent)) for key, s in _stats.items()]
+    result = []
+    for (sql, caller), calls, total, rows, max_s, recent in items:
+        recent.sort()
+        result.append({
+            "caller": caller,
+            "sql": sql,
+            "calls": calls,
+            "total_ms": round(total * 1000, 2),
+            "p50_ms": round(_percentile(recent, 50) * 1000, 3),
+            "p95_ms": round(_percentile(recent, 95) * 1000, 3),
+            "p99_ms": round(_percentile(recent, 99) * 1000, 3),
+            "max_ms": round(max_s * 1000, 3),
+            "avg_rows": round(rows / calls, 1) if calls else 0,
+        })
+    result.sort(key=lambda r: r["total_ms"], reverse=True)
+    return result
+
+
+def recent_slow_queries() -> list[dict]:
+    """คำสั่งช้าล่าสุด (ใหม่สุดก่อน)"""
+    with _lock:
+        return list(reversed(_slow))
+
+
+def reset():
+    """ล้างสถิติในหน่วยความจำ (ไฟล์ slow log ไม่ถูกลบ)"""
+    with _lock:
+        _stats.clear()
+        _slow.clear()
+        _planned.clear()
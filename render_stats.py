@@ -0,0 +1,202 @@
+# render_stats.py
+"""
+จับเวลาการ render แต่ละหน้าของแอป (และแต่ละส่วนในหน้า) + นับจำนวน rerun ต่อ session
+
+- app.py ครอบการเรียก render_* ด้วย page_run(ชื่อหน้า, st.session_state)
+- ในหน้าเรียก section("ชื่อส่วน") ตอนเริ่มแต่ละส่วน (แบบจับเวลาต่อรอบ: ส่วนก่อนหน้าจบเมื่อส่วนใหม่เริ่ม
+  ไม่ต้องเยื้องโค้ดทั้งส่วนเข้าไปใน with) เรียกนอก page_run จะไม่มีผลอะไร
+- สถิติรวมระดับ process (ทุก session) เก็บ ROLLING_WINDOW ครั้งล่าสุดไว้คำนวณ percentile ตอนเปิดดู
+- จำนวนครั้งที่ render ต่อหน้าของ session ปัจจุบันเก็บใน session_state
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# จำนวนครั้งล่าสุดต่อหน้า/ส่วน ที่ใช้คำนวณ percentile
+ROLLING_WINDOW = 500
+
+# ชื่อส่วนของเวลาตั้งแต่เริ่มหน้าจนถึง section() แรก
+FIRST_SECTION = "(ส่วนหัว)"
+
+SESSION_COUNTS_KEY = "_render_counts"
+SESSION_SEEN_KEY = "_render_seen"
+
+_lock = threading.Lock()
+_local = threading.local()
+_pages = {}        # หน้า -> _PageStat
+_sections = {}     # (หน้า, ส่วน) -> _Timing
+_generation = 0    # เพิ่มทุกครั้งที่ reset() ให้ session เดิมถูกนับใหม่
+
+
+class _Timing:
+    __slots__ = ("calls", "total", "max", "recent")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=ROLLING_WINDOW)
+
+    def add(self, seconds: float):
+        self.calls += 1
+        self.total += seconds
+        self.recent.append(seconds)
+        if seconds > self.max:
+            self.max = seconds
+
+
+class _PageStat(_Timing):
+    __slots__ = ("sessions", "reruns", "stops", "errors")
+
+    def __init__(self):
+        super().__init__()
+        self.sessions = 0   # จำนวน session ที่เคยเปิดหน้านี้ (นับตอน render ครั้งแรกของแต่ละ session)
+        self.reruns = 0     # จบด้วย st.rerun() (เช่น หลังบันทึกข้อมูล) = ต้อง render ซ้ำอีกรอบ
+        self.stops = 0      # จบด้วย st.stop()
+        self.errors = 0
+
+
+class _Run:
+    """การ render หน้า 1 ครั้ง (อยู่ใน thread ของ script)"""
+
+    def __init__(self, page: str):
+        self.page = page
+        self.started = time.perf_counter()
+        self.section = FIRST_SECTION
+        self.section_started = self.started
+
+    def lap(self, name: str | None, now: float):
+        seconds = now - self.section_started
+        key = (self.page, self.section)
+        with _lock:
+            timing = _sections.get(key)
+            if timing is None:
+                timing = _sections[key] = _Timing()
+            timing.add(seconds)
+        self.section = name
+        self.section_started = now
+
+
+def _outcome(exc: BaseException) -> str:
+    # st.rerun() / st.stop() ทำงานด้วย exception ของ Streamlit (สืบทอด BaseException)
+    name = type(exc).__name__
+    if name == "RerunException":
+        return "rerun"
+    if name == "StopException":
+        return "stop"
+    return "error"
+
+
+@contextmanager
+def page_run(page: str, session):
+    """
+    จับเวลาการ render หน้า page 1 ครั้ง (รวมกรณีจบด้วย st.rerun / st.stop / error)
+    session: st.session_state (ใช้นับจำนวนครั้งต่อ session)
+    """
+    counts = session.get(SESSION_COUNTS_KEY)
+    if counts is None:
+        counts = session[SESSION_COUNTS_KEY] = {}
+    counts[page] = counts.get(page, 0) + 1
+    # หน้า -> generation ที่ session นี้ถูกนับแล้ว (ไม่เก็บ id ของ session ไว้ระดับ process)
+    seen = session.get(SESSION_SEEN_KEY)
+    if seen is None:
+        seen = session[SESSION_SEEN_KEY] = {}
+
+    run = _Run(page)
+    previous, _local.run = getattr(_local, "run", None), run
+    outcome = "ok"
+    try:
+        yield
+    except BaseException as e:
+        outcome = _outcome(e)
+        raise
+    finally:
+        _local.run = previous
+        now = time.perf_counter()
+        run.lap(None, now)
+        with _lock:
+            stat = _pages.get(page)
+            if stat is None:
+                stat = _pages[page] = _PageStat()
+            stat.add(now - run.started)
+            if seen.get(page) != _generation:
+                seen[page] = _generation
+                stat.sessions += 1
+            if outcome == "rerun":
+                stat.reruns += 1
+            elif outcome == "stop":
+                stat.stops += 1
+            elif outcome == "error":
+                stat.errors += 1
+
+
+def section(name: str):
+    """เริ่มส่วนใหม่ของหน้าที่กำลัง render (ส่วนก่อนหน้าจบที่จุดนี้)"""
+    run = getattr(_local, "run", None)
+    if run is not None:
+        run.lap(name, time.perf_counter())
+
+
+# ==========================================================
+# Reading stats
+# ==========================================================
+def _percentile(ordered: list[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _timing_row(timing: _Timing, recent: list[float]) -> dict:
+    recent.sort()
+    return {
+        "calls": timing.calls,
+        "total_ms": round(timing.total * 1000, 1),
+        "p50_ms": round(_percentile(recent, 50) * 1000, 2),
+        "p95_ms": round(_percentile(recent, 95) * 1000, 2),
+        "p99_ms": round(_percentile(recent, 99) * 1000, 2),
+        "max_ms": round(timing.max * 1000, 2),
+    }
+
+
+def page_snapshot() -> list[dict]:
+    """สถิติรายหน้า เรียงตามเวลารวมมากไปน้อย"""
+    with _lock:
+        items = [(page, s, list(s.recent), s.sessions) for page, s in _pages.items()]
+    rows = []
+    for page, stat, recent, sessions in items:
+        rows.append({
+            "page": page,
+            "sessions": sessions,
+            "runs_per_session": round(stat.calls / sessions, 1) if sessions else 0,
+            "reruns": stat.reruns,
+            "stops": stat.stops,
+            "errors": stat.errors,
+            **_timing_row(stat, recent),
+        })
+    rows.sort(key=lambda r: r["total_ms"], reverse=True)
+    return rows
+
+
+def section_snapshot() -> list[dict]:
+    """สถิติรายส่วนของทุกหน้า เรียงตามหน้าแล้วตามเวลารวม"""
+    with _lock:
+        items = [(key, s, list(s.recent)) for key, s in _sections.items()]
+    rows = [{"page": page, "section": name, **_timing_row(stat, recent)} for (page, name), stat, recent in items]
+    rows.sort(key=lambda r: (r["page"], -r["total_ms"]))
+    return rows
+
+
+def session_counts(session) -> dict:
+    """จำนวนครั้งที่ render แต่ละหน้าใน session นี้"""
+    return dict(session.get(SESSION_COUNTS_KEY) or {})
+
+
+def reset():
+    """ล้างสถิติระดับ process (จำนวนครั้งใน session_state ไม่ถูกล้าง แต่ทุก session จะถูกนับใหม่)"""
+    global _generation
+    with _lock:
+        _generation += 1
+        _pages.clear()
+        _sections.clear()
@@ -0,0 +1,92 @@
+# report_export.py
+"""
+ส่งออกรายงานการยืม-คืนเป็นไฟล์ แบบอ่านจาก cursor ทีละช่วง (model.iter_borrow_report)
+แล้วเขียนต่อท้ายลงไฟล์ชั่วคราว หน่วยความจำที่ใช้จึงคงที่ไม่ว่ารายงานจะยาวแค่ไหน
+"""
+import csv
+import io
+import tempfile
+
+import model
+
+# Excel รับได้ 1,048,576 แถวต่อ sheet (หักแถวหัวตาราง 1 แถว) เกินนี้ขึ้น sheet ใหม่
+EXCEL_MAX_DATA_ROWS = 1_048_575
+
+
+def report_chunks(start_date: str, end_date: str, status: str, progress=None):
+    """
+    model.iter_borrow_report ที่แจ้งความคืบหน้า
+    progress: fn(จำนวนแถวที่อ่านแล้ว) เรียกหลังส่งแต่ละช่วงให้ผู้เขียนไฟล์ (None = ไม่แจ้ง)
+    """
+    rows_done = 0
+    for columns, rows in model.iter_borrow_report(start_date, end_date, status):
+        yield columns, rows
+        rows_done += len(rows)
+        if progress is not None:
+            progress(rows_done)
+
+
+def borrow_report_csv(start_date: str, end_date: str, status: str, out=None, progress=None):
+    """
+    สร้าง CSV ของรายงานการยืม-คืน
+    out: ไฟล์ binary ที่จะเขียนลง (None = สร้างไฟล์ชั่วคราว)
+    return: ไฟล์ที่เขียนแล้ว (seek กลับต้นไฟล์แล้ว ไฟล์ชั่วคราวลบเองเมื่อปิดไฟล์)
+    """
+    if out is None:
+        out = tempfile.TemporaryFile()
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+
+    header_written = False
+    for columns, rows in report_chunks(start_date, end_date, status, progress):
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows(rows)
+
+    text.flush()
+    text.detach()
+    out.seek(0)
+    return out
+
+
+def borrow_report_excel(
+    start_date: str,
+    end_date: str,
+    status: str,
+    out=None,
+    progress=None,
+    max_rows_per_sheet: int = EXCEL_MAX_DATA_ROWS,
+):
+    """
+    สร้าง Excel (.xlsx) ของรายงานการยืม-คืนด้วย openpyxl แบบ write-only
+    - เขียนทีละแถวจาก cursor ไม่สร้าง object model ของทั้ง workbook ไว้ในหน่วยความจำ
+    - แถวเกิน max_rows_per_sheet แยกไป Sheet2, Sheet3, ... (ทุก sheet มีหัวตาราง)
+    out / progress: เหมือน borrow_report_csv
+    """
+    from openpyxl import Workbook  # import เมื่อส่งออก Excel จริงเท่านั้น (โหลดช้า)
+
+    wb = Workbook(write_only=True)
+    ws = None
+    columns = []
+    rows_in_sheet = 0
+
+    for columns, rows in report_chunks(start_date, end_date, status, progress):
+        for row in rows:
+            if ws is None or rows_in_sheet >= max_rows_per_sheet:
+                ws = wb.create_sheet(f"Sheet{len(wb.worksheets) + 1}")
+                ws.append(columns)
+                rows_in_sheet = 0
+            ws.append(row)
+            rows_in_sheet += 1
+
+    if ws is None:
+        # ไม่มีข้อมูล: ส่งไฟล์ที่มีแค่หัวตาราง
+        ws = wb.create_sheet("Sheet1")
+        ws.append(columns)
+
+    if out is None:
+        out = tempfile.TemporaryFile()
+    wb.save(out)
+    out.seek(0)
+    return out
@@ -0,0 +1,22 @@
+# tests/conftest.py
+"""ให้ import module ของแอป (model.py, migrations.py, ...) จากโฟลเดอร์หลักได้เมื่อรัน pytest"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model  # noqa: E402
+
+
+@pytest.fixture
+def library_db(tmp_path, monkeypatch):
+    """ฐานข้อมูลว่างที่ migrate แล้วใน tmp_path (model.DB_PATH ชี้ไปที่ไฟล์นี้ระหว่าง test)"""
+    db_path = str(tmp_path / "library.db")
+    monkeypatch.setattr(model, "DB_PATH", db_path)
+    model.clear_read_cache()
+    model.ensure_schema()
+    yield db_path
+    model.close_all_connections()
+    model.clear_read_cache()
@@ -0,0 +1,129 @@
+# tests/test_auth.py
+"""รหัสผ่าน (PBKDF2 + hash แบบเดิม) และการล็อกเมื่อ login ผิดหลายครั้ง"""
+import hashlib
+from collections import OrderedDict
+
+import pytest
+
+import auth
+import controller
+import model
+
+PASSWORD = "correct horse"
+
+
+@pytest.fixture(autouse=True)
+def fresh_auth_state(monkeypatch):
+    # จำนวนรอบน้อย ๆ ให้ test เร็ว และล้างตัวนับ login ผิด / cache session ของ test ก่อนหน้า
+    monkeypatch.setattr(auth, "PBKDF2_ITERATIONS", 1000)
+    monkeypatch.setattr(auth, "_failed_logins", OrderedDict())
+    monkeypatch.setattr(auth, "_locked_until", OrderedDict())
+    auth.invalidate_session()
+
+
+def _stored_hash(username: str) -> str:
+    return model.get_user_auth_row(username)["password_hash"]
+
+
+# ==========================================================
+# verify_password
+# ==========================================================
+def test_hash_round_trip():
+    stored = auth.hash_password(PASSWORD)
+    assert auth.verify_password(PASSWORD, stored) == (True, False)
+    assert auth.verify_password("wrong", stored) == (False, False)
+
+
+@pytest.mark.parametrize("stored", [
+    "",
+    None,
+    "pbkdf2_sha256$1000$abcd",                                   # ส่วนไม่ครบ
+    "pbkdf2_sha256$0$abcd$" + "0" * 64,                          # จำนวนรอบ 0
+    "pbkdf2_sha256$-5$abcd$" + "0" * 64,                         # จำนวนรอบติดลบ
+    "pbkdf2_sha256$many$abcd$" + "0" * 64,
+    "pbkdf2_sha256$1²$abcd$" + "0" * 64,                         # ตัวเลขที่ int() แปลงไม่ได้
+    "pbkdf2_sha256$1000$ซอลต์$" + "0" * 64,                       # salt ไม่ใช่ ASCII
+    "pbkdf2_sha256$1000$abcd$" + "ก" * 64,                        # hash ไม่ใช่ ASCII
+    "pbkdf2_sha256$1000$abcd$" + "0" * 10,                       # hash สั้นไป
+    "ก" * 64,                                                     # hash แบบเดิมที่ไม่ใช่ hex
+    "not-a-hash",
+])
+def test_malformed_hash_is_rejected_without_error(stored):
+    assert auth.verify_password(PASSWORD, stored) == (False, False)
+
+
+# ==========================================================
+# login: rehash
+# ==========================================================
+def test_legacy_hash_is_upgraded_on_login(library_db):
+    legacy = hashlib.sha256(PASSWORD.encode("utf-8")).hexdigest()
+    model.add_user("legacy", legacy, "staff")
+    assert auth.verify_password(PASSWORD, legacy) == (True, True)
+
+    ok, _, user = controller.login("legacy", PASSWORD)
+    assert ok and user["username"] == "legacy"
+    stored = _stored_hash("legacy")
+    assert stored.startswith(f"{auth.PASSWORD_ALGORITHM}$1000$")
+    assert auth.verify_password(PASSWORD, stored) == (True, False)
+
+
+def test_hash_is_upgraded_when_iterations_change(library_db, monkeypatch):
+    model.add_user("staff", auth.hash_password(PASSWORD), "staff")
+    monkeypatch.setattr(auth, "PBKDF2_ITERATIONS", 2000)
+
+    ok, _, _ = controller.login("staff", PASSWORD)
+    assert ok
+    assert _stored_hash("staff").startswith(f"{auth.PASSWORD_ALGORITHM}$2000$")
+
+
+def test_wrong_password_does_not_rehash(library_db):
+    legacy = hashlib.sha256(PASSWORD.encode("utf-8")).hexdigest()
+    model.add_user("legacy", legacy, "staff")
+    ok, _, _ = controller.login("legacy", "wrong")
+    assert not ok
+    assert _stored_hash("legacy") == legacy
+
+
+# ==========================================================
+# login: lockout
+# ==========================================================
+def test_lockout_after_max_failed_logins(library_db):
+    model.add_user("staff", auth.hash_password(PASSWORD), "staff")
+    for _ in range(auth.MAX_FAILED_LOGINS - 1):
+        ok, msgs, _ = controller.login("staff", "wrong")
+        assert not ok
+        assert auth.lockout_remaining("staff") == 0
+
+    ok, _, _ = controller.login("staff", "wrong")
+    assert not ok
+    assert auth.lockout_remaining("staff") > 0
+
+    # ล็อกอยู่: รหัสถูกก็ยังเข้าไม่ได้
+    ok, _, user = controller.login("staff", PASSWORD)
+    assert not ok and user is None
+
+
+def test_successful_login_resets_failed_count(library_db):
+    model.add_user("staff", auth.hash_password(PASSWORD), "staff")
+    for _ in range(auth.MAX_FAILED_LOGINS - 1):
+        controller.login("staff", "wrong")
+    assert controller.login("staff", PASSWORD)[0]
+    controller.login("staff", "wrong")
+    assert auth.lockout_remaining("staff") == 0
+
+
+def test_active_lockout_survives_many_other_locked_names(monkeypatch):
+    monkeypatch.setattr(auth, "MAX_TRACKED_LOGINS", 50)
+    for _ in range(auth.MAX_FAILED_LOGINS):
+        auth.record_failed_login("target")
+    assert auth.lockout_remaining("target") > 0
+
+    # ล็อกชื่อทิ้งขว้างเกินจำนวนที่จดไว้ได้ ไม่ทำให้บัญชีเป้าหมายหลุดล็อก
+    for i in range(auth.MAX_TRACKED_LOGINS * 3):
+        for _ in range(auth.MAX_FAILED_LOGINS):
+            auth.record_failed_login(f"throwaway{i}")
+    assert auth.lockout_remaining("target") > 0
+    # ชื่อที่ login ผิดแต่ยังไม่ถูกล็อกยังถูกจำกัดจำนวน
+    for i in range(auth.MAX_TRACKED_LOGINS * 3):
+        auth.record_failed_login(f"typo{i}")
+    assert len(auth._failed_logins) <= auth.MAX_TRACKED_LOGINS
@@ -0,0 +1,161 @@
+# tests/test_circulation.py
+"""ยืม-คืนหนังสือใน model.py: การจองเล่มแบบมีเงื่อนไข และการคืนหลายเล่มแบบ set-based"""
+import sqlite3
+import threading
+
+import pytest
+
+import model
+
+
+def _seed(db_path: str, n_books: int) -> tuple[int, int, list[int]]:
+    """เพิ่มผู้ใช้ 1 คน สมาชิก 1 คน และหนังสือ n_books เล่ม return: (staff_id, member_id, book_ids)"""
+    model.add_user("staff", "x", "staff")
+    model.add_member("M001", "สมาชิก ทดสอบ", "ชาย", "m001@example.com", "0800000000", True)
+    for i in range(n_books):
+        model.add_book(f"หนังสือ {i}", "ผู้แต่ง")
+    with sqlite3.connect(db_path) as conn:
+        (staff_id,) = conn.execute("SELECT id FROM users WHERE username = 'staff'").fetchone()
+        (member_id,) = conn.execute("SELECT id FROM members WHERE member_code = 'M001'").fetchone()
+        book_ids = [r[0] for r in conn.execute("SELECT id FROM books ORDER BY id")]
+    return staff_id, member_id, book_ids
+
+
+def _query(db_path: str, sql: str, params=()):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def _race(*borrows) -> list:
+    """เรียก create_borrow_transaction พร้อมกันหลาย thread (connection ของ pool แยกกันต่อ thread)"""
+    barrier = threading.Barrier(len(borrows))
+    results = [None] * len(borrows)
+
+    def worker(i, kwargs):
+        barrier.wait()
+        try:
+            results[i] = model.create_borrow_transaction(**kwargs)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i, kw)) for i, kw in enumerate(borrows)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+# ==========================================================
+# create_borrow_transaction: จองเล่มด้วย UPDATE ... AND status = 'available'
+# ==========================================================
+@pytest.mark.parametrize("round_no", range(10))
+def test_concurrent_checkout_of_same_book(library_db, round_no):
+    staff_id, member_id, (book_id,) = _seed(library_db, 1)
+    borrow = dict(member_id=member_id, staff_user_id=staff_id, default_due_date="2030-01-15", book_ids=[book_id])
+
+    results = _race(borrow, borrow)
+
+    succeeded = [r for r in results if isinstance(r, int)]
+    failed = [r for r in results if not isinstance(r, int)]
+    assert len(succeeded) == 1, results
+    assert len(failed) == 1 and isinstance(failed[0], ValueError), results
+
+    # ไม่มีหัวรายการ/รายการยืมกำพร้าจากฝั่งที่แพ้
+    assert _query(library_db, "SELECT id FROM borrow_tx") == [(succeeded[0],)]
+    assert _query(library_db, "SELECT tx_id, book_id, status FROM borrow_items") == [(succeeded[0], book_id, "borrowed")]
+    assert _query(library_db, "SELECT status FROM books WHERE id = ?", (book_id,)) == [("borrowed",)]
+
+
+def test_overlapping_checkout_reserves_nothing_for_the_loser(library_db):
+    staff_id, member_id, (b1, b2, b3) = _seed(library_db, 3)
+    common = dict(member_id=member_id, staff_user_id=staff_id, default_due_date="2030-01-15")
+
+    results = _race(dict(common, book_ids=[b1, b2]), dict(common, book_ids=[b2, b3]))
+
+    winners = [i for i, r in enumerate(results) if isinstance(r, int)]
+    assert len(winners) == 1, results
+    loser = 1 - winners[0]
+    assert isinstance(results[loser], ValueError)
+
+    # เล่มที่ฝั่งแพ้ขอแต่ไม่ชนกัน ต้องยังว่างอยู่ (ไม่ถูกจองค้างบางส่วน)
+    free_book = (b1, b3)[loser]
+    assert _query(library_db, "SELECT status FROM books WHERE id = ?", (free_book,)) == [("available",)]
+    assert _query(library_db, "SELECT COUNT(*) FROM borrow_tx") == [(1,)]
+    assert _query(library_db, "SELECT COUNT(*) FROM borrow_items") == [(2,)]
+
+
+def test_checkout_of_borrowed_book_is_rejected(library_db):
+    staff_id, member_id, (book_id,) = _seed(library_db, 1)
+    model.create_borrow_transaction(member_id, staff_id, "2030-01-15", [book_id])
+    with pytest.raises(ValueError):
+        model.create_borrow_transaction(member_id, staff_id, "2030-01-15", [book_id])
+    assert _query(library_db, "SELECT COUNT(*) FROM borrow_tx") == [(1,)]
+
+
+# ==========================================================
+# return_borrow_items: คืนหลายเล่มแบบ set-based + ปิดหัวรายการด้วย NOT EXISTS
+# ==========================================================
+def _borrow(db_path: str, n_books: int) -> tuple[int, int, list[int], list[int]]:
+    """ยืม n_books เล่มในธุรกรรมเดียว return: (staff_id, tx_id, book_ids, item_ids)"""
+    staff_id, member_id, book_ids = _seed(db_path, n_books)
+    tx_id = model.create_borrow_transaction(member_id, staff_id, "2030-01-15", book_ids)
+    item_ids = [r[0] for r in _query(db_path, "SELECT id FROM borrow_items WHERE tx_id = ? ORDER BY book_id", (tx_id,))]
+    return staff_id, tx_id, book_ids, item_ids
+
+
+def _tx_status(db_path: str, tx_id: int) -> str:
+    return _query(db_path, "SELECT status FROM borrow_tx WHERE id = ?", (tx_id,))[0][0]
+
+
+def _book_statuses(db_path: str, book_ids: list[int]) -> list[str]:
+    return [_query(db_path, "SELECT status FROM books WHERE id = ?", (b,))[0][0] for b in book_ids]
+
+
+def test_partial_return_keeps_transaction_open(library_db):
+    staff_id, tx_id, book_ids, item_ids = _borrow(library_db, 3)
+
+    returned, failed = model.return_borrow_items(item_ids[:2], staff_id)
+
+    assert (returned, failed) == (item_ids[:2], [])
+    assert _tx_status(library_db, tx_id) == "open"
+    assert _book_statuses(library_db, book_ids) == ["available", "available", "borrowed"]
+    rows = _query(library_db, "SELECT status, return_date IS NOT NULL, return_staff_user_id FROM borrow_items ORDER BY book_id")
+    assert rows == [("returned", 1, staff_id), ("returned", 1, staff_id), ("borrowed", 0, None)]
+
+
+def test_full_return_closes_transaction(library_db):
+    staff_id, tx_id, book_ids, item_ids = _borrow(library_db, 3)
+    model.return_borrow_items(item_ids[:1], staff_id)
+
+    returned, failed = model.return_borrow_items(item_ids[1:], staff_id)
+
+    assert (returned, failed) == (item_ids[1:], [])
+    assert _tx_status(library_db, tx_id) == "closed"
+    assert _book_statuses(library_db, book_ids) == ["available"] * 3
+
+
+def test_returning_a_returned_item_changes_nothing(library_db):
+    staff_id, tx_id, book_ids, item_ids = _borrow(library_db, 2)
+    model.return_borrow_items(item_ids[:1], staff_id)
+    before = _query(library_db, "SELECT * FROM borrow_items ORDER BY id")
+
+    # คืนซ้ำเล่มเดิม (พร้อมเลขที่ไม่มีอยู่จริง): ไม่มีอะไรเปลี่ยน
+    returned, failed = model.return_borrow_items([item_ids[0], 999_999], staff_id)
+
+    assert (returned, failed) == ([], [item_ids[0], 999_999])
+    assert _query(library_db, "SELECT * FROM borrow_items ORDER BY id") == before
+    assert _tx_status(library_db, tx_id) == "open"
+    assert _book_statuses(library_db, book_ids) == ["available", "borrowed"]
+
+
+def test_returned_book_can_be_borrowed_again(library_db):
+    staff_id, tx_id, book_ids, item_ids = _borrow(library_db, 1)
+    model.return_borrow_items(item_ids, staff_id)
+    (member_id,) = _query(library_db, "SELECT member_id FROM borrow_tx WHERE id = ?", (tx_id,))[0]
+
+    # เล่มที่คืนแล้ว ถ้ายืมใหม่แล้วคืนเลขรายการเก่าซ้ำ ต้องไม่ไปคืนรายการใหม่
+    new_tx = model.create_borrow_transaction(member_id, staff_id, "2030-02-15", book_ids)
+    assert model.return_borrow_items(item_ids, staff_id) == ([], item_ids)
+    assert _tx_status(library_db, new_tx) == "open"
+    assert _book_statuses(library_db, book_ids) == ["borrowed"]
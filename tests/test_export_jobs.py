@@ -0,0 +1,33 @@
+# tests/test_export_jobs.py
+"""งานส่งออกที่ค้างจาก process ก่อน ต้องได้ทำต่อเมื่อมีคนเปิดดูสถานะ (ไม่ต้องรอส่งงานใหม่)"""
+import time
+
+import export_jobs
+import model
+
+
+def _wait_finished(job_id: int, timeout: float = 30.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        job = export_jobs.get_job(job_id)
+        if job["state"] not in model.EXPORT_JOB_ACTIVE_STATES or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_running_job_from_previous_process_is_resumed(library_db, monkeypatch):
+    # จำลอง process ก่อน: งานถูกหยิบไปทำ (running) แล้ว process ตายก่อนเสร็จ
+    job_id, created = model.create_export_job("csv", "2024-01-01", "2024-12-31", "all", None)
+    assert created
+    assert model.start_export_job(job_id, 0)
+    assert model.get_export_job(job_id)["state"] == "running"
+
+    # process ใหม่: ยังไม่มี worker pool และยังไม่มีใครส่งงานใหม่
+    monkeypatch.setattr(export_jobs, "_executor", None)
+    jobs = export_jobs.recent_jobs(10)
+    assert [j["id"] for j in jobs] == [job_id]
+
+    job = _wait_finished(job_id)
+    assert job["state"] == "done", job["error"]
+    assert export_jobs.result_available(job)
+    export_jobs._executor.shutdown(wait=True)
@@ -0,0 +1,148 @@
+# tests/test_read_cache.py
+"""
+cache ของฟังก์ชันอ่าน (@_cached_read) ต้องหมดอายุทุกครั้งที่ฟังก์ชันเขียนใน model.py แก้ตารางที่มันอ่าน
+ตรวจทุกคู่: อุ่น cache ของฟังก์ชันอ่านทุกตัว -> เขียน 1 ครั้ง -> ผลจาก cache ต้องตรงกับการ query ใหม่ (__wrapped__)
+"""
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import model
+
+# ช่วงวันที่กว้างพอให้ครอบรายการยืมของวันนี้
+START, END = "2000-01-01", "2100-12-31"
+
+BOOK_READERS = {
+    "get_all_books", "search_books", "count_books", "search_books_fts", "get_available_books",
+    "get_book_status_summary",
+}
+MEMBER_READERS = {"get_all_members", "search_members", "count_members", "lookup_members", "get_active_members"}
+LOAN_READERS = {
+    "get_available_books", "get_book_status_summary", "get_active_borrow_items",
+    "get_active_borrow_items_by_member", "get_borrow_history", "get_member_active_loans",
+    "get_borrow_report",
+}
+
+
+@pytest.fixture
+def ctx(library_db):
+    """ผู้ใช้ 1 คน สมาชิก 2 คน หนังสือ 3 เล่ม (เล่มสุดท้ายถูกสมาชิกคนแรกยืมอยู่)"""
+    model.add_user("staff", "x", "staff")
+    model.add_member("M001", "Alice", "หญิง", "m001@example.com", "0800000001", True)
+    model.add_member("M002", "Bob", "ชาย", "m002@example.com", "0800000002", True)
+    for i in range(3):
+        model.add_book(f"Book {i}", "Author")
+    with sqlite3.connect(library_db) as conn:
+        (staff_id,) = conn.execute("SELECT id FROM users").fetchone()
+        member_ids = [r[0] for r in conn.execute("SELECT id FROM members ORDER BY member_code")]
+        book_ids = [r[0] for r in conn.execute("SELECT id FROM books ORDER BY id")]
+    tx_id = model.create_borrow_transaction(member_ids[0], staff_id, "2030-01-15", book_ids[2:])
+    with sqlite3.connect(library_db) as conn:
+        (item_id,) = conn.execute("SELECT id FROM borrow_items WHERE tx_id = ?", (tx_id,)).fetchone()
+    return dict(db=library_db, staff=staff_id, members=member_ids, books=book_ids, item=item_id)
+
+
+def _readers(ctx) -> dict:
+    """ฟังก์ชันอ่านที่ cache ทุกตัวใน model.py -> args ที่ใช้เรียก"""
+    return {
+        model.get_all_books: (),
+        model.search_books: (),
+        model.count_books: (),
+        model.search_books_fts: ("Book",),
+        model.get_available_books: (),
+        model.get_book_status_summary: (),
+        model.get_all_members: (),
+        model.search_members: (),
+        model.count_members: (),
+        model.lookup_members: ("M",),
+        model.get_active_members: (),
+        model.get_all_users: (),
+        model.get_active_borrow_items: (),
+        model.get_active_borrow_items_by_member: (ctx["members"][0],),
+        model.get_borrow_history: (),
+        model.get_borrow_summary_by_month: (START, END),
+        model.get_return_summary_by_month: (START, END),
+        model.get_member_active_loans: (),
+        model.get_borrow_report: (START, END, "all"),
+        model.count_borrow_report: (START, END, "all"),
+    }
+
+
+def _same(a, b) -> bool:
+    return a.equals(b) if isinstance(a, pd.DataFrame) else a == b
+
+
+def _corrupt_aggregates(ctx):
+    # ตัวเลขสรุปเพี้ยน (เช่น แก้ไฟล์ฐานข้อมูลจากที่อื่น) ให้ rebuild_aggregates มีอะไรต้องแก้
+    with sqlite3.connect(ctx["db"]) as conn:
+        conn.execute("UPDATE agg_book_status SET total = total + 5")
+    model.clear_read_cache()
+
+
+# (ฟังก์ชันเขียน, ฟังก์ชันอ่านที่ผลต้องเปลี่ยน, เตรียมข้อมูลก่อนอุ่น cache)
+WRITES = {
+    "add_book": (lambda c: model.add_book("Book new", "Author"), BOOK_READERS, None),
+    "update_book": (
+        lambda c: model.update_book(c["books"][0], "Book renamed", "Author", "B-0001"),
+        BOOK_READERS - {"count_books", "get_book_status_summary"}, None,
+    ),
+    "delete_books": (lambda c: model.delete_books([c["books"][0]]), BOOK_READERS, None),
+    "set_book_status": (
+        lambda c: model.set_book_status(c["books"][0], "borrowed"),
+        {"get_available_books", "get_book_status_summary"}, None,
+    ),
+    "add_member": (
+        lambda c: model.add_member("M003", "Carol", "หญิง", "m003@example.com", "0800000003", True),
+        MEMBER_READERS, None,
+    ),
+    "update_member": (
+        lambda c: model.update_member(c["members"][0], "M001", "Alicia", "หญิง", "m001@example.com", "0800000001", True),
+        (MEMBER_READERS - {"count_members"}) | (LOAN_READERS - BOOK_READERS), None,
+    ),
+    "delete_member": (lambda c: model.delete_member(c["members"][1]), MEMBER_READERS, None),
+    "delete_members": (lambda c: model.delete_members([c["members"][1]]), MEMBER_READERS, None),
+    "add_user": (lambda c: model.add_user("clerk", "x", "staff"), {"get_all_users"}, None),
+    "update_user_role": (lambda c: model.update_user_role(c["staff"], "admin"), {"get_all_users"}, None),
+    "update_user_active": (lambda c: model.update_user_active(c["staff"], 0), {"get_all_users"}, None),
+    # ไม่มีฟังก์ชันอ่านที่ cache ตัวไหนแสดง hash แต่ผลจาก cache ก็ยังต้องตรงกับฐานข้อมูล
+    "update_user_password_hash": (lambda c: model.update_user_password_hash(c["staff"], "y"), set(), None),
+    "create_borrow_transaction": (
+        lambda c: model.create_borrow_transaction(c["members"][0], c["staff"], "2030-01-15", [c["books"][0]]),
+        LOAN_READERS | {"get_borrow_summary_by_month", "count_borrow_report"}, None,
+    ),
+    "return_borrow_item": (
+        lambda c: model.return_borrow_item(c["item"], c["staff"]),
+        LOAN_READERS | {"get_return_summary_by_month"}, None,
+    ),
+    "return_borrow_items": (
+        lambda c: model.return_borrow_items([c["item"]], c["staff"]),
+        LOAN_READERS | {"get_return_summary_by_month"}, None,
+    ),
+    "rebuild_aggregates": (lambda c: model.rebuild_aggregates(), {"get_book_status_summary"}, _corrupt_aggregates),
+}
+
+
+@pytest.mark.parametrize("name", WRITES)
+def test_write_invalidates_dependent_reads(ctx, name):
+    write, changed, prepare = WRITES[name]
+    if prepare:
+        prepare(ctx)
+    readers = _readers(ctx)
+    before = {fn: fn(*args) for fn, args in readers.items()}
+
+    write(ctx)
+
+    for fn, args in readers.items():
+        cached, fresh = fn(*args), fn.__wrapped__(*args)
+        assert _same(cached, fresh), f"{fn.__name__} ได้ผลเก่าจาก cache หลัง {name}"
+        if fn.__name__ in changed:
+            assert not _same(before[fn], fresh), f"{name} ไม่ได้เปลี่ยนผลของ {fn.__name__} (test ไม่ได้ตรวจอะไร)"
+
+
+def test_every_cached_reader_is_covered(ctx):
+    cached = {
+        name for name, fn in vars(model).items()
+        if callable(fn) and getattr(fn, "__wrapped__", None) is not None and fn.__module__ == "model"
+    }
+    assert cached == {fn.__name__ for fn in _readers(ctx)}
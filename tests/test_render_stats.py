@@ -0,0 +1,44 @@
+# tests/test_render_stats.py
+"""จำนวน session ต่อหน้าใน render_stats นับเป็นตัวเลข (ไม่เก็บ id ของทุก session ไว้ใน process)"""
+import pytest
+
+import render_stats
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats():
+    render_stats.reset()
+    yield
+    render_stats.reset()
+
+
+def _render(page: str, session: dict, times: int = 1):
+    for _ in range(times):
+        with render_stats.page_run(page, session):
+            render_stats.section("ส่วน")
+
+
+def _page(page: str) -> dict:
+    return next(r for r in render_stats.page_snapshot() if r["page"] == page)
+
+
+def test_each_session_is_counted_once_per_page():
+    first, second = {}, {}
+    _render("books", first, times=3)
+    _render("books", second)
+    _render("members", second, times=2)
+
+    assert (_page("books")["sessions"], _page("books")["calls"]) == (2, 4)
+    assert _page("books")["runs_per_session"] == 2.0
+    assert _page("members")["sessions"] == 1
+    assert render_stats.session_counts(first) == {"books": 3}
+
+
+def test_sessions_are_counted_again_after_reset():
+    session = {}
+    _render("books", session, times=2)
+    render_stats.reset()
+
+    _render("books", session)
+    assert _page("books")["sessions"] == 1
+    assert render_stats.session_counts(session) == {"books": 3}
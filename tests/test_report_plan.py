@@ -0,0 +1,55 @@
+# tests/test_report_plan.py
+"""
+รายงานการยืม-คืนต้องไล่ช่วงวันที่ด้วย idx_borrow_tx_date (migration 7) ทุกสถานะที่กรอง
+ตรวจจาก EXPLAIN QUERY PLAN ทั้งบนฐานข้อมูลว่าง และฐานข้อมูลที่มีข้อมูลแล้ว ANALYZE
+(กรณีหลัง planner มีสถิติและอาจเลือก index อื่น เช่น idx_borrow_items_status)
+"""
+import sqlite3
+
+import pytest
+
+import migrations
+import model
+from benchmarks.synthetic import generate_library
+
+STATUSES = ("all", "borrowed", "returned")
+
+
+@pytest.fixture(scope="module", params=["empty", "analyzed"])
+def conn(request, tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp("plan") / f"{request.param}.db")
+    if request.param == "empty":
+        conn = sqlite3.connect(db_path)
+        migrations.migrate(conn)
+    else:
+        generate_library(db_path, books=500, members=100, users=3, transactions=2000)
+        conn = sqlite3.connect(db_path)
+    yield conn
+    conn.close()
+
+
+def _plan(conn: sqlite3.Connection, sql: str, params: list) -> list[str]:
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def _assert_date_range_plan(plan: list[str]):
+    text = "\n".join(plan)
+    assert any(
+        step.startswith("SEARCH tx USING COVERING INDEX idx_borrow_tx_date") for step in plan
+    ), text
+    assert not any(step.startswith("SCAN tx") or step.startswith("SCAN borrow_tx") for step in plan), text
+    assert "USE TEMP B-TREE FOR ORDER BY" not in text, text
+
+
+@pytest.mark.parametrize("status", STATUSES)
+def test_report_uses_date_index(conn, status):
+    sql, params = model._borrow_report_query("2024-01-01", "2024-12-31", status)
+    # ลำดับเดียวกับ get_borrow_report / iter_borrow_report
+    sql += " ORDER BY tx.borrow_date DESC"
+    _assert_date_range_plan(_plan(conn, sql, params))
+
+
+@pytest.mark.parametrize("status", STATUSES)
+def test_report_count_uses_date_index(conn, status):
+    sql, params = model._borrow_report_query("2024-01-01", "2024-12-31", status, select_sql="COUNT(*)")
+    _assert_date_range_plan(_plan(conn, sql, params))
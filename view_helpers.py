@@ -0,0 +1,73 @@
+# view_helpers.py
+"""
+ตัวช่วยฝั่ง View ที่ใช้ร่วมกันหลายหน้า (pages/*)
+
+- สร้างตัวเลือกของ selectbox (id -> ข้อความ) ด้วยการต่อ string ทั้งคอลัมน์ของ DataFrame
+  แทน `for _, r in df.iterrows()` (iterrows สร้าง Series ใหม่ทุกแถว ช้ามากเมื่อข้อมูลเยอะ)
+- กรองตามคำค้น และจำกัดจำนวนตัวเลือกไม่ให้ selectbox ใหญ่เกินไป
+"""
+import string
+
+import pandas as pd
+import streamlit as st
+
+# จำนวนตัวเลือกสูงสุดที่ส่งให้ selectbox (พิมพ์คำค้นเพิ่มเพื่อจำกัดผล)
+DEFAULT_OPTION_LIMIT = 100
+
+
+def contains_ignore_case(series: pd.Series, keyword: str) -> pd.Series:
+    """mask ของแถวที่มี keyword (ไม่สนตัวพิมพ์เล็ก-ใหญ่) คำค้นว่าง = ทุกแถวที่ไม่ใช่ค่าว่าง"""
+    kw = (keyword or "").strip().lower()
+    if not kw:
+        return series.notna()
+    return series.fillna("").astype(str).str.lower().str.contains(kw, regex=False)
+
+
+def filter_rows(df: pd.DataFrame, keyword: str, columns: list[str]) -> pd.DataFrame:
+    """แถวที่คอลัมน์ใดคอลัมน์หนึ่งใน columns มี keyword"""
+    if not (keyword or "").strip():
+        return df
+    mask = pd.Series(False, index=df.index)
+    for col in columns:
+        mask |= contains_ignore_case(df[col], keyword)
+    return df[mask]
+
+
+def format_labels(df: pd.DataFrame, template: str) -> pd.Series:
+    """
+    ข้อความของทุกแถวตาม template แบบ str.format เช่น "{id} - {title}"
+    (ต่อ string ทีละคอลัมน์ทั้ง Series ไม่วนทีละแถว)
+    """
+    labels = pd.Series("", index=df.index, dtype=object)
+    for literal, field, _, _ in string.Formatter().parse(template):
+        if literal:
+            labels = labels + literal
+        if field is not None:
+            labels = labels + df[field].fillna("").astype(str)
+    return labels
+
+
+def option_map(df: pd.DataFrame, template: str, id_col: str = "id") -> dict[int, str]:
+    """id -> ข้อความ (ใช้กับ selectbox(options=list(m), format_func=m.get))"""
+    df = df[df[id_col].notna()]  # แถวที่ไม่มี id เลือกไปแก้ไข/อ้างอิงไม่ได้
+    df = df.assign(**{id_col: df[id_col].astype(int)})
+    return dict(zip(df[id_col].tolist(), format_labels(df, template).tolist()))
+
+
+def select_id(
+    label: str,
+    df: pd.DataFrame,
+    template: str,
+    id_col: str = "id",
+    limit: int | None = DEFAULT_OPTION_LIMIT,
+    key: str | None = None,
+):
+    """
+    selectbox เลือกแถวจาก df คืนค่า id ที่เลือก (None ถ้า df ว่าง)
+    - แสดงไม่เกิน limit ตัวเลือก (None = ทั้งหมด) พร้อมบอกว่าตัดผลไปเท่าไร
+    """
+    shown = df if limit is None else df.head(limit)
+    options = option_map(shown, template, id_col)
+    if limit is not None and len(df) > limit:
+        st.caption(f"แสดง {limit} จาก {len(df)} รายการ พิมพ์คำค้นเพิ่มเพื่อจำกัดผล")
+    return st.selectbox(label, list(options), format_func=options.get, key=key)